@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from account.models import DBSyncUser, DBSyncModelColumn
+from account.models import DBSyncJob, DBSyncUser, DBSyncModelColumn, DBSyncModelConfig, DBSyncTableSync
 
 
 @admin.register(DBSyncUser)
@@ -19,3 +19,34 @@ class UserAdmin(admin.ModelAdmin):
     list_filter = ["model"]
     search_fields = ["name"]
     readonly_fields = ["is_foreign_key"]
+
+
+@admin.register(DBSyncModelConfig)
+class DBSyncModelConfigAdmin(admin.ModelAdmin):
+    list_display = ["id", "model", "exact_count_threshold", "pagination"]
+
+    search_fields = ["model"]
+
+
+@admin.register(DBSyncTableSync)
+class DBSyncTableSyncAdmin(admin.ModelAdmin):
+    list_display = ["id", "model", "watermark_column", "watermark", "rows_synced", "status", "finished_at"]
+
+    list_filter = ["status"]
+    search_fields = ["model"]
+    readonly_fields = ["rows_synced", "status", "error", "started_at", "finished_at"]
+
+
+@admin.register(DBSyncJob)
+class DBSyncJobAdmin(admin.ModelAdmin):
+    list_display = ["id", "kind", "status", "progress", "total", "created_by", "created_at", "finished_at"]
+
+    list_filter = ["status", "kind"]
+    # jobs only come from submit_job, their kind and params are run as they are
+    readonly_fields = [
+        "kind", "params", "status", "progress", "total", "message", "result", "result_file", "error", "worker",
+        "started_at", "heartbeat_at", "finished_at",
+    ]
+
+    def has_add_permission(self, request):
+        return False
@@ -1,5 +1,6 @@
 import re
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
@@ -43,3 +44,105 @@ class DBSyncModelColumn(models.Model):
 
     def __str__(self):
         return "{} - {}".format(self.model, self.name)
+
+
+class DBSyncModelConfig(models.Model):
+    PAGINATION_CHOICES = (
+        ("offset", "Offset"),
+        ("keyset", "Keyset"),
+    )
+
+    model = models.CharField(max_length=500, unique=True)
+    exact_count_threshold = models.PositiveIntegerField(
+        null=True, blank=True, default=None,
+        help_text="Changelists run an exact COUNT(*) below this estimated row count, "
+                  "empty uses DBSYNC_EXACT_COUNT_THRESHOLD"
+    )
+    pagination = models.CharField(
+        max_length=20, choices=PAGINATION_CHOICES, blank=True, default="",
+        help_text="Keyset pages seek from the previous page's last row instead of using OFFSET, "
+                  "empty uses DBSYNC_PAGINATION"
+    )
+
+    class Meta:
+        ordering = ("model",)
+
+    def __str__(self):
+        return self.model
+
+
+class DBSyncTableSync(models.Model):
+    STATUS_CHOICES = (
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+
+    model = models.CharField(max_length=500, unique=True)
+    watermark_column = models.CharField(max_length=500, blank=True, default="")
+    watermark = models.JSONField(
+        null=True, blank=True, default=None,
+        help_text="[watermark column value, primary key] of the last synced row, the next run starts after it"
+    )
+    rows_synced = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("model",)
+
+    def __str__(self):
+        return self.model
+
+
+class DBSyncJob(models.Model):
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+        ("cancelled", "Cancelled"),
+    )
+    FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued", db_index=True)
+    cancel_requested = models.BooleanField(default=False)
+    progress = models.BigIntegerField(default=0, help_text="Rows processed so far")
+    total = models.BigIntegerField(null=True, blank=True, default=None, help_text="Rows to process, may be an estimate")
+    message = models.CharField(max_length=500, blank=True, default="")
+    result = models.JSONField(null=True, blank=True, default=None)
+    result_file = models.CharField(max_length=1000, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    worker = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-id",)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+    @property
+    def seconds(self):
+        if not self.started_at:
+            return None
+        return ((self.finished_at or self.heartbeat_at or self.started_at) - self.started_at).total_seconds()
+
+    @property
+    def rows_per_second(self):
+        seconds = self.seconds
+        return self.progress / seconds if seconds else None
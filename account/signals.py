@@ -1,14 +1,20 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from account.models import DBSyncModelColumn
+from account.models import DBSyncModelColumn, DBSyncModelConfig
 
 
-@receiver(post_save, sender=DBSyncModelColumn)
+@receiver([post_save, post_delete], sender=DBSyncModelColumn)
 def update_admin_model(sender, instance, *args, **kwargs):
-    is_created = kwargs['created']
-    if not is_created:
-        # this hack was meant to reload the registered models in django admin to pick the
-        # configuration, but it's not working as expected atm
-        from dbsync.admin import register_external_model
-        register_external_model(refresh_mode=True)
\ No newline at end of file
+    from utils.dbsync_util import invalidate_display_config
+    from utils.schema_reload_util import invalidate_admin_config
+    invalidate_display_config()
+
+    # every worker registers its admins again on its next schema check, see SchemaWatcher
+    invalidate_admin_config()
+
+
+@receiver([post_save, post_delete], sender=DBSyncModelConfig)
+def update_model_config(sender, instance, *args, **kwargs):
+    from utils.dbsync_util import model_configs
+    model_configs.invalidate()
@@ -0,0 +1,46 @@
+import psycopg2.extras
+from django.db.backends.postgresql import base, creation
+
+from utils.pool_util import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # the idle pooled connections to the test database would block its DROP DATABASE
+        close_pools()
+        return super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    psycopg2 backend that borrows its connections from the process wide pool of utils.pool_util,
+    so a request reuses an open connection instead of paying for a new TCP and auth handshake.
+    Closing the connection, e.g. at the end of a request, hands it back to the pool.
+    """
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        # what the stock backend does with a new psycopg2 connection
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        self.isolation_level = base.IsolationLevel(isolation_level or base.IsolationLevel.READ_COMMITTED)
+
+        connection = pool.getconn()
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        pool = get_pool(self.alias)
+        if self.connection is None or pool is None:
+            return super()._close()
+
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+            # also within an atomic block, the pool may hand the connection to another thread
+            self.connection = None
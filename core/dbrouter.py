@@ -1,23 +1,112 @@
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from utils.log_util import AppLogger
+
+# time.time() until which reads go to the primary, see pin_primary and ReadYourWritesMiddleware
+primary_until = ContextVar("dbsync_primary_until", default=0.0)
+
+# replica the current request reads from, so its queries see a single replica
+read_alias = ContextVar("dbsync_read_alias", default=None)
+
+# an idle primary has an old last replayed transaction, a replica that replayed all it received is not behind
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+_lags = {}  # alias: (lag in seconds, time.monotonic() of the check)
+_checking = set()
+_lags_lock = threading.Lock()
+
+
+def pin_primary():
+    """
+    Sends the reads of the current request, and of its session for DBSYNC_READ_PRIMARY_AFTER_WRITE
+    seconds, to the primary so they see what was just written.
+    """
+    primary_until.set(time.time() + settings.DBSYNC_READ_PRIMARY_AFTER_WRITE)
+
+
+def get_replica_lag(alias):
+    """
+    Returns how many seconds `alias` is behind the primary, as of a check at most
+    DBSYNC_REPLICA_LAG_CHECK_INTERVAL seconds old. None while the first check runs in another thread,
+    infinity when the replica cannot be reached.
+    """
+    with _lags_lock:
+        lag, checked_at = _lags.get(alias, (None, None))
+        if alias in _checking or (checked_at is not None
+                                  and time.monotonic() - checked_at < settings.DBSYNC_REPLICA_LAG_CHECK_INTERVAL):
+            return lag
+        _checking.add(alias)
+
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(REPLICA_LAG_SQL)
+            lag = float(cursor.fetchone()[0])
+    except DatabaseError as e:
+        AppLogger.report(e, error=f"Unable to read the replication lag of {alias}")
+        connections[alias].close()
+        lag = float("inf")
+    finally:
+        with _lags_lock:
+            _lags[alias] = (lag, time.monotonic())
+            _checking.discard(alias)
+
+    return lag
+
+
+def get_readable_replicas():
+    return [
+        alias for alias in settings.DBSYNC_READ_REPLICAS
+        if (lag := get_replica_lag(alias)) is not None and lag <= settings.DBSYNC_REPLICA_MAX_LAG
+    ]
+
 
 class ExternalDBRouter:
     """
     Routes database operations for specific models or apps to a different database.
+
+    Reads of the dbsync models are spread over DBSYNC_READ_REPLICAS, one replica per request, leaving
+    out replicas lagging more than DBSYNC_REPLICA_MAX_LAG seconds. They stay on the primary inside
+    one of its transactions and for a while after a write of the same session.
     """
 
     def db_for_read(self, model, **hints):
-        if model._meta.app_label == 'dbsync':  # or check model name
+        if model._meta.app_label != 'dbsync':  # or check model name
+            return None
+
+        if not settings.DBSYNC_READ_REPLICAS or time.time() < primary_until.get() \
+                or connections['external'].in_atomic_block:
             return 'external'
 
-        return None
+        alias = read_alias.get()
+        replicas = get_readable_replicas()
+        if alias not in replicas:
+            alias = random.choice(replicas) if replicas else 'external'
+            read_alias.set(alias)
+
+        return alias
 
     def db_for_write(self, model, **hints):
+        # also asked without a write, e.g. for the transaction of a rejected admin form or a get_or_create
+        # that finds its row, the writes themselves pin the primary: see ExternalQuerySet and dbsync.signals
         if model._meta.app_label == 'dbsync':
             return 'external'
 
         return None
 
     def allow_relation(self, obj1, obj2, **hints):
-        db_list = ('default', 'external')
+        db_list = ('default', 'external', *settings.DBSYNC_READ_REPLICAS)
         if obj1._state.db in db_list and obj2._state.db in db_list:
             return True
 
@@ -27,4 +116,4 @@ class ExternalDBRouter:
         if app_label == 'dbsync':
             return db == 'external'
 
-        return db == 'default'
\ No newline at end of file
+        return db == 'default'
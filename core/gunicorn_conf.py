@@ -0,0 +1,26 @@
+"""
+gunicorn settings: `gunicorn -c python:core.gunicorn_conf core.wsgi:application`.
+
+With --preload the master imports the application once, introspecting the schema and building the
+dynamic models and admins before it forks, and the workers share them copy-on-write. Without it
+every worker builds its own, a single one introspecting while the others wait for its snapshot.
+"""
+import gc
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        # objects of the preloaded application are never collected, so the collector does not
+        # touch, and copy, their pages in every worker
+        gc.freeze()
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        # a forked worker must not share the database connections of the master
+        from django.db import connections
+
+        from utils.pool_util import close_pools
+
+        connections.close_all()
+        close_pools()
@@ -0,0 +1,94 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core.dbrouter import primary_until, read_alias
+from utils.sql_profile_util import QueryProfiler, get_request_profile, record_profile
+
+
+class ReadYourWritesMiddleware:
+    """
+    Carries the primary pin of core.dbrouter.pin_primary over the requests of a session, so the
+    pages that follow a write do not read a replica that has not replayed it yet.
+    """
+
+    SESSION_KEY = "dbsync_primary_until"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = getattr(request, "session", None)
+        pinned_until = session.get(self.SESSION_KEY, 0.0) if session is not None else 0.0
+
+        primary_token = primary_until.set(pinned_until)
+        alias_token = read_alias.set(None)
+        try:
+            response = self.get_response(request)
+            if session is not None and primary_until.get() > pinned_until:
+                session[self.SESSION_KEY] = primary_until.get()
+            return response
+        finally:
+            primary_until.reset(primary_token)
+            read_alias.reset(alias_token)
+
+
+class SchemaReloadMiddleware:
+    """
+    Picks up schema and admin configuration changes between requests, see SchemaWatcher.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DBSYNC_SCHEMA_RELOAD_INTERVAL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from utils.schema_reload_util import schema_watcher
+
+        schema_watcher.check()
+        return self.get_response(request)
+
+
+class SQLProfilingMiddleware:
+    """
+    Times every statement a request runs on every database and records the per request summary of
+    utils.sql_profile_util, grouped by the dynamic model whose admin served it. Only installed when
+    DBSYNC_PROFILE_SQL is set; queries of streamed response bodies are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DBSYNC_PROFILE_SQL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profilers = [QueryProfiler(alias) for alias in connections]
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            for profiler in profilers:
+                stack.enter_context(connections[profiler.alias].execute_wrapper(profiler))
+            response = self.get_response(request)
+
+        record_profile(get_request_profile(
+            profilers, self.get_group(request), request.path, request.method, response.status_code,
+            (time.perf_counter() - started) * 1000,
+        ))
+        return response
+
+    def get_group(self, request):
+        match = request.resolver_match
+        if match is None:
+            return "unresolved"
+
+        # admin views carry their ModelAdmin, see ModelAdmin.get_urls
+        model_admin = getattr(match.func, "model_admin", None)
+        if model_admin is not None:
+            opts = model_admin.model._meta
+            return f"{opts.app_label}.{opts.model_name}:{match.url_name.rsplit('_', 1)[-1]}"
+
+        return match.view_name or "unnamed"
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -8,22 +9,26 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 DEBUG = bool(str(os.getenv('DEBUG')).lower() == 'true')
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'dbsync.apps.DBSyncAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     "account",
     "dbsync",
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.SchemaReloadMiddleware',
+    'core.middleware.SQLProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -53,7 +58,8 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     },
     'external': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        # django.db.backends.postgresql borrowing from the pool configured by DBSYNC_POOL_*
+        'ENGINE': 'core.backends.pooled_postgresql',
         'NAME': os.getenv('DB_NAME', ''),
         'USER': os.getenv('DB_USERNAME', ''),
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
@@ -62,6 +68,18 @@ DATABASES = {
     },
 }
 
+# read replicas of the external database as comma separated host[:port], same name and credentials
+DBSYNC_READ_REPLICAS = []
+for index, replica in enumerate(filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), 1):
+    replica_host, _, replica_port = replica.strip().partition(":")
+    DATABASES[f"external_replica_{index}"] = {
+        **DATABASES["external"],
+        "HOST": replica_host,
+        "PORT": replica_port or DATABASES["external"]["PORT"],
+        "TEST": {"MIRROR": "external"},
+    }
+    DBSYNC_READ_REPLICAS.append(f"external_replica_{index}")
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -100,3 +118,147 @@ CSRF_TRUSTED_ORIGINS = CORS_ALLOWED_ORIGINS
 APPEND_SLASH = False
 
 DATABASE_ROUTERS = ['core.dbrouter.ExternalDBRouter']
+
+REST_FRAMEWORK = {
+    'EXCEPTION_HANDLER': 'core.exceptions.exception_handler.custom_exception_handler',
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+}
+
+# replicas replaying more than this many seconds behind the primary get no reads, checked at most every
+# DBSYNC_REPLICA_LAG_CHECK_INTERVAL seconds per worker
+DBSYNC_REPLICA_MAX_LAG = float(os.getenv("DBSYNC_REPLICA_MAX_LAG", 10))
+DBSYNC_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DBSYNC_REPLICA_LAG_CHECK_INTERVAL", 5))
+# a session reads from the primary for this many seconds after it wrote
+DBSYNC_READ_PRIMARY_AFTER_WRITE = float(os.getenv("DBSYNC_READ_PRIMARY_AFTER_WRITE", 5))
+
+# flock files used to let a single process run startup work such as the model columns sync
+DBSYNC_LOCK_DIR = os.getenv("DBSYNC_LOCK_DIR", tempfile.gettempdir())
+DBSYNC_LOCK_TIMEOUT = int(os.getenv("DBSYNC_LOCK_TIMEOUT", 300))
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_PREFIX = os.getenv("REDIS_PREFIX", "dbsync")
+
+# shared between workers through redis, falls back to a per-process cache without REDIS_URL
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': REDIS_PREFIX,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# seconds changelist pages, counts and filter choices of the external tables stay cached, 0 disables the cache.
+# Writes through ExternalDBManager or the admin invalidate them right away, other writers within the timeout
+DBSYNC_QUERY_CACHE_TIMEOUT = int(os.getenv("DBSYNC_QUERY_CACHE_TIMEOUT", 30))
+
+# list filters show at most this many values, columns and related tables with more get an input instead.
+# Values come from pg_stats or a DISTINCT over the first DBSYNC_FILTER_SAMPLE_ROWS rows
+DBSYNC_FILTER_MAX_CHOICES = int(os.getenv("DBSYNC_FILTER_MAX_CHOICES", 100))
+DBSYNC_FILTER_SAMPLE_ROWS = int(os.getenv("DBSYNC_FILTER_SAMPLE_ROWS", 100000))
+
+# foreign keys to tables above this estimated row count get an autocomplete or a raw id input instead of a select
+DBSYNC_FK_SELECT_MAX_ROWS = int(os.getenv("DBSYNC_FK_SELECT_MAX_ROWS", 1000))
+
+# opt-in per request SQL profiling: query counts, DB time, the slowest statements and the fingerprints run at
+# least DBSYNC_PROFILE_REPEAT_THRESHOLD times (N+1), logged and kept for the last DBSYNC_PROFILE_WINDOW requests
+# of every view
+DBSYNC_PROFILE_SQL = bool(str(os.getenv("DBSYNC_PROFILE_SQL")).lower() == "true")
+DBSYNC_PROFILE_SLOWEST = int(os.getenv("DBSYNC_PROFILE_SLOWEST", 5))
+DBSYNC_PROFILE_REPEAT_THRESHOLD = int(os.getenv("DBSYNC_PROFILE_REPEAT_THRESHOLD", 5))
+DBSYNC_PROFILE_WINDOW = int(os.getenv("DBSYNC_PROFILE_WINDOW", 500))
+
+# set-based bulk delete/update actions: primary keys per statement, and the seconds after which a run stops
+# between two batches so the request ends before the gunicorn timeout
+DBSYNC_BULK_ACTION_BATCH_SIZE = int(os.getenv("DBSYNC_BULK_ACTION_BATCH_SIZE", 5000))
+DBSYNC_BULK_ACTION_TIME_LIMIT = float(os.getenv("DBSYNC_BULK_ACTION_TIME_LIMIT", 60))
+
+# background jobs run by python manage.py run_jobs: directory of the export results and import uploads,
+# worker processes per runner and seconds between two polls of the queue
+DBSYNC_JOB_DIR = os.getenv("DBSYNC_JOB_DIR", os.path.join(MEDIA_ROOT, "jobs"))
+DBSYNC_JOB_PROCESSES = int(os.getenv("DBSYNC_JOB_PROCESSES", 2))
+DBSYNC_JOB_POLL_INTERVAL = float(os.getenv("DBSYNC_JOB_POLL_INTERVAL", 2))
+# running jobs whose runner has not been heard of for this many seconds are marked failed
+DBSYNC_JOB_STALE_AFTER = float(os.getenv("DBSYNC_JOB_STALE_AFTER", 120))
+
+# read API at /api/<model>/: rows per page by default and at most, and the highest planner cost of a single query
+DBSYNC_API_PAGE_SIZE = int(os.getenv("DBSYNC_API_PAGE_SIZE", 100))
+DBSYNC_API_MAX_PAGE_SIZE = int(os.getenv("DBSYNC_API_MAX_PAGE_SIZE", 1000))
+DBSYNC_API_MAX_QUERY_COST = float(os.getenv("DBSYNC_API_MAX_QUERY_COST", 100000))
+# planner cost each user may spend per DBSYNC_API_RATE_WINDOW seconds, further queries get a 429 until the window ends
+DBSYNC_API_COST_BUDGET = float(os.getenv("DBSYNC_API_COST_BUDGET", 1000000))
+DBSYNC_API_RATE_WINDOW = float(os.getenv("DBSYNC_API_RATE_WINDOW", 60))
+
+# process wide pool of external connections used by requests, introspection, sync, import and export,
+# a max size of 0 opens a connection per request instead
+DBSYNC_POOL_MIN_SIZE = int(os.getenv("DBSYNC_POOL_MIN_SIZE", 1))
+DBSYNC_POOL_MAX_SIZE = int(os.getenv("DBSYNC_POOL_MAX_SIZE", 10))
+# seconds a checkout waits for a free connection before failing
+DBSYNC_POOL_TIMEOUT = float(os.getenv("DBSYNC_POOL_TIMEOUT", 30))
+# idle connections above the min size are closed after this many seconds
+DBSYNC_POOL_MAX_IDLE = float(os.getenv("DBSYNC_POOL_MAX_IDLE", 300))
+# connections idle for longer than this many seconds are checked with SELECT 1 before reuse
+DBSYNC_POOL_CHECK_INTERVAL = float(os.getenv("DBSYNC_POOL_CHECK_INTERVAL", 30))
+
+# rows fetched per round trip by the streaming CSV/JSONL export actions
+DBSYNC_EXPORT_CHUNK_SIZE = int(os.getenv("DBSYNC_EXPORT_CHUNK_SIZE", 2000))
+
+# rows per COPY batch of the bulk import, each batch is committed on its own
+DBSYNC_IMPORT_BATCH_SIZE = int(os.getenv("DBSYNC_IMPORT_BATCH_SIZE", 10000))
+
+# SQLite database the sync_tables command copies into the external tables, the default database when empty
+DBSYNC_SYNC_SOURCE = os.getenv("DBSYNC_SYNC_SOURCE", "")
+DBSYNC_SYNC_BATCH_SIZE = int(os.getenv("DBSYNC_SYNC_BATCH_SIZE", 5000))
+DBSYNC_SYNC_WORKERS = int(os.getenv("DBSYNC_SYNC_WORKERS", 4))
+
+# primary key range of the first chunks compare_tables hashes on both sides
+DBSYNC_COMPARE_CHUNK_SIZE = int(os.getenv("DBSYNC_COMPARE_CHUNK_SIZE", 100000))
+
+# the first of these columns a table has tracks its changed rows, the primary key (new rows only) otherwise
+DBSYNC_SYNC_WATERMARK_COLUMNS = [
+    column.strip() for column in os.getenv("DBSYNC_SYNC_WATERMARK_COLUMNS", "updated_at,modified_at").split(",")
+    if column.strip()
+]
+
+# changelists of larger tables show the planner's row estimate instead of running COUNT(*),
+# overridable per table with DBSyncModelConfig.exact_count_threshold
+DBSYNC_EXACT_COUNT_THRESHOLD = int(os.getenv("DBSYNC_EXACT_COUNT_THRESHOLD", 100000))
+
+# offset or keyset, overridable per table with DBSyncModelConfig.pagination
+DBSYNC_PAGINATION = os.getenv("DBSYNC_PAGINATION", "offset")
+
+# admin search backend, dbsync.search.ContainsSearchBackend keeps Django's icontains search
+DBSYNC_SEARCH_BACKEND = os.getenv("DBSYNC_SEARCH_BACKEND", "dbsync.search.IndexedSearchBackend")
+# search the fields without a supporting index with icontains, which reads the whole table
+DBSYNC_SEARCH_UNINDEXED = bool(str(os.getenv("DBSYNC_SEARCH_UNINDEXED", "true")).lower() == "true")
+# the index advisor skips tables below this estimated row count, a sequential scan is cheap there
+DBSYNC_INDEX_ADVISOR_MIN_ROWS = int(os.getenv("DBSYNC_INDEX_ADVISOR_MIN_ROWS", 10000))
+
+# seconds between checks of the shared version of the cached __str__ and DBSyncModelConfig configuration
+DBSYNC_DISPLAY_CONFIG_CHECK_INTERVAL = float(os.getenv("DBSYNC_DISPLAY_CONFIG_CHECK_INTERVAL", 5))
+
+# file, redis or none
+DBSYNC_SCHEMA_SNAPSHOT_BACKEND = os.getenv("DBSYNC_SCHEMA_SNAPSHOT_BACKEND", "file")
+DBSYNC_SCHEMA_SNAPSHOT_PATH = os.getenv("DBSYNC_SCHEMA_SNAPSHOT_PATH", os.path.join(BASE_DIR, ".schema_snapshot.json"))
+
+# seconds between the checks every worker makes, on its next request, for schema changes (catalog fingerprint)
+# and admin configuration changes, which rebuild the changed models in place; 0 disables the checks
+DBSYNC_SCHEMA_RELOAD_INTERVAL = float(os.getenv("DBSYNC_SCHEMA_RELOAD_INTERVAL", 5))
+
+# build each dynamic model on first access instead of all of them at startup
+DBSYNC_LAZY_MODELS = bool(str(os.getenv("DBSYNC_LAZY_MODELS")).lower() == "true")
@@ -2,6 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 
 
-urlpatterns = [
-    path('rp/', admin.site.urls),
-]
+def get_urlpatterns():
+    # rebuilt by dbsync.sites.refresh_admin_urls when dynamic models get registered after startup
+    return [
+        path('rp/', admin.site.urls),
+        path('api/', include('dbsync.urls')),
+    ]
+
+
+urlpatterns = get_urlpatterns()
@@ -1,15 +1,35 @@
+import io
 import json
+import os
 from typing import Any
 import sys
 
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers, widgets
+from django.core.exceptions import FieldDoesNotExist, PermissionDenied, ValidationError
+from django.db import router
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 
 from account.models import DBSyncModelColumn
-from utils.dbsync_util import app_models
+from dbsync.bulk_actions import SetBasedAction, clean_update_value, estimate_delete
+from dbsync.bulk_import import BulkImport, read_file
+from dbsync.changelist import ExternalChangeList, get_cached_rows
+from dbsync.export import export_response
+from dbsync.forms import BulkUpdateForm, ImportForm
+from dbsync.jobs import save_upload, serialize_queryset, submit_job
+from dbsync.paginator import EstimatedCountPaginator
+from dbsync.search import get_search_backend
+from dbsync.sites import refresh_admin_urls
+from utils.dbsync_util import app_models, get_model_config, get_repr_fields, get_seek_columns
 from utils.log_util import AppLogger
+from utils.pg_stats_util import get_estimated_count, get_table_row_estimate
+from utils.query_cache_util import get_cached
 
 
-def make_display_hook(field_name):
+def make_display_hook(field_name, order_field=None):
     def _display(self, obj):
         try:
             if not hasattr(obj, field_name):
@@ -28,11 +48,44 @@ def make_display_hook(field_name):
             return None
 
     _display.short_description = field_name.replace('_', ' ').title()
-    _display.admin_order_field = field_name
+    _display.admin_order_field = order_field or field_name
     return _display
 
 
-def register_external_model(refresh_mode=False):
+def get_concrete_field_names(model, names):
+    """
+    Returns the concrete field names among names, which may also be column names.
+    """
+    field_names = []
+    for name in names:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+
+        if field.concrete:
+            field_names.append(field.name)
+
+    return field_names
+
+
+def get_str_fields(model):
+    """
+    Returns the fields __str__ reads, None when one of them is a callable.
+    """
+    repr_fields = get_repr_fields(model._meta.db_table)
+    if any(callable(field) for field in repr_fields):
+        return None
+
+    return get_concrete_field_names(model, repr_fields)
+
+
+def register_external_model(names=None, replaced=()):
+    """
+    Registers the admin of the built models, or of `names`. The admins of `replaced` model classes,
+    the previous classes of rebuilt models, are dropped in the same swap of the site registry, so a
+    concurrent request sees either the old or the new registrations.
+    """
     class CustomAdmin(admin.ModelAdmin):
 
         list_display = []
@@ -40,13 +93,288 @@ def register_external_model(refresh_mode=False):
         autocomplete_fields = []
         search_fields = []
 
+        # foreign keys whose widget follows the size of their target, {field: target is searchable},
+        # see formfield_for_foreignkey
+        sized_foreign_keys = {}
+
+        # fields the changelist loads besides the ordering and __str__ ones, see get_list_only_fields
+        list_only_fields = []
+
+        # columns of the export actions, the configured list display ones
+        export_columns = []
+
+        actions = ["export_csv", "export_jsonl", "export_csv_job", "export_jsonl_job", "bulk_delete", "bulk_update"]
+
+        # counts come from ExternalChangeList and EstimatedCountPaginator
+        show_full_result_count = False
+
+        @admin.action(description="Export selected rows as CSV", permissions=["view"])
+        def export_csv(self, request, queryset):
+            return export_response(queryset, self.export_columns or [self.model._meta.pk.column], "csv")
+
+        @admin.action(description="Export selected rows as JSON lines", permissions=["view"])
+        def export_jsonl(self, request, queryset):
+            return export_response(queryset, self.export_columns or [self.model._meta.pk.column], "jsonl")
+
+        @admin.action(description="Export selected rows as CSV in the background", permissions=["view"])
+        def export_csv_job(self, request, queryset):
+            return self.submit_job(request, "export", queryset, format="csv",
+                                   columns=self.export_columns or [self.model._meta.pk.column])
+
+        @admin.action(description="Export selected rows as JSON lines in the background", permissions=["view"])
+        def export_jsonl_job(self, request, queryset):
+            return self.submit_job(request, "export", queryset, format="jsonl",
+                                   columns=self.export_columns or [self.model._meta.pk.column])
+
+        @admin.action(description="Delete selected rows in batches", permissions=["delete"])
+        def bulk_delete(self, request, queryset):
+            return self.bulk_action_view(request, queryset, "bulk_delete")
+
+        @admin.action(description="Update a column of the selected rows in batches", permissions=["change"])
+        def bulk_update(self, request, queryset):
+            return self.bulk_action_view(request, queryset, "bulk_update")
+
+        def get_actions(self, request):
+            actions = super().get_actions(request)
+            # collects every cascaded row in Python first, bulk_delete leaves that to the database
+            actions.pop("delete_selected", None)
+            return actions
+
+        def submit_job(self, request, kind, queryset=None, **params):
+            """
+            Queues a job on the table of the admin, for run_jobs, and redirects to its status page.
+            """
+            params["model"] = self.model._meta.db_table
+            if queryset is not None:
+                params["query"] = serialize_queryset(queryset)
+
+            job = submit_job(kind, params, user=request.user)
+            self.message_user(request, f"Job #{job.pk} queued, it runs once a job runner picks it up.", messages.SUCCESS)
+            return redirect(self.admin_site.get_job_url(job))
+
+        def bulk_action_view(self, request, queryset, action):
+            """
+            Confirmation page of the set-based actions with the affected row estimate, see SetBasedAction.
+            """
+            opts = self.model._meta
+            _, table_def = app_models[0].get_table(opts.db_table)
+            columns = [column for column in table_def["columns"] if column != opts.pk.column]
+            form = BulkUpdateForm(columns, request.POST if "confirm" in request.POST else None)
+
+            if "confirm" in request.POST and (action == "bulk_delete" or form.is_valid()):
+                background = bool(request.POST.get("background"))
+                if action == "bulk_delete" and background:
+                    return self.submit_job(request, action, queryset)
+                elif action == "bulk_delete":
+                    report = SetBasedAction(queryset).delete()
+                    done = "deleted"
+                else:
+                    try:
+                        value = clean_update_value(
+                            opts.db_table, form.cleaned_data["column"], form.cleaned_data["value"],
+                            set_null=form.cleaned_data["set_null"],
+                        )
+                    except ValidationError as e:
+                        form.add_error("value", e)
+                        report = None
+                    else:
+                        if background:
+                            # validated again by the job, from the submitted text
+                            return self.submit_job(
+                                request, action, queryset, column=form.cleaned_data["column"],
+                                value=form.cleaned_data["value"], set_null=form.cleaned_data["set_null"],
+                            )
+                        report = SetBasedAction(queryset).update(form.cleaned_data["column"], value)
+                        done = "updated"
+
+                if report is not None:
+                    summary = f"{report['rows']} rows {done} in {report['batches']} batches ({report['seconds']:.1f}s)"
+                    if report["error"]:
+                        self.message_user(request, f"{summary}, then the database refused: {report['error']}",
+                                          messages.ERROR)
+                    elif not report["done"]:
+                        self.message_user(request, f"{summary}, stopped after {settings.DBSYNC_BULK_ACTION_TIME_LIMIT}s. "
+                                                   f"Run the action again for the remaining rows.", messages.WARNING)
+                    else:
+                        self.message_user(request, summary, messages.SUCCESS)
+                    return None
+
+            if action == "bulk_delete":
+                estimate = estimate_delete(queryset)
+            else:
+                rows, estimated = get_estimated_count(queryset, settings.DBSYNC_EXACT_COUNT_THRESHOLD)
+                estimate = {"rows": rows, "estimated": estimated}
+
+            context = {
+                **self.admin_site.each_context(request),
+                "title": "Delete rows" if action == "bulk_delete" else "Update rows",
+                "opts": opts,
+                "action": action,
+                "estimate": estimate,
+                "form": form if action == "bulk_update" else None,
+                "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+                "select_across": request.POST.get("select_across", "0"),
+                "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+                "batch_size": settings.DBSYNC_BULK_ACTION_BATCH_SIZE,
+                "time_limit": settings.DBSYNC_BULK_ACTION_TIME_LIMIT,
+                "background": bool(request.POST.get("background")),
+            }
+            return TemplateResponse(request, "admin/dbsync/bulk_action.html", context)
+
+        def get_list_only_fields(self, ordering):
+            """
+            Returns the fields the changelist has to load: the displayed, ordering and __str__ columns,
+            and the __str__ columns of the select_related models. None loads every column.
+            """
+            opts = self.model._meta
+            fields = {opts.pk.name, *self.list_only_fields}
+
+            str_fields = get_str_fields(self.model)
+            if str_fields is None:
+                return None
+            fields.update(str_fields)
+
+            ordering_fields = [name.lstrip("-") for name in ordering if isinstance(name, str)]
+            fields.update(get_concrete_field_names(self.model, [name for name in ordering_fields if name != "pk"]))
+
+            for related_name in self.list_select_related or []:
+                related_fields = get_str_fields(opts.get_field(related_name).related_model)
+                fields.add(related_name)
+                fields.update(f"{related_name}__{name}" for name in related_fields or [])
+
+            return sorted(fields)
+
+        def get_exact_count_threshold(self):
+            config = get_model_config(self.model._meta.db_table)
+            if config and config.exact_count_threshold is not None:
+                return config.exact_count_threshold
+
+            return settings.DBSYNC_EXACT_COUNT_THRESHOLD
+
+        def use_keyset_pagination(self):
+            config = get_model_config(self.model._meta.db_table)
+            return ((config and config.pagination) or settings.DBSYNC_PAGINATION) == "keyset"
+
+        def get_keyset_columns(self):
+            return get_seek_columns(self.model._meta.db_table)
+
+        def get_search_results(self, request, queryset, search_term):
+            backend = get_search_backend(self.model._meta.db_table, self.get_search_fields(request))
+            return backend.search(queryset, search_term), False
+
+        def get_autocomplete_results(self, request, queryset, term, to_field_name):
+            """
+            Indexed prefix search over the pk, `to_field_name` and __str__ columns only.
+            """
+            backend = get_search_backend(self.model._meta.db_table, self.get_search_fields(request))
+            queryset = backend.autocomplete(queryset, term)
+
+            str_fields = get_str_fields(self.model)
+            if str_fields is not None:
+                fields = {self.model._meta.pk.name, *get_concrete_field_names(self.model, [to_field_name]), *str_fields}
+                queryset = queryset.only(*fields)
+
+            return queryset.order_by("pk")
+
+        def get_urls(self):
+            opts = self.model._meta
+            return [
+                path("import/", self.admin_site.admin_view(self.import_view),
+                     name=f"{opts.app_label}_{opts.model_name}_import"),
+            ] + super().get_urls()
+
+        def import_view(self, request):
+            """
+            Bulk import of an uploaded file, see BulkImport. Upserts also need the change permission.
+            """
+            if not self.has_add_permission(request):
+                raise PermissionDenied
+
+            form = ImportForm(request.POST or None, request.FILES or None)
+            context = {
+                **self.admin_site.each_context(request),
+                "title": f"Import {self.model._meta.verbose_name_plural}",
+                "opts": self.model._meta,
+                "form": form,
+                "batch_size": settings.DBSYNC_IMPORT_BATCH_SIZE,
+            }
+
+            if request.method == "POST" and form.is_valid():
+                if form.cleaned_data["mode"] == "upsert" and not self.has_change_permission(request):
+                    raise PermissionDenied
+
+                conflict_columns = [
+                    column.strip() for column in form.cleaned_data["conflict_columns"].split(",") if column.strip()
+                ]
+                if form.cleaned_data["background"]:
+                    return self.submit_job(
+                        request, "import", path=save_upload(form.cleaned_data["file"]),
+                        format=form.cleaned_data["format"], mode=form.cleaned_data["mode"],
+                        conflict_columns=conflict_columns,
+                    )
+
+                file = io.TextIOWrapper(form.cleaned_data["file"], encoding="utf-8-sig", newline="")
+                try:
+                    columns, rows = read_file(file, form.cleaned_data["format"])
+                    bulk_import = BulkImport(
+                        self.model._meta.db_table, columns, mode=form.cleaned_data["mode"],
+                        conflict_columns=conflict_columns,
+                    )
+                    reports = list(bulk_import.run(rows))
+                except ValueError as e:
+                    form.add_error("file", str(e))
+                else:
+                    context.update({
+                        "reports": reports,
+                        "imported": sum(report["rows"] for report in reports),
+                        "skipped": sum(report["skipped"] for report in reports),
+                        "failed": sum(1 for report in reports if report["error"]),
+                    })
+
+            return TemplateResponse(request, "admin/dbsync/import.html", context)
+
+        def formfield_for_foreignkey(self, db_field, request, **kwargs):
+            if "widget" not in kwargs and db_field.name in self.sized_foreign_keys:
+                widget = get_foreign_key_widget(db_field, self.sized_foreign_keys[db_field.name])
+                if widget == "autocomplete":
+                    kwargs["widget"] = widgets.AutocompleteSelect(db_field, self.admin_site, using=kwargs.get("using"))
+                elif widget == "raw_id":
+                    kwargs["widget"] = widgets.ForeignKeyRawIdWidget(
+                        db_field.remote_field, self.admin_site, using=kwargs.get("using")
+                    )
+
+            return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+        def get_changelist(self, request, **kwargs):
+            return ExternalChangeList
+
+        def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+            return EstimatedCountPaginator(
+                queryset, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+                exact_count_threshold=self.get_exact_count_threshold(), fetch=get_cached_rows
+            )
+
     models, foreign_fields, _, model_fields, *_ = app_models
-    for name, model_cls in models.items():
+    searchable_models = set(
+        DBSyncModelColumn.objects.filter(in_searchable_list=True).values_list("model", flat=True).distinct()
+    )
+
+    if names is None:
+        registered_models = models.built()
+    else:
+        registered_models = {name: models[name] for name in names}
+
+    admin_classes = {}
+    for name, model_cls in registered_models.items():
         try:
             autocomplete_fields = []
+            sized_foreign_keys = {}
             display_fields = []
             search_fields = []
             filter_fields = []
+            select_related_fields = []
+            only_fields = []
+            export_columns = []
 
             for model_field in DBSyncModelColumn.objects.filter(model=name).order_by("order"):
                 field = model_field.name
@@ -57,13 +385,28 @@ def register_external_model(refresh_mode=False):
 
                 if model_field.in_list_display_list:
                     method_name = f"d_{d_field}"
-                    display_method = make_display_hook(field)
+
+                    if model_field.is_foreign_key and is_relation(model_cls, d_field):
+                        # show the related object, fetched with the changelist rows by list_select_related
+                        display_method = make_display_hook(d_field, order_field=field)
+                        select_related_fields.append(d_field)
+                    else:
+                        display_method = make_display_hook(field)
+
+                    concrete_fields = get_concrete_field_names(model_cls, [field])
+                    only_fields.extend(concrete_fields)
+                    if concrete_fields:
+                        export_columns.append(field)
 
                     setattr(CustomAdmin, method_name, display_method)
                     display_fields.append(method_name)
 
-                if model_field.in_autocomplete_list and model_field.is_foreign_key:
-                    autocomplete_fields.append(d_field)
+                if model_field.is_foreign_key and is_relation(model_cls, d_field):
+                    searchable = model_cls._meta.get_field(d_field).related_model._meta.db_table in searchable_models
+                    if model_field.in_autocomplete_list and searchable:
+                        autocomplete_fields.append(d_field)
+                    else:
+                        sized_foreign_keys[d_field] = searchable
 
                 if model_field.in_searchable_list:
                     search_fields.append(field)
@@ -75,25 +418,81 @@ def register_external_model(refresh_mode=False):
                 f"{model_cls.__name__}Admin", (CustomAdmin,),
                 {
                     "autocomplete_fields": autocomplete_fields,
+                    "sized_foreign_keys": sized_foreign_keys,
                     "search_fields": search_fields,
                     "list_display": display_fields,
-                    "list_filter": filter_fields
+                    "list_filter": filter_fields,
+                    "list_select_related": select_related_fields,
+                    "list_only_fields": only_fields,
+                    "export_columns": export_columns,
                 }
             )
-            if refresh_mode:
-                try:
-                    # todo: this does not seem to be working as intended, we hooked on post_save for
-                    admin.site.unregister(model_cls)
-                except Exception as e:
-                    AppLogger.report(e)
-
-            admin.site.register(model_cls, admin_cls)
+            admin_classes[model_cls] = admin_cls
         except Exception as e:
             AppLogger.report(e)
 
+    registry = dict(admin.site._registry)
+    for model_cls in replaced:
+        registry.pop(model_cls, None)
+    for model_cls, admin_cls in admin_classes.items():
+        registry[model_cls] = admin_cls(model_cls, admin.site)
+    admin.site._registry = registry
+
+
+def get_cached_row_estimate(model):
+    """
+    Returns the live pg_class.reltuples of the table of `model`, kept in the query cache with its
+    table version, None when it is unknown.
+    """
+    queryset = model._default_manager.using(router.db_for_read(model)).all()
+
+    def compute():
+        try:
+            return {"rows": get_table_row_estimate(model._meta.db_table, using=queryset.db)}
+        except Exception as e:
+            AppLogger.report(e, error=f"Unable to estimate the row count of {model.__name__}")
+            return {"rows": None}
+
+    return get_cached("count", queryset, compute, "reltuples")["rows"]
+
+
+def get_foreign_key_widget(field, searchable):
+    """
+    Returns "autocomplete", "raw_id" or None (a select of every row) for a foreign key not flagged for
+    autocomplete. Targets above DBSYNC_FK_SELECT_MAX_ROWS rows, or of unknown size, never get a select.
+    Autocomplete needs search fields on the target admin.
+    """
+    row_estimate = get_cached_row_estimate(field.related_model)
+    if row_estimate is not None and row_estimate <= settings.DBSYNC_FK_SELECT_MAX_ROWS:
+        return None
+
+    return "autocomplete" if searchable else "raw_id"
+
+
+def is_relation(model_cls, field_name):
+    try:
+        return model_cls._meta.get_field(field_name).is_relation
+    except FieldDoesNotExist:
+        return False
+
 
 def is_runserver_or_wsgi():
-    return 'runserver' in sys.argv or 'gunicorn' in sys.argv
+    # gunicorn runs as the path of its script
+    return 'runserver' in sys.argv or os.path.basename(sys.argv[0]) == 'gunicorn'
+
+
+def register_built_models(names):
+    register_external_model(names=names)
+    refresh_admin_urls()
+
+
+def register_reloaded_models(names, replaced):
+    # the url patterns hold the views of the previous admin instances
+    register_external_model(names=names, replaced=replaced.values())
+    refresh_admin_urls()
+
 
 if is_runserver_or_wsgi():
     register_external_model()
+    app_models[0].add_build_listener(register_built_models)
+    app_models[0].add_reload_listener(register_reloaded_models)
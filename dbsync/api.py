@@ -0,0 +1,267 @@
+import base64
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ParseError, PermissionDenied
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.exceptions.exception_handler import RateLimitException
+from dbsync.export import EXPORT_FORMATS, iter_jsonl
+from dbsync.index_advisor import get_leading_index_methods
+from utils.dbsync_util import app_models, get_column_field, to_camel_case
+from utils.pg_stats_util import get_sql_cost
+from utils.query_cache_util import get_table_versions
+from utils.rate_limit_util import charge_budget
+
+# lookups an index whose first column is the filtered one serves, by index method
+INDEX_LOOKUPS = {
+    "btree": ("exact", "in", "isnull", "gt", "gte", "lt", "lte"),
+    "hash": ("exact", "in"),
+    "brin": ("exact", "gt", "gte", "lt", "lte"),
+}
+
+# query parameters that are not filters
+RESERVED_PARAMS = ("fields", "cursor", "limit", "format")
+
+
+class JSONLinesRenderer(BaseRenderer):
+    """
+    Selects the streamed JSON lines responses with ?format=jsonl or Accept: application/x-ndjson,
+    the rows themselves are rendered by iter_jsonl.
+    """
+    media_type = EXPORT_FORMATS["jsonl"]
+    format = "jsonl"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+def get_filter_lookups(table_def):
+    """
+    Returns {column: lookups} of the columns leading a full index of the table, the only ones the API filters on.
+    """
+    lookups = {}
+    for column in table_def["columns"]:
+        methods = get_leading_index_methods(table_def, column)
+        allowed = {lookup for method in methods for lookup in INDEX_LOOKUPS.get(method, ())}
+        if allowed:
+            lookups[column] = sorted(allowed)
+
+    return lookups
+
+
+def encode_cursor(pk):
+    return base64.urlsafe_b64encode(json.dumps([pk], cls=DjangoJSONEncoder).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))[0]
+    except (ValueError, TypeError, IndexError):
+        raise ParseError("Invalid cursor")
+
+
+def has_view_permission(user, model_name):
+    # like ModelAdmin.has_view_permission, without building the model
+    opts_model_name = to_camel_case(model_name).lower()
+    return any(
+        user.has_perm(f"dbsync.{action}_{opts_model_name}") for action in ("view", "change")
+    )
+
+
+class TableListView(APIView):
+    """
+    Lists the tables of the external database the user can read, with their columns and filters.
+    """
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        registry = app_models[0]
+        tables = []
+
+        for name in sorted(registry):
+            if not has_view_permission(request.user, name):
+                continue
+
+            _, table_def = registry.get_table(name)
+            tables.append({
+                "name": name,
+                "url": request.build_absolute_uri(reverse("dbsync_api_rows", kwargs={"model_name": name})),
+                "columns": {column: col_def["type"] for column, col_def in table_def["columns"].items()},
+                "filters": get_filter_lookups(table_def),
+                "row_estimate": table_def.get("row_estimate"),
+            })
+
+        return Response({"tables": tables})
+
+
+class TableRowsView(APIView):
+    """
+    Rows of a table in primary key order, `limit` per page with a cursor to the next page, or every
+    row from the cursor on as streamed JSON lines (?format=jsonl) read through a server-side cursor.
+
+    ?fields=a,b selects columns; other parameters filter, as `column` or `column__lookup`, on the
+    columns leading an index. Queries whose planner cost goes over DBSYNC_API_MAX_QUERY_COST, or
+    past the DBSYNC_API_COST_BUDGET of the user, are refused with 429 responses before they run.
+    """
+    renderer_classes = [JSONRenderer, JSONLinesRenderer]
+
+    def get(self, request, model_name):
+        registry = app_models[0]
+        if model_name not in registry:
+            raise NotFound(f"Unknown table {model_name}")
+        if not has_view_permission(request.user, model_name):
+            raise PermissionDenied
+
+        model = registry[model_name]
+        table_name, table_def = registry.get_table(model_name)
+        pk_column = model._meta.pk.column
+        stream = request.accepted_renderer.format == "jsonl"
+
+        etag = self.get_etag(request, table_name)
+        if etag and etag in request.headers.get("If-None-Match", ""):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        columns = self.get_columns(request, table_def)
+        queryset = model.objects.filter(**self.get_filters(request, table_def)).order_by("pk")
+        if request.query_params.get("cursor"):
+            try:
+                last_pk = model._meta.pk.to_python(decode_cursor(request.query_params["cursor"]))
+            except ValidationError:
+                raise ParseError("Invalid cursor")
+            queryset = queryset.filter(pk__gt=last_pk)
+
+        if stream:
+            self.check_cost(request, queryset.values_list(*columns))
+            response = StreamingHttpResponse(
+                iter_jsonl(queryset, columns, settings.DBSYNC_EXPORT_CHUNK_SIZE), content_type=EXPORT_FORMATS["jsonl"]
+            )
+        else:
+            limit = self.get_limit(request)
+            select_columns = columns if pk_column in columns else columns + [pk_column]
+            page = queryset.values_list(*select_columns)[:limit + 1]
+            self.check_cost(request, page)
+
+            rows = list(page)
+            results = [dict(zip(columns, row)) for row in rows[:limit]]
+            next_url = None
+            if len(rows) > limit:
+                params = request.query_params.copy()
+                params["cursor"] = encode_cursor(rows[limit - 1][select_columns.index(pk_column)])
+                next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+            response = Response({"results": results, "next": next_url})
+
+        if etag:
+            response["ETag"] = etag
+        return response
+
+    def get_etag(self, request, table_name):
+        """
+        Returns an ETag from the cache version of the table, bumped by every write through the app,
+        and the query. Writes from other systems only show up once DBSYNC_QUERY_CACHE_TIMEOUT
+        expires, like in the query cache; a timeout of 0 sends no ETag.
+        """
+        if not settings.DBSYNC_QUERY_CACHE_TIMEOUT:
+            return None
+
+        versions = get_table_versions([table_name])
+        if not versions or versions[table_name] is None:
+            return None
+
+        window = int(time.time() // settings.DBSYNC_QUERY_CACHE_TIMEOUT)
+        digest = hashlib.md5(repr((
+            app_models[0].fingerprint, versions[table_name], window, request.accepted_renderer.format,
+            sorted(request.query_params.lists()),
+        )).encode()).hexdigest()
+        return f'"{digest}"'
+
+    def get_columns(self, request, table_def):
+        if not request.query_params.get("fields"):
+            return list(table_def["columns"])
+
+        columns = [column.strip() for column in request.query_params["fields"].split(",") if column.strip()]
+        unknown = [column for column in columns if column not in table_def["columns"]]
+        if unknown:
+            raise ParseError(f"Unknown fields: {', '.join(unknown)}")
+
+        return list(dict.fromkeys(columns))
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get("limit", settings.DBSYNC_API_PAGE_SIZE))
+        except ValueError:
+            raise ParseError("limit has to be a number")
+
+        if not 1 <= limit <= settings.DBSYNC_API_MAX_PAGE_SIZE:
+            raise ParseError(f"limit has to be between 1 and {settings.DBSYNC_API_MAX_PAGE_SIZE}")
+
+        return limit
+
+    def get_filters(self, request, table_def):
+        """
+        Returns the filter kwargs of the query parameters, the values cleaned by the field of the column type.
+        """
+        filter_lookups = get_filter_lookups(table_def)
+        filters = {}
+
+        for param, values in request.query_params.lists():
+            if param in RESERVED_PARAMS:
+                continue
+
+            column, _, lookup = param.partition("__")
+            lookup = lookup or "exact"
+            if column not in table_def["columns"]:
+                raise ParseError(f"Unknown field {column}")
+            if lookup not in filter_lookups.get(column, ()):
+                indexed = ", ".join(f"{name} ({', '.join(lookups)})" for name, lookups in filter_lookups.items())
+                raise ParseError(f"{param} is not served by an index, filters: {indexed or 'none'}")
+
+            field, _ = get_column_field(table_def["columns"][column])
+            value = values[-1]
+            try:
+                if lookup == "isnull":
+                    if value.lower() not in ("true", "false"):
+                        raise ValidationError("true or false")
+                    filters[f"{column}__{lookup}"] = value.lower() == "true"
+                elif lookup == "in":
+                    items = [item for item in value.split(",") if item]
+                    if not items:
+                        raise ValidationError("a comma separated list")
+                    filters[f"{column}__{lookup}"] = [field.to_python(item) for item in items]
+                else:
+                    filters[f"{column}__{lookup}"] = field.to_python(value)
+            except ValidationError as e:
+                raise ParseError(f"{param}: {' '.join(e.messages)}")
+
+        return filters
+
+    def check_cost(self, request, queryset):
+        """
+        Refuses the query when its planner cost alone is over DBSYNC_API_MAX_QUERY_COST, or when it
+        takes the user over the cost budget of the current window.
+        """
+        sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+        cost = get_sql_cost(sql, params, using=queryset.db)
+
+        if cost > settings.DBSYNC_API_MAX_QUERY_COST:
+            raise RateLimitException(
+                f"The query is too expensive (cost {cost:.0f}, at most {settings.DBSYNC_API_MAX_QUERY_COST:.0f}), "
+                f"filter on an indexed field or lower the limit"
+            )
+
+        wait = charge_budget(
+            f"api:{request.user.pk}", cost, settings.DBSYNC_API_COST_BUDGET, settings.DBSYNC_API_RATE_WINDOW
+        )
+        if wait is not None:
+            exc = RateLimitException()
+            exc.wait = wait
+            raise exc
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.contrib.admin import apps as admin_apps
 
 
 class DbsyncConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dbsync'
+
+    def ready(self):
+        import dbsync.filters
+        import dbsync.signals
+
+
+class DBSyncAdminConfig(admin_apps.AdminConfig):
+    # referenced explicitly from INSTALLED_APPS, it must not be picked as the default config of "dbsync"
+    default = False
+    default_site = "dbsync.sites.DBSyncAdminSite"
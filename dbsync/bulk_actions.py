@@ -0,0 +1,205 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections, router, transaction
+
+from core.dbrouter import pin_primary
+from utils.dbsync_util import app_models, get_column_field
+from utils.log_util import AppLogger
+from utils.pg_stats_util import get_estimated_count, get_sql_row_estimate
+from utils.query_cache_util import bump_table_version
+
+# levels of cascading foreign keys followed by the estimate
+MAX_CASCADE_DEPTH = 3
+
+BLOCKING_ACTIONS = ("NO ACTION", "RESTRICT")
+
+
+def get_referencing_columns(table_name):
+    """
+    Returns (table, column, referenced column, on delete action) of the foreign keys pointing at `table_name`.
+    """
+    registry = app_models[0]
+    references = []
+
+    for name in registry:
+        child_table, table_def = registry.get_table(name)
+        for column, col_def in table_def["columns"].items():
+            fk = col_def.get("foreign_key")
+            if fk and fk["table"] == table_name:
+                references.append((child_table, column, fk["column"], fk.get("on_delete", "NO ACTION")))
+
+    return sorted(references)
+
+
+def get_sql(queryset):
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    return sql, list(params)
+
+
+def estimate_delete(queryset):
+    """
+    Returns the rows a delete of `queryset` removes and what the foreign keys of the database do
+    to the rows referencing them: the estimated rows deleted (CASCADE) or updated (SET NULL/DEFAULT)
+    per referencing column, and the columns whose rows make the delete fail (NO ACTION/RESTRICT).
+    """
+    rows, estimated = get_estimated_count(queryset, settings.DBSYNC_EXACT_COUNT_THRESHOLD)
+    report = {"rows": rows, "estimated": estimated, "cascades": [], "blocked": []}
+
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    opts = queryset.model._meta
+    sql, params = get_sql(queryset.order_by().values("pk"))
+
+    # each level selects the full rows removed from its table
+    pending = [(opts.db_table, f"SELECT * FROM {quote_name(opts.db_table)} WHERE {quote_name(opts.pk.column)} IN ({sql})",
+                params, 1)]
+    try:
+        while pending:
+            table, rows_sql, rows_params, depth = pending.pop(0)
+
+            for child_table, column, target, action in get_referencing_columns(table):
+                child_sql = (
+                    f"SELECT c.* FROM {quote_name(child_table)} c "
+                    f"WHERE c.{quote_name(column)} IN (SELECT p.{quote_name(target)} FROM ({rows_sql}) p)"
+                )
+                item = {"table": child_table, "column": column, "action": action, "depth": depth}
+
+                if action in BLOCKING_ACTIONS:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"SELECT EXISTS ({child_sql})", rows_params)
+                        if cursor.fetchone()[0]:
+                            report["blocked"].append(item)
+                    continue
+
+                item["rows"] = get_sql_row_estimate(child_sql, rows_params, using=queryset.db)
+                report["cascades"].append(item)
+
+                if action == "CASCADE" and depth < MAX_CASCADE_DEPTH and child_table != table:
+                    pending.append((child_table, child_sql, rows_params, depth + 1))
+    except DatabaseError as e:
+        AppLogger.report(e, error=f"Unable to estimate the delete of {opts.db_table} rows")
+
+    return report
+
+
+def get_affected_tables(table_name):
+    """
+    Returns `table_name` and the tables the database may change along with it through foreign key actions.
+    """
+    tables, pending = set(), [table_name]
+    while pending:
+        table = pending.pop()
+        if table in tables:
+            continue
+
+        tables.add(table)
+        pending.extend(
+            child_table for child_table, _, _, action in get_referencing_columns(table) if action not in BLOCKING_ACTIONS
+        )
+
+    return tables
+
+
+def clean_update_value(table_name, column, value, set_null=False):
+    """
+    Validates the new value of `column` against the field TYPE_MAP gives its type, like BulkImport.
+    """
+    _, table_def = app_models[0].get_table(table_name)
+    col_def = table_def["columns"][column]
+
+    if set_null:
+        if not col_def["nullable"]:
+            raise ValidationError(f"{column} cannot be NULL")
+        return None
+
+    field, _ = get_column_field(col_def)
+    value = field.to_python(value)
+
+    max_length = col_def.get("max_length")
+    if max_length and isinstance(value, str) and len(value) > max_length:
+        raise ValidationError(f"Longer than {max_length} characters")
+
+    return value
+
+
+class SetBasedAction:
+    """
+    Deletes or updates the rows of a queryset with one statement per `batch_size` primary keys, in key
+    order and one transaction per batch, leaving foreign key actions to the database instead of
+    Django's deletion collector. Stops once `time_limit` seconds have passed; the committed batches
+    stay and running the action again carries on with the remaining rows. `callback` gets the report
+    after every batch, e.g. the progress of a background job.
+    """
+
+    def __init__(self, queryset, batch_size=None, time_limit=None, callback=None):
+        self.model = queryset.model
+        self.using = router.db_for_write(self.model)
+        # the batches are read and written by the same statement, on the primary
+        self.queryset = queryset.using(self.using)
+        self.batch_size = batch_size or settings.DBSYNC_BULK_ACTION_BATCH_SIZE
+        self.time_limit = time_limit or settings.DBSYNC_BULK_ACTION_TIME_LIMIT
+        self.callback = callback
+
+    def delete(self):
+        return self.run(
+            "DELETE FROM {table} WHERE {pk} IN (SELECT pk FROM batch)", [],
+            get_affected_tables(self.model._meta.db_table),
+        )
+
+    def update(self, column, value):
+        field, _ = get_column_field(app_models[0].get_table(self.model._meta.db_table)[1]["columns"][column])
+        value = field.get_db_prep_value(value, connections[self.using]) if value is not None else None
+        return self.run(
+            f"UPDATE {{table}} SET {self.quote(column)} = %s WHERE {{pk}} IN (SELECT pk FROM batch)", [value],
+            [self.model._meta.db_table],
+        )
+
+    def quote(self, name):
+        return connections[self.using].ops.quote_name(name)
+
+    def run(self, statement, params, tables):
+        """
+        Runs `statement` over every batch, `tables` are the ones whose cached queries it invalidates.
+        """
+        opts = self.model._meta
+        statement = statement.format(table=self.quote(opts.db_table), pk=self.quote(opts.pk.column))
+        report = {"rows": 0, "batches": 0, "seconds": 0.0, "done": False, "error": None}
+        started = time.perf_counter()
+        last = None
+
+        try:
+            while time.perf_counter() - started < self.time_limit:
+                batch = self.queryset.order_by("pk").values_list("pk", flat=True)
+                if last is not None:
+                    batch = batch.filter(pk__gt=last)
+                batch_sql, batch_params = get_sql(batch[:self.batch_size])
+
+                with transaction.atomic(using=self.using), connections[self.using].cursor() as cursor:
+                    cursor.execute(
+                        f"WITH batch (pk) AS ({batch_sql}), changed AS ({statement} RETURNING 1) "
+                        f"SELECT (SELECT count(*) FROM changed), (SELECT max(pk) FROM batch)",
+                        [*batch_params, *params],
+                    )
+                    rows, last_pk = cursor.fetchone()
+
+                if last_pk is None:
+                    report["done"] = True
+                    break
+
+                report["rows"] += rows
+                report["batches"] += 1
+                last = last_pk
+                if self.callback:
+                    self.callback(report)
+        except DatabaseError as e:
+            report["error"] = str(e).strip()
+        finally:
+            if report["rows"]:
+                for table in tables:
+                    bump_table_version(table, using=self.using)
+                pin_primary()
+
+        report["seconds"] = time.perf_counter() - started
+        return report
@@ -0,0 +1,303 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections, transaction
+
+from core.dbrouter import pin_primary
+from dbsync.search import INTEGER_TYPES
+from utils.dbsync_util import app_models, get_column_field
+from utils.query_cache_util import bump_table_version
+
+IMPORT_FORMATS = ("csv", "jsonl")
+IMPORT_MODES = ("insert", "upsert")
+
+STAGING_TABLE = "_dbsync_import"
+STAGING_LINE_COLUMN = "_dbsync_line"
+
+# invalid rows listed per batch, the others are only counted
+MAX_BATCH_ERRORS = 20
+
+
+def read_csv(file):
+    """
+    Returns the header of a CSV file and an iterator of (line number, row). Empty values are NULL,
+    like in the CSV format of COPY.
+    """
+    reader = csv.reader(file)
+    columns = next(reader, None)
+    if not columns:
+        raise ValueError("The file has no header row")
+
+    def rows():
+        for values in reader:
+            if not values:
+                continue
+            if len(values) != len(columns):
+                yield reader.line_num, ValidationError(f"{len(values)} values for {len(columns)} columns")
+            else:
+                yield reader.line_num, dict(zip(columns, [value if value != "" else None for value in values]))
+
+    return columns, rows()
+
+
+def read_jsonl(file):
+    """
+    Returns the keys of the first object of a JSON lines file and an iterator of (line number, row).
+    Keys missing from a later object are NULL.
+    """
+    lines = (item for item in enumerate(file, 1) if item[1].strip())
+    first = next(lines, None)
+    if first is None:
+        raise ValueError("The file is empty")
+
+    try:
+        first_row = json.loads(first[1])
+    except ValueError as e:
+        raise ValueError(f"Line {first[0]} is not valid JSON: {e}")
+    if not isinstance(first_row, dict):
+        raise ValueError(f"Line {first[0]} is not a JSON object")
+
+    columns = list(first_row)
+
+    def rows():
+        yield first[0], first_row
+        for line, text in lines:
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                yield line, ValidationError(f"invalid JSON: {e}")
+                continue
+
+            if not isinstance(row, dict):
+                yield line, ValidationError("not a JSON object")
+            elif set(row) - set(columns):
+                yield line, ValidationError(f"unknown columns {', '.join(sorted(set(row) - set(columns)))}")
+            else:
+                yield line, row
+
+    return columns, rows()
+
+
+def read_file(file, import_format):
+    return read_csv(file) if import_format == "csv" else read_jsonl(file)
+
+
+def get_unique_columns(table_def):
+    """
+    Returns the column lists of the primary key and unique indexes, the possible ON CONFLICT targets.
+    """
+    return [
+        index["columns"] for index in sorted(table_def.get("indexes", []), key=lambda index: not index["primary"])
+        if index["unique"] and not index["partial"] and None not in index["columns"]
+    ]
+
+
+def to_copy_text(value):
+    """
+    Renders a value in the text format of COPY.
+    """
+    if value is None:
+        return r"\N"
+
+    if isinstance(value, bool):
+        text = "t" if value else "f"
+    elif isinstance(value, (bytes, memoryview)):
+        text = "\\x" + bytes(value).hex()
+    elif hasattr(value, "isoformat"):
+        text = value.isoformat()
+    else:
+        text = str(value)
+
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def clean_value(column, col_def, field, value):
+    """
+    Validates `value` against the field TYPE_MAP gives the column type and returns its COPY text.
+    """
+    if value is None:
+        if not col_def["nullable"]:
+            raise ValidationError(f"{column}: this column cannot be NULL")
+        return r"\N"
+
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+
+    try:
+        value = field.to_python(value)
+    except ValidationError as e:
+        raise ValidationError(f"{column}: {' '.join(e.messages)}")
+
+    max_length = col_def.get("max_length")
+    if max_length and isinstance(value, str) and len(value) > max_length:
+        raise ValidationError(f"{column}: longer than {max_length} characters")
+
+    return to_copy_text(value)
+
+
+class BulkImport:
+    """
+    Loads rows into an external table with COPY FROM STDIN, one transaction per batch so a failing
+    batch only loses its own rows. Values are checked against the introspected column types first,
+    invalid rows are skipped and reported with their line number.
+
+    The upsert mode copies each batch into a temporary staging table, then merges it with
+    INSERT ... ON CONFLICT (`conflict_columns`, the primary key by default) DO UPDATE.
+    """
+
+    def __init__(self, model_name, columns, mode="insert", conflict_columns=None, batch_size=None, using="external"):
+        self.table_name, self.table_def = app_models[0].get_table(model_name)
+        self.columns = list(columns)
+        self.mode = mode
+        self.batch_size = batch_size or settings.DBSYNC_IMPORT_BATCH_SIZE
+        self.using = using
+
+        unknown = [column for column in self.columns if column not in self.table_def["columns"]]
+        if unknown:
+            raise ValueError(f"Unknown columns for {self.table_name}: {', '.join(unknown)}")
+        if len(set(self.columns)) != len(self.columns):
+            raise ValueError("Duplicate columns")
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Unknown import mode {mode}")
+
+        self.fields = {
+            column: get_column_field(self.table_def["columns"][column])[0] for column in self.columns
+        }
+
+        self.conflict_columns = None
+        if mode == "upsert":
+            unique_columns = get_unique_columns(self.table_def)
+            self.conflict_columns = list(conflict_columns or (unique_columns[0] if unique_columns else []))
+            if set(self.conflict_columns) not in [set(columns) for columns in unique_columns]:
+                raise ValueError(
+                    f"Upserts need a unique index on the conflict columns, {self.table_name} has none on "
+                    f"({', '.join(self.conflict_columns)})"
+                )
+            if set(self.conflict_columns) - set(self.columns):
+                raise ValueError(f"The file has to contain the conflict columns {', '.join(self.conflict_columns)}")
+
+    def run(self, rows):
+        """
+        Imports (line number, row) pairs and yields a report per batch.
+        """
+        rows = iter(rows)
+        imported = False
+        number = 0
+
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+
+                number += 1
+                report = self.import_batch(number, batch)
+                imported = imported or report["rows"] > 0
+                yield report
+        finally:
+            # also when the caller stops after a failed batch
+            if imported:
+                self.sync_sequences()
+
+    def get_copy_data(self, batch, report):
+        buffer = io.StringIO()
+        for line, row in batch:
+            try:
+                if isinstance(row, ValidationError):
+                    raise row
+                values = [
+                    clean_value(column, self.table_def["columns"][column], self.fields[column], row.get(column))
+                    for column in self.columns
+                ]
+            except ValidationError as e:
+                report["skipped"] += 1
+                if len(report["errors"]) < MAX_BATCH_ERRORS:
+                    report["errors"].append(f"line {line}: {' '.join(e.messages)}")
+                continue
+
+            if self.mode == "upsert":
+                values.append(str(line))
+            buffer.write("\t".join(values) + "\n")
+            report["rows"] += 1
+
+        buffer.seek(0)
+        return buffer
+
+    def import_batch(self, number, batch):
+        report = {
+            "batch": number, "first_line": batch[0][0], "last_line": batch[-1][0],
+            "rows": 0, "skipped": 0, "errors": [], "error": None,
+        }
+
+        data = self.get_copy_data(batch, report)
+        if not report["rows"]:
+            return report
+
+        connection = connections[self.using]
+        try:
+            # the COPY calls bypass the cursor wrapper that turns driver errors into DatabaseError
+            with transaction.atomic(using=self.using), connection.wrap_database_errors, connection.cursor() as cursor:
+                if self.mode == "upsert":
+                    report["rows"] = self.upsert(cursor, data)
+                else:
+                    cursor.copy_expert(f"COPY {self.quote(self.table_name)} ({self.column_list}) FROM STDIN", data)
+        except DatabaseError as e:
+            report["error"] = str(e).strip()
+            report["rows"] = 0
+        else:
+            bump_table_version(self.table_name, using=self.using)
+            pin_primary()
+
+        return report
+
+    def upsert(self, cursor, data):
+        table, staging, line = self.quote(self.table_name), self.quote(STAGING_TABLE), self.quote(STAGING_LINE_COLUMN)
+        conflict_list = ", ".join(self.quote(column) for column in self.conflict_columns)
+        updates = ", ".join(
+            f"{self.quote(column)} = EXCLUDED.{self.quote(column)}"
+            for column in self.columns if column not in self.conflict_columns
+        )
+
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {staging} AS SELECT {self.column_list}, 0::bigint AS {line} "
+            f"FROM {table} WITH NO DATA"
+        )
+        cursor.copy_expert(f"COPY {staging} ({self.column_list}, {line}) FROM STDIN", data)
+        # a key repeated within the batch keeps its last row, ON CONFLICT cannot update a row twice
+        cursor.execute(
+            f"INSERT INTO {table} ({self.column_list}) "
+            f"SELECT DISTINCT ON ({conflict_list}) {self.column_list} FROM {staging} "
+            f"ORDER BY {conflict_list}, {line} DESC "
+            f"ON CONFLICT ({conflict_list}) DO {f'UPDATE SET {updates}' if updates else 'NOTHING'}"
+        )
+        rows = cursor.rowcount
+        cursor.execute(f"DROP TABLE {staging}")
+        return rows
+
+    def sync_sequences(self):
+        """
+        Moves the sequences of imported serial/identity columns past the imported values, so later
+        inserts do not collide with them.
+        """
+        with connections[self.using].cursor() as cursor:
+            for column in self.columns:
+                if self.table_def["columns"][column]["type"] not in INTEGER_TYPES:
+                    continue
+                cursor.execute(
+                    f"SELECT setval(seq, max_value) FROM ("
+                    f"SELECT pg_get_serial_sequence(%s, %s) AS seq, "
+                    f"(SELECT max({self.quote(column)}) FROM {self.quote(self.table_name)}) AS max_value) s "
+                    f"WHERE seq IS NOT NULL AND max_value > coalesce(pg_sequence_last_value(seq::regclass), 0)",
+                    [self.quote(self.table_name), column],
+                )
+
+    def quote(self, name):
+        return connections[self.using].ops.quote_name(name)
+
+    @property
+    def column_list(self):
+        return ", ".join(self.quote(column) for column in self.columns)
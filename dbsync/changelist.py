@@ -0,0 +1,145 @@
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import FieldDoesNotExist
+
+from dbsync.paginator import KeysetPaginator, get_cached_estimated_count
+from utils.query_cache_util import get_cached
+
+KEYSET_AFTER_VAR = "_after"
+KEYSET_BEFORE_VAR = "_before"
+
+
+def get_cached_rows(queryset):
+    return get_cached("page", queryset, lambda: list(queryset))
+
+
+class ExternalChangeList(ChangeList):
+    """
+    ChangeList of the dynamic models. The full result count next to the search box is estimated
+    the same way as the paginator count instead of running a second COUNT(*), and pages are
+    fetched by keyset when the model admin asks for it and the sort column allows it. Pages and
+    counts go through the query cache.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        # cursors are not lookups, keep them away from the filter parsing
+        self.keyset_after = request.GET.get(KEYSET_AFTER_VAR)
+        self.keyset_before = request.GET.get(KEYSET_BEFORE_VAR)
+
+        if self.keyset_after or self.keyset_before:
+            request.GET = request.GET.copy()
+            request.GET.pop(KEYSET_AFTER_VAR, None)
+            request.GET.pop(KEYSET_BEFORE_VAR, None)
+
+        self.keyset_pagination = False
+        self.keyset_previous_url = None
+        self.keyset_next_url = None
+        self.offset_next_url = None
+
+        super().__init__(request, *args, **kwargs)
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+
+        # wide columns nobody displays are left in the table
+        only_fields = self.model_admin.get_list_only_fields(queryset.query.order_by)
+        if only_fields is not None:
+            queryset = queryset.only(*only_fields)
+
+        return queryset
+
+    def get_results(self, request):
+        ordering = self.get_keyset_ordering()
+        if ordering is None:
+            super().get_results(request)
+            # the pages of an estimated count are fetched through the query cache by the paginator
+            if not isinstance(self.result_list, list):
+                self.result_list = get_cached_rows(self.result_list)
+            self.offset_next_url = self.get_offset_next_url()
+        else:
+            self.get_keyset_results(request, ordering)
+
+        self.result_count_is_estimated = getattr(self.paginator, "is_estimated", False)
+        self.full_result_count_is_estimated = self.result_count_is_estimated
+
+        if self.queryset.query.has_filters():
+            self.full_result_count, self.full_result_count_is_estimated = get_cached_estimated_count(
+                self.root_queryset, self.paginator.exact_count_threshold
+            )
+        else:
+            self.full_result_count = self.result_count
+
+        self.show_full_result_count = True
+        self.show_admin_actions = bool(self.full_result_count)
+
+    def get_offset_next_url(self):
+        """
+        Returns the link to the next page of an estimated count, which the page numbers miss when the
+        estimate is short of the actual rows.
+        """
+        if not self.paginator.is_estimated or not self.multi_page or (self.show_all and self.can_show_all):
+            return None
+
+        if not self.paginator.page(self.page_num).has_next():
+            return None
+
+        return self.get_query_string({PAGE_VAR: self.page_num + 1})
+
+    def get_keyset_ordering(self):
+        """
+        Returns the (field, descending) pairs to seek on, or None when the changelist has to fall back
+        to offset paging: keyset mode is off, or it is sorted on something other than the pk or a
+        single column that keyset pagination can seek on.
+        """
+        if not self.model_admin.use_keyset_pagination():
+            return None
+
+        pk = self.lookup_opts.pk
+        ordering = []
+
+        for name in self.queryset.query.order_by:
+            if not isinstance(name, str):
+                return None
+
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+
+            try:
+                field = pk if name == "pk" else self.lookup_opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+
+            ordering.append((field, descending))
+            if field == pk:
+                break
+
+        if not ordering or ordering[-1][0] != pk:
+            ordering.append((pk, ordering[0][1] if ordering else True))
+
+        seek_columns = self.model_admin.get_keyset_columns()
+        if len(ordering) > 2 or any(field.column not in seek_columns for field, _ in ordering[:-1]):
+            return None
+
+        return ordering
+
+    def get_keyset_results(self, request, ordering):
+        # the paginator is still used for the (estimated) result count
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        keyset = KeysetPaginator(self.queryset, self.list_per_page, ordering, fetch=get_cached_rows)
+
+        result_list, has_previous, has_next = keyset.get_page(after=self.keyset_after, before=self.keyset_before)
+
+        if has_previous and result_list:
+            self.keyset_previous_url = self.get_query_string(
+                {KEYSET_BEFORE_VAR: keyset.encode_cursor(result_list[0])}, [KEYSET_AFTER_VAR, PAGE_VAR]
+            )
+        if has_next and result_list:
+            self.keyset_next_url = self.get_query_string(
+                {KEYSET_AFTER_VAR: keyset.encode_cursor(result_list[-1])}, [KEYSET_BEFORE_VAR, PAGE_VAR]
+            )
+
+        self.keyset_pagination = True
+        self.result_count = paginator.count
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = has_previous or has_next
+        self.paginator = paginator
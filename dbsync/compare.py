@@ -0,0 +1,273 @@
+import hashlib
+import json
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+
+from dbsync.search import INTEGER_TYPES
+from dbsync.sync import SYNCED_RELKINDS, connect_source, get_source_path
+from utils.dbsync_util import app_models
+
+# sub-chunks per differing chunk
+FANOUT = 16
+
+# differing chunks with at most this many rows on either side are compared row by row
+LEAF_ROWS = 256
+
+NULL_MARKER = r"\N"
+
+NUMERIC_TYPES = {"numeric", "decimal", "real", "double precision"}
+TIMESTAMP_TYPES = {"timestamp", "timestamp without time zone", "timestamp with time zone"}
+
+
+def quote_name(name):
+    return connections["external"].ops.quote_name(name)
+
+
+def get_significant_digits(col_type):
+    # what a real (float4) and a double precision keep of any value, the SQLite side reads both as a double
+    return 6 if col_type == "real" else 15
+
+
+def get_jsonb_text(text):
+    """
+    Renders a JSON document the way Postgres prints it once stored as jsonb: keys deduplicated and
+    ordered by length then bytes, ", " and ": " separators, numbers as numerics.
+    """
+    if text is None:
+        return None
+
+    try:
+        value = json.loads(text, parse_float=Decimal, parse_int=Decimal)
+    except (TypeError, ValueError):
+        return text
+
+    def render(item):
+        if isinstance(item, dict):
+            keys = sorted(item, key=lambda key: (len(key.encode()), key.encode()))
+            return "{" + ", ".join(f"{render(key)}: {render(item[key])}" for key in keys) + "}"
+        if isinstance(item, list):
+            return "[" + ", ".join(render(element) for element in item) + "]"
+        if isinstance(item, Decimal):
+            # numerics have no negative zero
+            return format(item.copy_abs() if item.is_zero() else item, "f")
+        return json.dumps(item, ensure_ascii=False)
+
+    return render(value)
+
+
+def get_external_text(column, col_type):
+    """
+    Renders `column` as text the way get_source_text renders the same value stored in SQLite.
+    """
+    column = quote_name(column)
+    if col_type in ("boolean", "bool"):
+        text = f"CASE WHEN {column} THEN '1' ELSE '0' END"
+    elif col_type in NUMERIC_TYPES:
+        digits = get_significant_digits(col_type)
+        text = f"ltrim(to_char({column}, '9.{'9' * (digits - 1)}EEEE'))"
+    elif col_type == "timestamp with time zone":
+        text = f"to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')"
+    elif col_type in TIMESTAMP_TYPES:
+        text = f"to_char({column}, 'YYYY-MM-DD HH24:MI:SS')"
+    elif col_type == "uuid":
+        text = f"replace({column}::text, '-', '')"
+    elif col_type == "bytea":
+        text = f"encode({column}, 'hex')"
+    else:
+        text = f"{column}::text"
+
+    return f"coalesce({text}, '{NULL_MARKER}')"
+
+
+def get_source_text(column, col_type):
+    column = quote_name(column)
+    if col_type in ("boolean", "bool"):
+        text = f"CASE WHEN {column} THEN '1' ELSE '0' END"
+    elif col_type in INTEGER_TYPES:
+        text = f"CAST(CAST({column} AS INTEGER) AS TEXT)"
+    elif col_type in NUMERIC_TYPES:
+        text = f"printf('%.{get_significant_digits(col_type) - 1}e', CAST({column} AS REAL))"
+    elif col_type in TIMESTAMP_TYPES:
+        # strftime converts values with an offset to UTC
+        text = f"strftime('%Y-%m-%d %H:%M:%S', {column})"
+    elif col_type == "date":
+        text = f"date({column})"
+    elif col_type == "uuid":
+        text = f"replace(lower({column}), '-', '')"
+    elif col_type == "bytea":
+        text = f"lower(hex({column}))"
+    elif col_type == "jsonb":
+        text = f"jsonb_text({column})"
+    else:
+        text = f"CAST({column} AS TEXT)"
+
+    return f"coalesce({text}, '{NULL_MARKER}')"
+
+
+def register_source_functions(source):
+    """
+    SQLite has no md5(), the hashes are computed by the sqlite3 module inside the query, and neither
+    the jsonb text format.
+    """
+    source.create_function("md5", 1, lambda text: hashlib.md5(text.encode()).hexdigest(), deterministic=True)
+    source.create_function("md5_part", 2, lambda digest, part: int(digest[part * 8:part * 8 + 8], 16),
+                           deterministic=True)
+    source.create_function("jsonb_text", 1, get_jsonb_text, deterministic=True)
+
+
+class TableCompare:
+    """
+    Finds the rows that differ between a source SQLite table and the external table of the same name
+    without moving the rows themselves.
+
+    The primary key range is split into `chunk_size` wide chunks, and both databases return the row
+    count and two sums of 32 bit slices of the md5 of every row per chunk. Only chunks whose
+    summaries differ are split again, FANOUT ways, down to chunks of at most LEAF_ROWS rows whose
+    row hashes are compared. The work after the first pass grows with the number of differences,
+    not with the table size.
+
+    Values are rendered as text the same way on both sides before hashing. Numbers are compared in
+    scientific notation to 15 significant digits, 6 for real columns, since SQLite reads them all
+    as doubles: numbers equal to that precision and timestamps differing below the second are not
+    told apart. jsonb documents are compared in the normalized form Postgres prints them in, json
+    documents as stored.
+    """
+
+    def __init__(self, model_name, source_path=None, chunk_size=None):
+        self.model_name = model_name
+        self.table_name, self.table_def = app_models[0].get_table(model_name)
+        self.source_path = source_path or get_source_path()
+        self.chunk_size = chunk_size or settings.DBSYNC_COMPARE_CHUNK_SIZE
+        self.queries = 0
+
+        # set by compare()
+        self.source = self.cursor = self.pk = None
+        self.source_row = self.external_row = None
+
+    def get_report(self, **kwargs):
+        return {
+            "model": self.model_name, "only_local": [], "only_external": [], "changed": [],
+            "queries": 0, "seconds": 0.0, "error": None, "note": None, **kwargs,
+        }
+
+    def run(self):
+        started = time.perf_counter()
+
+        if self.table_def.get("kind", "r") not in SYNCED_RELKINDS:
+            return self.get_report(note="not a table")
+
+        source = connect_source(self.source_path)
+        try:
+            register_source_functions(source)
+            info = source.execute(f"PRAGMA table_info({quote_name(self.table_name)})").fetchall()
+            if not info:
+                return self.get_report(note="not in the source database")
+
+            source_pk = [row[1] for row in info if row[5]]
+            columns = [column for column in self.table_def["columns"] if column in {row[1] for row in info}]
+            if len(source_pk) != 1 or source_pk[0] not in columns \
+                    or self.table_def["columns"][source_pk[0]]["type"] not in INTEGER_TYPES:
+                return self.get_report(error="needs a single integer primary key in both databases")
+
+            with connections["external"].cursor() as cursor:
+                report = self.compare(source, cursor, columns, source_pk[0])
+        finally:
+            source.close()
+
+        report["seconds"] = time.perf_counter() - started
+        return report
+
+    def compare(self, source, cursor, columns, pk):
+        types = {column: self.table_def["columns"][column]["type"] for column in columns}
+        self.source_row = " || char(31) || ".join(get_source_text(column, types[column]) for column in columns)
+        self.external_row = "concat_ws(chr(31), {})".format(
+            ", ".join(get_external_text(column, types[column]) for column in columns)
+        )
+        self.source, self.cursor, self.pk = source, cursor, pk
+
+        table, pk = quote_name(self.table_name), quote_name(pk)
+        bounds = [
+            self.execute_source(f"SELECT min({pk}), max({pk}) FROM {table}", [])[0],
+            self.execute_external(f"SELECT min({pk}), max({pk}) FROM {table}", [])[0],
+        ]
+        bounds = [bound for bound in bounds if bound[0] is not None]
+        report = self.get_report()
+        if not bounds:
+            return report
+
+        pending = [(min(bound[0] for bound in bounds), max(bound[1] for bound in bounds) + 1, self.chunk_size)]
+        while pending:
+            low, high, width = pending.pop()
+            local, external = self.get_chunk_hashes(low, high, width)
+
+            for chunk in sorted(set(local) | set(external)):
+                if local.get(chunk) == external.get(chunk):
+                    continue
+
+                chunk_low = low + chunk * width
+                chunk_high = min(chunk_low + width, high)
+                rows = max(local.get(chunk, (0,))[0], external.get(chunk, (0,))[0])
+                if rows <= LEAF_ROWS or width <= FANOUT:
+                    self.compare_rows(chunk_low, chunk_high, report)
+                else:
+                    pending.append((chunk_low, chunk_high, -(-width // FANOUT)))
+
+        report["queries"] = self.queries
+        for key in ("only_local", "only_external", "changed"):
+            report[key].sort()
+
+        return report
+
+    def execute_source(self, sql, params):
+        self.queries += 1
+        return self.source.execute(sql, params).fetchall()
+
+    def execute_external(self, sql, params):
+        self.queries += 1
+        self.cursor.execute(sql, params)
+        return self.cursor.fetchall()
+
+    def get_chunk_hashes(self, low, high, width):
+        """
+        Returns {chunk number: (rows, hash sum, hash sum)} of the keys in [low, high) on each side.
+        """
+        table, pk = quote_name(self.table_name), quote_name(self.pk)
+        local = self.execute_source(
+            f"SELECT chunk, count(*), sum(md5_part(h, 0)), sum(md5_part(h, 1)) FROM ("
+            f"SELECT ({pk} - ?) / ? AS chunk, md5({self.source_row}) AS h FROM {table} WHERE {pk} >= ? AND {pk} < ?"
+            f") GROUP BY chunk",
+            [low, width, low, high],
+        )
+        external = self.execute_external(
+            f"SELECT chunk, count(*), sum(('x' || substr(h, 1, 8))::bit(32)::bigint), "
+            f"sum(('x' || substr(h, 9, 8))::bit(32)::bigint) FROM ("
+            f"SELECT ({pk} - %s) / %s AS chunk, md5({self.external_row}) AS h FROM {table} "
+            f"WHERE {pk} >= %s AND {pk} < %s"
+            f") t GROUP BY chunk",
+            [low, width, low, high],
+        )
+
+        return (
+            {row[0]: tuple(int(value) for value in row[1:]) for row in local},
+            {row[0]: tuple(int(value) for value in row[1:]) for row in external},
+        )
+
+    def compare_rows(self, low, high, report):
+        table, pk = quote_name(self.table_name), quote_name(self.pk)
+        local = dict(self.execute_source(
+            f"SELECT {pk}, md5({self.source_row}) FROM {table} WHERE {pk} >= ? AND {pk} < ?", [low, high]
+        ))
+        external = dict(self.execute_external(
+            f"SELECT {pk}, md5({self.external_row}) FROM {table} WHERE {pk} >= %s AND {pk} < %s", [low, high]
+        ))
+
+        for key, digest in local.items():
+            if key not in external:
+                report["only_local"].append(key)
+            elif external[key] != digest:
+                report["changed"].append(key)
+
+        report["only_external"].extend(key for key in external if key not in local)
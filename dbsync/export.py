@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def iter_rows(queryset, columns, chunk_size):
+    """
+    Yields the rows of `queryset` as tuples of `columns` through a server-side (named) cursor that
+    fetches `chunk_size` rows at a time. The transaction keeps the cursor from being WITH HOLD,
+    which would make Postgres materialize the whole result before the first row.
+    """
+    # the cursor and its transaction on the same database, whichever replica the router picks
+    queryset = queryset.using(queryset.db)
+    with transaction.atomic(using=queryset.db):
+        yield from queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def iter_csv(queryset, columns, chunk_size, callback=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    index = 0
+
+    for index, row in enumerate(iter_rows(queryset, columns, chunk_size), 1):
+        writer.writerow(row)
+        if index % chunk_size == 0:
+            if callback:
+                callback(index)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if callback:
+        callback(index)
+    yield buffer.getvalue()
+
+
+def iter_jsonl(queryset, columns, chunk_size, callback=None):
+    lines = []
+    index = 0
+    for index, row in enumerate(iter_rows(queryset, columns, chunk_size), 1):
+        lines.append(json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder))
+        if len(lines) == chunk_size:
+            if callback:
+                callback(index)
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if callback:
+        callback(index)
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_response(queryset, columns, export_format, chunk_size=None):
+    """
+    Streams `columns` of every row of `queryset` as CSV or JSON lines, with a memory use bounded by
+    `chunk_size` (DBSYNC_EXPORT_CHUNK_SIZE by default) whatever the number of rows.
+    """
+    chunk_size = chunk_size or settings.DBSYNC_EXPORT_CHUNK_SIZE
+    rows = iter_csv if export_format == "csv" else iter_jsonl
+
+    response = StreamingHttpResponse(rows(queryset, columns, chunk_size), content_type=EXPORT_FORMATS[export_format])
+    response["Content-Disposition"] = f'attachment; filename="{queryset.model._meta.db_table}.{export_format}"'
+    return response
+
+
+def write_export(queryset, columns, export_format, file, chunk_size=None, callback=None):
+    """
+    Writes the export of `queryset` to the text `file` instead of a response, see export_response.
+    `callback` gets the number of rows written so far after every chunk.
+    """
+    chunk_size = chunk_size or settings.DBSYNC_EXPORT_CHUNK_SIZE
+    rows = iter_csv if export_format == "csv" else iter_jsonl
+
+    for chunk in rows(queryset, columns, chunk_size, callback=callback):
+        file.write(chunk)
@@ -0,0 +1,189 @@
+from django.conf import settings
+from django.contrib.admin.filters import AllValuesFieldListFilter, FieldListFilter, RelatedFieldListFilter
+from django.core.exceptions import ValidationError
+from django.db import models
+
+from utils.dbsync_util import app_label, get_repr_fields
+from utils.log_util import AppLogger
+from utils.pg_stats_util import get_column_stats, get_sampled_distinct_values, get_table_row_estimate
+from utils.query_cache_util import get_cached
+
+RANGE_FIELDS = (
+    models.IntegerField, models.BigIntegerField, models.SmallIntegerField, models.DecimalField,
+    models.FloatField, models.DateField, models.DateTimeField, models.TimeField,
+)
+
+
+def get_column_choices(model, field, using):
+    """
+    Returns the distinct values of a column for the filter sidebar, None when there are more than
+    DBSYNC_FILTER_MAX_CHOICES. They come from pg_stats when its most common values cover the whole
+    column, from a DISTINCT over the first DBSYNC_FILTER_SAMPLE_ROWS rows otherwise.
+    """
+    table_name = model._meta.db_table
+    max_choices = settings.DBSYNC_FILTER_MAX_CHOICES
+
+    try:
+        stats = get_column_stats(table_name, field.column, using=using)
+    except Exception as e:
+        AppLogger.report(e, error=f"Unable to read the statistics of {table_name}.{field.column}")
+        stats = None
+
+    if stats is not None:
+        if stats["n_distinct"] > max_choices:
+            return None
+
+        if sum(stats["most_common_freqs"]) + stats["null_frac"] >= 0.999:
+            try:
+                choices = sorted(field.to_python(value) for value in stats["most_common_vals"])
+            except (TypeError, ValidationError):
+                choices = None
+
+            if choices is not None:
+                return choices + [None] if stats["null_frac"] else choices
+
+    values = get_sampled_distinct_values(
+        table_name, field.column, settings.DBSYNC_FILTER_SAMPLE_ROWS, max_choices + 1, using=using
+    )
+    return values if len(values) <= max_choices else None
+
+
+class InputFilterMixin:
+    """
+    Renders the filter as a small form instead of a list of links when `input_mode` is set, for columns
+    with too many values. `get_inputs` returns the (lookup, placeholder) of every input.
+    """
+
+    input_template = "admin/dbsync/input_filter.html"
+
+    def clean_used_parameters(self):
+        # the form submits its empty inputs too
+        for lookup, values in list(self.used_parameters.items()):
+            values = [value for value in values if value != ""]
+            if values:
+                self.used_parameters[lookup] = values
+            else:
+                del self.used_parameters[lookup]
+
+    def has_output(self):
+        return bool(self.input_mode) or super().has_output()
+
+    def input_choices(self, changelist):
+        lookups = [lookup for lookup, _ in self.get_inputs()]
+        yield {
+            "selected": bool(self.used_parameters),
+            "hidden": [
+                (name, value) for name, value in changelist.params.items() if name not in lookups and value != ""
+            ],
+            "inputs": [
+                {
+                    "name": lookup,
+                    "placeholder": placeholder,
+                    "value": (self.used_parameters.get(lookup) or [""])[0],
+                }
+                for lookup, placeholder in self.get_inputs()
+            ],
+            "clear_url": changelist.get_query_string(remove=lookups),
+        }
+
+
+class StatsFieldListFilter(InputFilterMixin, AllValuesFieldListFilter):
+    """
+    Distinct values of a column taken from the planner statistics or a bounded sample (see
+    get_column_choices) and kept in the query cache. Columns with too many values get a range form
+    for numbers and dates, an exact match form otherwise.
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        using = model_admin.get_queryset(request).db
+        cached = get_cached(
+            "filter", model._default_manager.all(),
+            lambda: {"choices": get_column_choices(model, field, using)},
+            "stats", field.column, settings.DBSYNC_FILTER_MAX_CHOICES,
+        )
+        choices = cached["choices"]
+
+        self.input_mode = None
+        if choices is None:
+            self.input_mode = "range" if isinstance(field, RANGE_FIELDS) else "exact"
+            self.template = self.input_template
+
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.lookup_choices = choices or []
+        self.clean_used_parameters()
+
+    def get_inputs(self):
+        if self.input_mode == "range":
+            return [(f"{self.field_path}__gte", "From"), (f"{self.field_path}__lte", "To")]
+
+        return [(self.lookup_kwarg, "Equals")]
+
+    def expected_parameters(self):
+        if self.input_mode == "range":
+            return [lookup for lookup, _ in self.get_inputs()]
+
+        return super().expected_parameters()
+
+    def choices(self, changelist):
+        if self.input_mode:
+            return self.input_choices(changelist)
+
+        return super().choices(changelist)
+
+
+class CachedRelatedFieldListFilter(InputFilterMixin, RelatedFieldListFilter):
+    """
+    (pk, __str__) of every row of the related table, kept in the query cache. Related tables with
+    more than DBSYNC_FILTER_MAX_CHOICES rows get an input for the related id instead.
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        row_estimate = get_table_row_estimate(
+            field.related_model._meta.db_table, using=model_admin.get_queryset(request).db
+        )
+        self.input_mode = row_estimate is not None and row_estimate > settings.DBSYNC_FILTER_MAX_CHOICES
+        if self.input_mode:
+            self.template = self.input_template
+
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.clean_used_parameters()
+
+    def get_inputs(self):
+        return [(self.lookup_kwarg, f"{self.field.related_model._meta.verbose_name} id")]
+
+    def field_choices(self, field, request, model_admin):
+        if self.input_mode:
+            return []
+
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        queryset = field.related_model._default_manager.order_by(*ordering)
+
+        return get_cached(
+            "filter", queryset, lambda: super(CachedRelatedFieldListFilter, self).field_choices(field, request, model_admin),
+            get_repr_fields(field.related_model._meta.db_table),
+        )
+
+    def choices(self, changelist):
+        if self.input_mode:
+            return self.input_choices(changelist)
+
+        return super().choices(changelist)
+
+
+def is_dynamic_field(field):
+    return field.model._meta.app_label == app_label
+
+
+def is_all_values_field(field):
+    # the fields Django's own filters would hand to AllValuesFieldListFilter
+    return not (
+        field.remote_field or field.flatchoices or isinstance(field, (models.BooleanField, models.DateField))
+    )
+
+
+FieldListFilter.register(
+    lambda f: is_dynamic_field(f) and f.remote_field, CachedRelatedFieldListFilter, take_priority=True
+)
+FieldListFilter.register(
+    lambda f: is_dynamic_field(f) and is_all_values_field(f), StatsFieldListFilter, take_priority=True
+)
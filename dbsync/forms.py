@@ -0,0 +1,36 @@
+from django import forms
+
+from dbsync.bulk_import import IMPORT_FORMATS, IMPORT_MODES
+
+
+class ImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row, or JSON lines. Columns are named after the table columns.")
+    format = forms.ChoiceField(choices=[("", "From the file extension")] + [(name, name) for name in IMPORT_FORMATS],
+                               required=False)
+    mode = forms.ChoiceField(choices=[(name, name) for name in IMPORT_MODES], initial="insert",
+                             help_text="Upserts update the rows whose conflict columns match.")
+    conflict_columns = forms.CharField(required=False,
+                                       help_text="Comma separated upsert key, the primary key when empty.")
+    background = forms.BooleanField(required=False, label="Run in the background",
+                                    help_text="Queue the import as a job instead of waiting for it, for large files.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        file = cleaned_data.get("file")
+        if file and not cleaned_data.get("format"):
+            extension = file.name.rsplit(".", 1)[-1].lower()
+            if extension not in IMPORT_FORMATS:
+                raise forms.ValidationError("Unknown file format, pick one.")
+            cleaned_data["format"] = extension
+
+        return cleaned_data
+
+
+class BulkUpdateForm(forms.Form):
+    column = forms.ChoiceField()
+    value = forms.CharField(required=False, help_text="Foreign keys take the id of the related row.")
+    set_null = forms.BooleanField(required=False, label="Set to NULL")
+
+    def __init__(self, columns, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["column"].choices = [(column, column) for column in columns]
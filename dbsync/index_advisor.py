@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.backends.utils import truncate_name
+from django.db.models import Q
+
+from account.models import DBSyncModelColumn
+from dbsync.search import TEXT_TYPES, get_search_modes
+from utils.dbsync_util import app_models, introspect_postgres_schema
+
+SEARCH, FILTER, SORT = "search", "filter", "sort"
+
+# BRIN indexes serve the range filters of these types, e.g. the dates of an append-only table
+BRIN_TYPES = {
+    "smallint", "integer", "bigint", "numeric", "date", "timestamp without time zone", "timestamp with time zone",
+}
+
+# a btree to sort on these is rarely worth it
+UNSORTED_TYPES = {"boolean", "text", "bytea", "json", "jsonb"}
+
+
+def get_leading_index_methods(table_def, column):
+    return {
+        index["method"] for index in table_def.get("indexes", [])
+        if not index["partial"] and index["columns"][0] == column
+    }
+
+
+def get_missing_index(table_def, column, usage):
+    """
+    Returns the kind of index ("btree" or "trigram") `column` needs for `usage`, None when one of
+    its indexes already supports it.
+    """
+    col_type = table_def["columns"][column]["type"]
+    methods = get_leading_index_methods(table_def, column)
+
+    if usage == SEARCH:
+        modes = get_search_modes(table_def, column)
+        if col_type in TEXT_TYPES:
+            return None if "fulltext" in modes or "trigram" in modes else "trigram"
+        return None if "exact" in modes else "btree"
+
+    if usage == FILTER and "brin" in methods and col_type in BRIN_TYPES:
+        return None
+
+    if usage == SORT and col_type in UNSORTED_TYPES:
+        return None
+
+    return None if "btree" in methods else "btree"
+
+
+def get_create_index_statement(schema_name, table_name, table_def, column, kind):
+    quote_name = connections["external"].ops.quote_name
+
+    name = truncate_name(f"{table_name}_{column}_{'trgm_idx' if kind == 'trigram' else 'idx'}", 63)
+    if kind == "trigram":
+        definition = f"USING gin ({quote_name(column)} gin_trgm_ops)"
+    else:
+        definition = f"({quote_name(column)})"
+
+    # partitioned tables do not support CONCURRENTLY, their partitions have to be indexed one by one for that
+    concurrently = "" if table_def.get("kind") == "p" else " CONCURRENTLY"
+
+    return f"CREATE INDEX{concurrently} IF NOT EXISTS {quote_name(name)} ON " \
+           f"{quote_name(schema_name)}.{quote_name(table_name)} {definition};"
+
+
+def get_ordering_columns(model_name):
+    """
+    Returns the columns the changelist of `model_name` sorts on when no column header is clicked:
+    those of the model ordering, or the primary key.
+    """
+    opts = app_models[0][model_name]._meta
+    columns = []
+
+    for name in opts.ordering or ["-pk"]:
+        if not isinstance(name, str):
+            continue
+
+        name = name.lstrip("-")
+        try:
+            columns.append(opts.pk.column if name == "pk" else opts.get_field(name).column)
+        except FieldDoesNotExist:
+            continue
+
+    return columns
+
+
+def get_index_advice(schema=None, schema_name="public", models=None, min_rows=None, sort_columns=False):
+    """
+    Checks every configured search and filter column, and the default ordering of every changelist,
+    against the indexes of its table and returns the missing ones, largest tables first. With
+    `sort_columns` every list display column is checked as a sort column too, since its header can
+    be clicked. Tables below `min_rows` estimated rows, DBSYNC_INDEX_ADVISOR_MIN_ROWS by default,
+    are skipped.
+    """
+    if schema is None:
+        # the snapshot keeps the sizes and row estimates of when it was taken
+        schema = introspect_postgres_schema(schema_name=schema_name)
+    if min_rows is None:
+        min_rows = settings.DBSYNC_INDEX_ADVISOR_MIN_ROWS
+
+    configured = Q(in_searchable_list=True) | Q(in_list_filter_list=True)
+    if sort_columns:
+        configured |= Q(in_list_display_list=True)
+
+    queryset = DBSyncModelColumn.objects.filter(configured).order_by("model", "order")
+    if models:
+        queryset = queryset.filter(model__in=models)
+
+    usages = {}
+    for model_column in queryset:
+        usages[(model_column.model, model_column.name)] = [
+            usage for usage, enabled in (
+                (SEARCH, model_column.in_searchable_list),
+                (FILTER, model_column.in_list_filter_list),
+                (SORT, sort_columns and model_column.in_list_display_list),
+            ) if enabled
+        ]
+
+    for model_name in models or app_models[0]:
+        if model_name not in app_models[0] or model_name not in schema["tables"]:
+            continue
+
+        for column in get_ordering_columns(model_name):
+            column_usages = usages.setdefault((model_name, column), [])
+            if SORT not in column_usages:
+                column_usages.append(SORT)
+
+    advice = {}
+    for (model_name, column), column_usages in usages.items():
+        table_def = schema["tables"].get(model_name)
+        if table_def is None or table_def.get("kind") not in ("r", "p") or column not in table_def["columns"]:
+            continue
+
+        if (table_def.get("row_estimate") or 0) < min_rows:
+            continue
+
+        for usage in column_usages:
+            kind = get_missing_index(table_def, column, usage)
+            if kind is None:
+                continue
+
+            key = (model_name, column, kind)
+            if key not in advice:
+                advice[key] = {
+                    "table": model_name,
+                    "column": column,
+                    "kind": kind,
+                    "usages": [],
+                    "row_estimate": table_def.get("row_estimate"),
+                    "size": table_def.get("size"),
+                    "statement": get_create_index_statement(schema_name, model_name, table_def, column, kind),
+                }
+            advice[key]["usages"].append(usage)
+
+    # within a table, searches and filters run the sequential scans, sorts only might
+    return sorted(
+        advice.values(),
+        key=lambda item: (item["size"] or 0, item["row_estimate"] or 0, item["usages"] != [SORT]),
+        reverse=True
+    )
@@ -0,0 +1,285 @@
+import json
+import math
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from account.models import DBSyncJob
+from dbsync.bulk_actions import SetBasedAction, clean_update_value, get_sql
+from dbsync.bulk_import import BulkImport, read_file
+from dbsync.export import write_export
+from utils.dbsync_util import app_models
+from utils.log_util import AppLogger
+from utils.pg_stats_util import get_estimated_count
+
+# seconds between two saves of the progress of a job, which also check for a cancellation
+PROGRESS_INTERVAL = 1.0
+
+# import errors kept in the result of a job, the others are only counted
+MAX_IMPORT_ERRORS = 100
+
+JOB_KINDS = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job_kind(name):
+    """
+    Registers a job function, called in a run_jobs worker process with the JobContext and the
+    params of the job. Its return value is saved as the JSON result of the job; a function that
+    fails can leave a partial result in context.job.result before raising.
+    """
+    def register(func):
+        JOB_KINDS[name] = func
+        return func
+
+    return register
+
+
+def get_job_dir(job_id):
+    path = os.path.join(settings.DBSYNC_JOB_DIR, str(job_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_result_path(job):
+    """
+    Returns the absolute path of the result file of `job`, None when it has none or it is gone.
+    """
+    if not job.result_file:
+        return None
+
+    path = os.path.join(settings.DBSYNC_JOB_DIR, job.result_file)
+    return path if os.path.isfile(path) else None
+
+
+def serialize_queryset(queryset):
+    """
+    Returns the primary key query of `queryset` as JSON, for a worker process to select the same rows,
+    see get_job_queryset.
+    """
+    sql, params = get_sql(queryset.order_by().values("pk"))
+    return {"sql": sql, "params": json.loads(json.dumps(params, cls=DjangoJSONEncoder))}
+
+
+def get_job_queryset(model_name, query):
+    model = app_models[0][model_name]
+    return model.objects.filter(pk__in=RawSQL(query["sql"], query["params"]))
+
+
+def submit_job(kind, params, user=None):
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind {kind}")
+
+    return DBSyncJob.objects.create(
+        kind=kind, params=params, created_by=user if user and user.is_authenticated else None
+    )
+
+
+def cancel_job(job):
+    """
+    Cancels a queued job right away, a running one stops at its next progress report.
+    """
+    if DBSyncJob.objects.filter(pk=job.pk, status="queued").update(status="cancelled", finished_at=timezone.now()):
+        return
+
+    DBSyncJob.objects.filter(pk=job.pk, status="running").update(cancel_requested=True)
+
+
+class JobContext:
+    """
+    Handed to a job function to report its progress, saved at most every PROGRESS_INTERVAL seconds.
+    Every save reads the cancel flag of the job back and raises JobCancelled once it is set, so the
+    function stops between two units of work.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self._saved_at = 0.0
+
+    def progress(self, done=None, total=None, message=None, force=False):
+        job = self.job
+        if done is not None:
+            job.progress = done
+        if total is not None:
+            job.total = total
+        if message is not None:
+            job.message = message[:500]
+
+        now = time.monotonic()
+        if not force and now - self._saved_at < PROGRESS_INTERVAL:
+            return
+
+        self._saved_at = now
+        DBSyncJob.objects.filter(pk=job.pk).update(
+            progress=job.progress, total=job.total, message=job.message, heartbeat_at=timezone.now()
+        )
+        if DBSyncJob.objects.filter(pk=job.pk, cancel_requested=True).exists():
+            raise JobCancelled
+
+    def set_result_file(self, path):
+        self.job.result_file = os.path.relpath(path, settings.DBSYNC_JOB_DIR)
+
+
+def run_job(job_id):
+    """
+    Runs a job claimed by run_jobs, in a worker process. Returns its final status.
+    """
+    job = DBSyncJob.objects.get(pk=job_id)
+    context = JobContext(job)
+
+    try:
+        job.result = JOB_KINDS[job.kind](context, **job.params)
+        job.status = "done"
+    except JobCancelled:
+        job.status = "cancelled"
+    except Exception as e:
+        AppLogger.report(e, error=f"Job {job} failed")
+        job.status, job.error = "failed", str(e).strip() or e.__class__.__name__
+    finally:
+        job.finished_at = timezone.now()
+        DBSyncJob.objects.filter(pk=job.pk).update(
+            status=job.status, progress=job.progress, total=job.total, message=job.message, result=job.result,
+            result_file=job.result_file, error=job.error, finished_at=job.finished_at, heartbeat_at=job.finished_at,
+        )
+        # this process runs other jobs next
+        connections.close_all()
+
+    return job.status
+
+
+@job_kind("export")
+def export_job(context, model, columns, format, query):
+    queryset = get_job_queryset(model, query).order_by("pk")
+    total, _ = get_estimated_count(queryset, settings.DBSYNC_EXACT_COUNT_THRESHOLD)
+    context.progress(0, total, "Exporting", force=True)
+
+    path = os.path.join(get_job_dir(context.job.pk), f"{model}.{format}")
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        write_export(queryset, columns, format, file, callback=lambda rows: context.progress(rows))
+
+    context.set_result_file(path)
+    context.progress(message="Exported")
+    return {"rows": context.job.progress, "bytes": os.path.getsize(path)}
+
+
+def count_lines(path):
+    with open(path, "rb") as file:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: file.read(1 << 20), b""))
+
+
+@job_kind("import")
+def import_job(context, model, path, format, mode="insert", conflict_columns=None):
+    """
+    Imports the upload saved at `path`, which is removed once the job is over. Paths outside
+    DBSYNC_JOB_DIR are refused, the job never reads or removes another file.
+    """
+    job_dir = os.path.realpath(settings.DBSYNC_JOB_DIR)
+    path = os.path.realpath(path)
+    if os.path.commonpath([job_dir, path]) != job_dir:
+        raise ValueError(f"{path} is not an upload of DBSYNC_JOB_DIR")
+
+    result = {"imported": 0, "skipped": 0, "failed_batches": 0, "errors": []}
+
+    try:
+        # the header of a CSV file is a line too, the total is an estimate anyway
+        context.progress(0, count_lines(path), "Importing", force=True)
+
+        with open(path, encoding="utf-8-sig", newline="") as file:
+            columns, rows = read_file(file, format)
+            bulk_import = BulkImport(model, columns, mode=mode, conflict_columns=conflict_columns)
+            for report in bulk_import.run(rows):
+                result["imported"] += report["rows"]
+                result["skipped"] += report["skipped"]
+                errors = report["errors"] + ([f"batch {report['batch']}: {report['error']}"] if report["error"] else [])
+                result["errors"].extend(errors[:MAX_IMPORT_ERRORS - len(result["errors"])])
+                if report["error"]:
+                    result["failed_batches"] += 1
+                context.progress(report["last_line"])
+    finally:
+        os.remove(path)
+
+    context.progress(message="Imported")
+    return result
+
+
+def save_upload(file):
+    """
+    Saves an uploaded file for an import job, before the job is submitted so a runner never sees it without.
+    """
+    path = os.path.join(get_job_dir("uploads"), uuid.uuid4().hex)
+    with open(path, "wb") as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+
+    return path
+
+
+def run_bulk_action(context, queryset, run):
+    total, _ = get_estimated_count(queryset, settings.DBSYNC_EXACT_COUNT_THRESHOLD)
+    context.progress(0, total, "Running", force=True)
+
+    report = run(SetBasedAction(
+        queryset, time_limit=math.inf,
+        callback=lambda report: context.progress(report["rows"], message=f"{report['batches']} batches"),
+    ))
+    context.progress(report["rows"], message=f"{report['batches']} batches")
+
+    if report["error"]:
+        context.job.result = report
+        raise RuntimeError(f"{report['rows']} rows done in {report['batches']} batches, "
+                           f"then the database refused: {report['error']}")
+    return report
+
+
+@job_kind("bulk_delete")
+def bulk_delete_job(context, model, query):
+    return run_bulk_action(context, get_job_queryset(model, query), lambda action: action.delete())
+
+
+@job_kind("bulk_update")
+def bulk_update_job(context, model, query, column, value, set_null=False):
+    value = clean_update_value(model, column, value, set_null=set_null)
+    return run_bulk_action(context, get_job_queryset(model, query), lambda action: action.update(column, value))
+
+
+@job_kind("index_advisor")
+def index_advisor_job(context, models=None):
+    from dbsync.index_advisor import get_index_advice
+
+    context.progress(message="Introspecting the schema", force=True)
+    advice = get_index_advice(models=models)
+    context.progress(len(advice), len(advice), "Checked")
+    return {"advice": advice, "min_rows": settings.DBSYNC_INDEX_ADVISOR_MIN_ROWS}
+
+
+@job_kind("sync_tables")
+def sync_tables_job(context, models=None):
+    from dbsync.sync import sync_tables
+
+    registry = app_models[0]
+    total = len(models or registry)
+    done = {"rows": 0, "tables": 0}
+    context.progress(0, message=f"0/{total} tables", force=True)
+
+    def report_table(report):
+        done["rows"] += report["rows"]
+        done["tables"] += 1
+        # tables already running finish when the job is cancelled
+        context.progress(done["rows"], message=f"{done['tables']}/{total} tables")
+
+    reports = sync_tables(models or None, callback=report_table)
+    context.job.result = {"reports": reports}
+    failed = [report["model"] for report in reports if report["error"]]
+    if failed:
+        raise RuntimeError(f"{len(failed)} tables failed: {', '.join(failed)}")
+
+    return context.job.result
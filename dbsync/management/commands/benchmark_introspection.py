@@ -0,0 +1,162 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.dbsync_util import connect_external, introspect_postgres_schema
+from utils.log_util import AppLogger
+
+COMPARED_KEYS = ("type", "nullable", "default", "foreign_key")
+
+
+def introspect_information_schema(conn, schema_name):
+    """
+    The per-table information_schema loop that introspect_postgres_schema used to run,
+    kept here only as the baseline for the benchmark.
+    """
+    cur = conn.cursor()
+    queries = 1
+
+    cur.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = %s;", [schema_name])
+    tables = [row[0] for row in cur.fetchall()]
+
+    schema = {"tables": {}}
+
+    for table in tables:
+        cur.execute(
+            "SELECT column_name, data_type, is_nullable, column_default FROM information_schema.columns "
+            "WHERE table_schema = %s AND table_name = %s;", [schema_name, table]
+        )
+        columns = {}
+        for col_name, col_type, is_nullable, default in cur.fetchall():
+            columns[col_name] = {
+                "type": col_type,
+                "nullable": is_nullable == 'YES',
+                "default": default
+            }
+
+        cur.execute(
+            "SELECT kcu.column_name, ccu.table_name AS foreign_table, ccu.column_name AS foreign_column"
+            " FROM information_schema.table_constraints AS tc JOIN information_schema.key_column_usage"
+            " AS kcu ON tc.constraint_name = kcu.constraint_name "
+            "JOIN information_schema.constraint_column_usage AS ccu ON "
+            "ccu.constraint_name = tc.constraint_name WHERE tc.constraint_type = 'FOREIGN KEY' "
+            "AND tc.table_schema = %s AND tc.table_name = %s;", [schema_name, table]
+        )
+        for col_name, foreign_table, foreign_column in cur.fetchall():
+            columns[col_name]["foreign_key"] = {
+                "table": foreign_table,
+                "column": foreign_column
+            }
+
+        queries += 2
+        schema["tables"][table] = {"columns": columns}
+
+    cur.close()
+    return schema, queries
+
+
+class Command(BaseCommand):
+    help = "Compares pg_catalog introspection with the per-table information_schema loop on a generated schema"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-t", "--tables", type=int, default=1000)
+        parser.add_argument("-s", "--schema", default="dbsync_bench")
+        parser.add_argument("-r", "--repeat", type=int, default=3)
+        parser.add_argument("--keep", action="store_true", help="Keep the generated schema after the run")
+
+    def handle(self, *args, **options):
+        table_count = options.get("tables")
+        schema_name = options.get("schema")
+        repeat = max(options.get("repeat"), 1)
+
+        if schema_name == "public":
+            raise CommandError("The benchmark drops and recreates its schema, use a dedicated one")
+
+        conn = connect_external()
+        conn.autocommit = True
+
+        try:
+            self.create_schema(conn, schema_name, table_count)
+
+            legacy_times, catalog_times = [], []
+            legacy_schema = catalog_schema = None
+            legacy_queries = 0
+
+            for _ in range(repeat):
+                started = time.perf_counter()
+                legacy_schema, legacy_queries = introspect_information_schema(conn, schema_name)
+                legacy_times.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                catalog_schema = introspect_postgres_schema(conn, schema_name=schema_name)
+                catalog_times.append(time.perf_counter() - started)
+
+            mismatches = self.compare(legacy_schema, catalog_schema)
+
+            legacy_best, catalog_best = min(legacy_times), min(catalog_times)
+            AppLogger.print("Tables: {}, runs: {}".format(len(catalog_schema["tables"]), repeat))
+            AppLogger.print("information_schema loop: {:.3f}s best, {} queries".format(legacy_best, legacy_queries))
+            AppLogger.print("pg_catalog set-based: {:.3f}s best, 4 queries".format(catalog_best))
+            AppLogger.print("Speedup: {:.1f}x".format(legacy_best / catalog_best if catalog_best else 0))
+
+            if mismatches:
+                for mismatch in mismatches[:20]:
+                    AppLogger.print("Mismatch: {}".format(mismatch))
+                AppLogger.print("{} mismatching columns".format(len(mismatches)))
+            else:
+                AppLogger.print("Both paths produced the same tables, columns and foreign keys")
+        finally:
+            if not options.get("keep"):
+                self.drop_schema(conn, schema_name)
+            conn.close()
+
+    def create_schema(self, conn, schema_name, table_count):
+        started = time.perf_counter()
+        self.drop_schema(conn, schema_name)
+
+        statements = [f'CREATE SCHEMA "{schema_name}";']
+        for i in range(table_count):
+            parent = (
+                f', parent_id integer REFERENCES "{schema_name}".table_{i - 1:05d}(id)' if i else ""
+            )
+            statements.append(
+                f'CREATE TABLE "{schema_name}".table_{i:05d} ('
+                f'id serial PRIMARY KEY, name varchar(120) NOT NULL, code char(8), amount numeric(12, 2), '
+                f'note text, is_active boolean DEFAULT true, created_at timestamptz DEFAULT now(), uid uuid'
+                f'{parent});'
+            )
+
+        with conn.cursor() as cur:
+            cur.execute("\n".join(statements))
+
+        AppLogger.print("Generated {} tables in {:.2f}s".format(table_count, time.perf_counter() - started))
+
+    def drop_schema(self, conn, schema_name, batch_size=200):
+        # a single DROP SCHEMA ... CASCADE over thousands of tables exhausts max_locks_per_transaction
+        with conn.cursor() as cur:
+            cur.execute("SELECT tablename FROM pg_catalog.pg_tables WHERE schemaname = %s ORDER BY tablename DESC;",
+                        [schema_name])
+            tables = [row[0] for row in cur.fetchall()]
+            for i in range(0, len(tables), batch_size):
+                names = ", ".join(f'"{schema_name}"."{table}"' for table in tables[i:i + batch_size])
+                cur.execute(f"DROP TABLE IF EXISTS {names} CASCADE;")
+            cur.execute(f'DROP SCHEMA IF EXISTS "{schema_name}" CASCADE;')
+
+    def compare(self, legacy_schema, catalog_schema):
+        mismatches = []
+        for table, table_def in legacy_schema["tables"].items():
+            catalog_columns = catalog_schema["tables"].get(table, {}).get("columns", {})
+            for col_name, col_def in table_def["columns"].items():
+                catalog_def = catalog_columns.get(col_name, {})
+                for key in COMPARED_KEYS:
+                    legacy_value, catalog_value = col_def.get(key), catalog_def.get(key)
+                    if key == "foreign_key" and catalog_value:
+                        # the information_schema loop never read the ON DELETE action
+                        catalog_value = {"table": catalog_value["table"], "column": catalog_value["column"]}
+                    if legacy_value != catalog_value:
+                        mismatches.append((table, col_name, key, legacy_value, catalog_value))
+
+        for table in set(catalog_schema["tables"]) - set(legacy_schema["tables"]):
+            mismatches.append((table, None, "table", None, table))
+
+        return mismatches
@@ -0,0 +1,87 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils.log_util import AppLogger
+
+# run in a fresh interpreter per sample so every measurement pays the full import cost
+STARTUP_SCRIPT = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+sys.argv = ["gunicorn"]
+from core.wsgi import application
+startup_ms = (time.perf_counter() - started) * 1000
+rss_after_startup = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+from utils.dbsync_util import app_models
+registry = app_models[0]
+built_at_startup = len(registry.built())
+
+started = time.perf_counter()
+for name in list(registry)[:int(os.environ.get("DBSYNC_BENCHMARK_TOUCH", "0"))]:
+    registry[name]
+touch_ms = (time.perf_counter() - started) * 1000
+
+print("DBSYNC_BENCHMARK " + json.dumps({
+    "startup_ms": startup_ms,
+    "startup_rss_kb": rss_after_startup,
+    "touch_ms": touch_ms,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "models": len(registry),
+    "built_at_startup": built_at_startup,
+    "built": len(registry.built()),
+}))
+"""
+
+
+def run_startup_sample(env):
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT], env=env, cwd=str(settings.BASE_DIR),
+        capture_output=True, text=True, check=True,
+    ).stdout
+
+    for line in output.splitlines():
+        if line.startswith("DBSYNC_BENCHMARK "):
+            return json.loads(line[len("DBSYNC_BENCHMARK "):])
+
+    raise RuntimeError("Benchmark process did not report its measurements")
+
+
+class Command(BaseCommand):
+    help = "Measures process startup time and peak RSS with eager and lazy dynamic model construction"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-r", "--runs", type=int, default=3)
+        parser.add_argument("-t", "--touch", type=int, default=30,
+                            help="Number of models to access after startup, like an admin using a few tables")
+
+    def handle(self, *args, **options):
+        runs = max(options.get("runs"), 1)
+        touch = options.get("touch")
+
+        for mode in ("eager", "lazy"):
+            env = dict(os.environ)
+            env["DBSYNC_LAZY_MODELS"] = "true" if mode == "lazy" else "false"
+            env["DBSYNC_BENCHMARK_TOUCH"] = str(touch)
+
+            samples = [run_startup_sample(env) for _ in range(runs)]
+
+            AppLogger.print(
+                "{}: startup {:.0f}ms, startup RSS {:.1f}MB, {} of {} models built at startup; "
+                "touching {} models {:.0f}ms, RSS {:.1f}MB, {} models built".format(
+                    mode,
+                    statistics.median(s["startup_ms"] for s in samples),
+                    statistics.median(s["startup_rss_kb"] for s in samples) / 1024,
+                    samples[0]["built_at_startup"],
+                    samples[0]["models"],
+                    touch,
+                    statistics.median(s["touch_ms"] for s in samples),
+                    statistics.median(s["rss_kb"] for s in samples) / 1024,
+                    samples[0]["built"],
+                )
+            )
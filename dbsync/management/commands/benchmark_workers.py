@@ -0,0 +1,127 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.log_util import AppLogger
+from utils.schema_snapshot_util import get_snapshot_store
+
+# the settings of core.gunicorn_conf plus a hook reporting every booted worker
+CONFIG_TEMPLATE = """
+import os
+from core.gunicorn_conf import *  # noqa
+
+
+def post_worker_init(worker):
+    open(os.path.join({ready_dir!r}, str(worker.pid)), "w").close()
+"""
+
+
+def get_memory_kb(pid):
+    """
+    Returns (PSS, RSS) of a process in kB, PSS splits the pages shared with other processes between them.
+    """
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Pss", "Rss"):
+                memory[key] = int(value.split()[0])
+
+    return memory["Pss"], memory["Rss"]
+
+
+def get_children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+class Command(BaseCommand):
+    help = "Measures gunicorn boot time, memory and schema introspections per worker count, with and without --preload"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-w", "--workers", type=int, nargs="+", default=[2, 8, 32])
+        parser.add_argument("-m", "--modes", nargs="+", choices=["workers", "preload"], default=["workers", "preload"])
+        parser.add_argument("--warm", action="store_true", help="Keep the schema snapshot, by default every run starts without one")
+        parser.add_argument("--timeout", type=float, default=300)
+
+    def handle(self, *args, **options):
+        gunicorn = shutil.which("gunicorn") or os.path.join(os.path.dirname(sys.executable), "gunicorn")
+        if not os.path.exists(gunicorn):
+            raise CommandError("gunicorn is not installed")
+
+        for workers in options.get("workers"):
+            for mode in options.get("modes"):
+                if not options.get("warm"):
+                    store = get_snapshot_store()
+                    if store is not None:
+                        store.delete()
+
+                result = self.run_sample(gunicorn, workers, mode == "preload", options.get("timeout"))
+                AppLogger.print(
+                    "{} workers, {}: booted in {:.2f}s, PSS {:.1f}MB ({:.1f}MB per worker), RSS {:.1f}MB, "
+                    "{} introspections, {} snapshot loads".format(
+                        workers, mode, result["seconds"], result["pss_kb"] / 1024,
+                        result["pss_kb"] / 1024 / workers, result["rss_kb"] / 1024,
+                        result["introspections"], result["snapshot_loads"],
+                    )
+                )
+
+    def run_sample(self, gunicorn, workers, preload, timeout):
+        with tempfile.TemporaryDirectory() as directory:
+            ready_dir = os.path.join(directory, "ready")
+            os.makedirs(ready_dir)
+            config_path = os.path.join(directory, "gunicorn_benchmark.py")
+            with open(config_path, "w") as f:
+                f.write(CONFIG_TEMPLATE.format(ready_dir=ready_dir))
+
+            command = [
+                gunicorn, "-c", config_path, "--workers", str(workers),
+                "--bind", f"unix:{os.path.join(directory, 'gunicorn.sock')}", "--timeout", str(int(timeout)),
+            ]
+            if preload:
+                command.append("--preload")
+            command.append("core.wsgi:application")
+
+            log_path = os.path.join(directory, "gunicorn.log")
+            with open(log_path, "w") as log:
+                started = time.perf_counter()
+                process = subprocess.Popen(
+                    command, cwd=str(settings.BASE_DIR), env={**os.environ, "PYTHONUNBUFFERED": "1"},
+                    stdout=log, stderr=subprocess.STDOUT,
+                )
+
+                try:
+                    while len(os.listdir(ready_dir)) < workers:
+                        if process.poll() is not None:
+                            raise CommandError(f"gunicorn exited with {process.returncode}")
+                        if time.perf_counter() - started > timeout:
+                            raise CommandError(f"Only {len(os.listdir(ready_dir))} of {workers} workers booted")
+                        time.sleep(0.02)
+                    seconds = time.perf_counter() - started
+
+                    pss_kb = rss_kb = 0
+                    for pid in [process.pid] + get_children(process.pid):
+                        pss, rss = get_memory_kb(pid)
+                        pss_kb += pss
+                        rss_kb += rss
+                finally:
+                    process.send_signal(signal.SIGTERM)
+                    process.wait()
+
+            with open(log_path) as log:
+                output = log.read()
+
+        return {
+            "seconds": seconds,
+            "pss_kb": pss_kb,
+            "rss_kb": rss_kb,
+            "introspections": output.count("Schema introspected"),
+            "snapshot_loads": output.count("Schema loaded from snapshot"),
+        }
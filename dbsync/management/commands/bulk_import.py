@@ -0,0 +1,60 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dbsync.bulk_import import IMPORT_FORMATS, IMPORT_MODES, BulkImport, read_file
+from utils.log_util import AppLogger
+
+
+class Command(BaseCommand):
+    help = "Loads a CSV or JSON lines file into an external table with COPY, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="Model (table) to load")
+        parser.add_argument("path", help="CSV or JSON lines file, - for stdin")
+        parser.add_argument("-f", "--format", choices=IMPORT_FORMATS, help="File format, from the extension by default")
+        parser.add_argument("-m", "--mode", choices=IMPORT_MODES, default="insert", help="Insert or upsert rows")
+        parser.add_argument("--conflict-columns", help="Comma separated upsert key, the primary key by default")
+        parser.add_argument("--batch-size", type=int, help="Rows per COPY batch, DBSYNC_IMPORT_BATCH_SIZE by default")
+        parser.add_argument("--stop-on-error", action="store_true", help="Stop after the first failed batch")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        import_format = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError("Unknown file format, use --format")
+
+        conflict_columns = options["conflict_columns"].split(",") if options["conflict_columns"] else None
+
+        file = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8-sig")
+        try:
+            try:
+                columns, rows = read_file(file, import_format)
+                bulk_import = BulkImport(
+                    options["model"], columns, mode=options["mode"], conflict_columns=conflict_columns,
+                    batch_size=options["batch_size"],
+                )
+            except (KeyError, ValueError) as e:
+                raise CommandError(e)
+
+            imported = skipped = failed = 0
+            for report in bulk_import.run(rows):
+                imported += report["rows"]
+                skipped += report["skipped"]
+                AppLogger.print("Batch {} (lines {}-{}): {} rows, {} skipped{}".format(
+                    report["batch"], report["first_line"], report["last_line"], report["rows"], report["skipped"],
+                    f", failed: {report['error']}" if report["error"] else "",
+                ))
+                for error in report["errors"]:
+                    AppLogger.print(f"  {error}")
+
+                if report["error"]:
+                    failed += 1
+                    if options["stop_on_error"]:
+                        break
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        AppLogger.print(f"{imported} rows imported, {skipped} invalid rows skipped, {failed} failed batches")
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dbsync.compare import TableCompare
+from dbsync.sync import get_source_path
+from utils.dbsync_util import app_models
+from utils.log_util import AppLogger
+
+
+class Command(BaseCommand):
+    help = "Lists the primary keys of the rows that differ between the source SQLite database and the external tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", help="Models to compare, all of them by default")
+        parser.add_argument("--source", help="SQLite database file, DBSYNC_SYNC_SOURCE by default")
+        parser.add_argument("--chunk-size", type=int, help="Key range of the first chunks, DBSYNC_COMPARE_CHUNK_SIZE by default")
+        parser.add_argument("--limit", type=int, default=100, help="Keys listed per table and kind of difference, 0 for all")
+
+    def handle(self, *args, **options):
+        registry = app_models[0]
+        names = options["models"] or sorted(registry)
+        unknown = [name for name in names if name not in registry]
+        if unknown:
+            raise CommandError(f"Unknown models: {', '.join(unknown)}")
+
+        source_path = options["source"] or get_source_path()
+        AppLogger.print(f"Comparing {source_path} with the external database")
+
+        differing = 0
+        for name in names:
+            report = TableCompare(name, source_path=source_path, chunk_size=options["chunk_size"]).run()
+            if report["note"] or report["error"]:
+                AppLogger.print(f"{name}: {report['note'] or report['error']}")
+                continue
+
+            rows = len(report["only_local"]) + len(report["only_external"]) + len(report["changed"])
+            differing += rows
+            AppLogger.print("{}: {} differing rows ({} only in local, {} only in external, {} changed), {} queries, {:.2f}s".format(
+                name, rows, len(report["only_local"]), len(report["only_external"]), len(report["changed"]),
+                report["queries"], report["seconds"],
+            ))
+
+            for kind, label in (("only_local", "only in local"), ("only_external", "only in external"), ("changed", "changed")):
+                if report[kind]:
+                    keys = report[kind][:options["limit"]] if options["limit"] else report[kind]
+                    more = len(report[kind]) - len(keys)
+                    AppLogger.print(f"  {label}: {', '.join(map(str, keys))}{f' and {more} more' if more else ''}")
+
+        AppLogger.print(f"{differing} differing rows")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from dbsync.index_advisor import get_index_advice
+from utils.log_util import AppLogger
+
+
+class Command(BaseCommand):
+    help = "Checks the configured search and filter columns and the changelist orderings against the external " \
+           "indexes and suggests the missing ones, largest tables first"
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", help="Models to check, all of them by default")
+        parser.add_argument("-s", "--schema", default="public", help="Schema to introspect")
+        parser.add_argument("--min-rows", type=int,
+                            help="Skip tables with fewer estimated rows, DBSYNC_INDEX_ADVISOR_MIN_ROWS by default")
+        parser.add_argument("--sort", action="store_true",
+                            help="Also check every list display column, the changelist can be sorted on any of them")
+        parser.add_argument("--sql", action="store_true", help="Only print the CREATE INDEX statements")
+
+    def handle(self, *args, **options):
+        advice = get_index_advice(
+            schema_name=options["schema"], models=options["models"], min_rows=options["min_rows"],
+            sort_columns=options["sort"],
+        )
+
+        if options["sql"]:
+            for item in advice:
+                self.stdout.write(item["statement"])
+            return
+
+        for rank, item in enumerate(advice, 1):
+            AppLogger.print("{}. {}.{} ({}) used for {}, table {} with ~{} rows\n   {}".format(
+                rank, item["table"], item["column"], item["kind"], ", ".join(item["usages"]),
+                filesizeformat(item["size"] or 0), item["row_estimate"] if item["row_estimate"] is not None else "?",
+                item["statement"],
+            ))
+
+        AppLogger.print(f"{len(advice)} missing indexes")
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils.log_util import AppLogger
+from utils.query_cache_util import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Shows the hits and misses of the changelist query cache, shared by every worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the counters")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            reset_stats()
+            AppLogger.print("Query cache counters reset")
+            return
+
+        AppLogger.print(f"Query cache timeout: {settings.DBSYNC_QUERY_CACHE_TIMEOUT}s")
+        for kind, stats in get_stats().items():
+            ratio = f"{stats['ratio']:.1%}" if stats["ratio"] is not None else "-"
+            AppLogger.print(f"{kind}: {stats['hits']} hits, {stats['misses']} misses, hit ratio {ratio}")
@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from utils.log_util import AppLogger
+
+
+def setup_worker():
+    # spawned processes start without Django, and this module is imported before it is set up
+    # there: the models are only imported inside the command
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+class Command(BaseCommand):
+    help = "Runs the background jobs submitted from the admin in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, help="Jobs run at once, DBSYNC_JOB_PROCESSES by default")
+        parser.add_argument("--poll-interval", type=float,
+                            help="Seconds between two polls of the queue, DBSYNC_JOB_POLL_INTERVAL by default")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        from account.models import DBSyncJob
+
+        self.processes = options["processes"] or settings.DBSYNC_JOB_PROCESSES
+        poll_interval = options["poll_interval"] or settings.DBSYNC_JOB_POLL_INTERVAL
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = {}  # future: job id
+
+        signal.signal(signal.SIGTERM, interrupt)
+        AppLogger.print(f"Job runner {self.worker} started with {self.processes} processes")
+        executor = self.get_executor()
+
+        try:
+            while True:
+                self.fail_stale_jobs()
+                if self.running:
+                    DBSyncJob.objects.filter(pk__in=self.running.values()).update(heartbeat_at=timezone.now())
+
+                try:
+                    claimed = self.claim_jobs(executor)
+                except BrokenProcessPool:
+                    executor = self.restart(executor)
+                    continue
+
+                if options["once"] and not claimed and not self.running:
+                    break
+
+                if self.running:
+                    done, _ = wait(self.running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    if not self.finish_jobs(done):
+                        executor = self.restart(executor)
+                elif not claimed:
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            AppLogger.print(f"Stopping, cancelling {len(self.running)} running jobs")
+            DBSyncJob.objects.filter(pk__in=self.running.values(), status="running").update(cancel_requested=True)
+        finally:
+            executor.shutdown(wait=True)
+            self.finish_jobs(list(self.running))
+
+    def get_executor(self):
+        # spawned rather than forked: the workers open their own connections and pools
+        return ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"), initializer=setup_worker
+        )
+
+    def restart(self, executor):
+        # a worker process died, e.g. killed for its memory, and took the pool down
+        AppLogger.print("Restarting the worker processes")
+        executor.shutdown(wait=False)
+        return self.get_executor()
+
+    def claim_jobs(self, executor):
+        """
+        Takes the oldest queued jobs, up to the free processes. A job is claimed by the conditional
+        update of its status, so runners sharing the queue never run the same job twice.
+        """
+        from account.models import DBSyncJob
+        from dbsync.jobs import run_job
+
+        free = self.processes - len(self.running)
+        if free <= 0:
+            return 0
+
+        claimed = 0
+        for job_id in DBSyncJob.objects.filter(status="queued").order_by("id").values_list("id", flat=True)[:free]:
+            now = timezone.now()
+            if not DBSyncJob.objects.filter(pk=job_id, status="queued").update(
+                    status="running", worker=self.worker, started_at=now, heartbeat_at=now):
+                continue
+
+            try:
+                future = executor.submit(run_job, job_id)
+            except BrokenProcessPool:
+                DBSyncJob.objects.filter(pk=job_id).update(status="queued", worker="", started_at=None)
+                raise
+
+            AppLogger.print(f"Job {job_id} started")
+            self.running[future] = job_id
+            claimed += 1
+
+        return claimed
+
+    def finish_jobs(self, futures):
+        """
+        Returns False when a worker process died, every job of the pool is then marked failed.
+        """
+        from account.models import DBSyncJob
+
+        healthy = True
+        for future in futures:
+            job_id = self.running.pop(future)
+            try:
+                AppLogger.print(f"Job {job_id} {future.result()}")
+            except Exception as e:
+                healthy = healthy and not isinstance(e, BrokenProcessPool)
+                AppLogger.report(e, error=f"Job {job_id} crashed")
+                DBSyncJob.objects.filter(pk=job_id, status="running").update(
+                    status="failed", error=f"The worker process crashed: {e}", finished_at=timezone.now()
+                )
+
+        return healthy
+
+    def fail_stale_jobs(self):
+        """
+        Marks failed the running jobs of runners that stopped sending heartbeats.
+        """
+        from account.models import DBSyncJob
+
+        stale = DBSyncJob.objects.filter(
+            status="running", heartbeat_at__lt=timezone.now() - timedelta(seconds=settings.DBSYNC_JOB_STALE_AFTER)
+        ).exclude(pk__in=self.running.values())
+
+        for job in stale:
+            AppLogger.print(f"Job {job.pk} of {job.worker} is stale")
+        stale.update(status="failed", error="The job runner stopped", finished_at=timezone.now())
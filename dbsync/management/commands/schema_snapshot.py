@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from utils.dbsync_util import introspect_postgres_schema, load_schema
+from utils.log_util import AppLogger
+from utils.pool_util import borrow_connection
+from utils.schema_snapshot_util import get_catalog_fingerprint, get_snapshot_store, load_snapshot
+
+
+class Command(BaseCommand):
+    help = "Shows, warms or invalidates the introspected schema snapshot used at startup"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-w", "--warm", action="store_true", help="Re-introspect and rewrite the snapshot")
+        parser.add_argument("-i", "--invalidate", action="store_true", help="Delete the snapshot")
+        parser.add_argument("-s", "--schema", default="public")
+
+    def handle(self, *args, **options):
+        schema_name = options.get("schema")
+        store = get_snapshot_store(schema_name=schema_name)
+
+        if store is None:
+            AppLogger.print("Schema snapshot is disabled (DBSYNC_SCHEMA_SNAPSHOT_BACKEND)")
+            return
+
+        if options.get("invalidate"):
+            if store.delete():
+                AppLogger.print("Snapshot removed from {}".format(store))
+            else:
+                AppLogger.print("No snapshot found in {}".format(store))
+
+        if options.get("warm"):
+            load_schema(force=True, schema_name=schema_name)
+
+        if not options.get("invalidate") or options.get("warm"):
+            self.print_status(store, schema_name)
+
+    def print_status(self, store, schema_name):
+        with borrow_connection() as conn:
+            started = time.perf_counter()
+            fingerprint = get_catalog_fingerprint(conn, schema_name=schema_name)
+            fingerprint_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            snapshot = load_snapshot(store, fingerprint)
+            snapshot_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            schema = introspect_postgres_schema(conn, schema_name=schema_name)
+            introspection_ms = (time.perf_counter() - started) * 1000
+
+        AppLogger.print("Store: {}".format(store))
+        AppLogger.print("Catalog fingerprint: {} ({:.1f}ms)".format(fingerprint, fingerprint_ms))
+
+        if snapshot:
+            AppLogger.print("Snapshot is current: {} tables, loaded in {:.1f}ms".format(
+                len(snapshot["schema"]["tables"]), snapshot_ms))
+        else:
+            AppLogger.print("Snapshot is missing or stale, the next startup will introspect")
+
+        AppLogger.print("Full introspection: {} tables in {:.1f}ms".format(len(schema["tables"]), introspection_ms))
+        if snapshot:
+            AppLogger.print("Startup saving: {:.1f}ms".format(introspection_ms - snapshot_ms - fingerprint_ms))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from account.models import DBSyncModelColumn
+from dbsync.search import get_search_backend
+from utils.log_util import AppLogger
+
+
+class Command(BaseCommand):
+    help = "Reports how the admin search backend searches every search field and which ones lack a supporting index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", help="Models to report, all of them by default")
+
+    def handle(self, *args, **options):
+        search_fields = {}
+        queryset = DBSyncModelColumn.objects.filter(in_searchable_list=True).order_by("model", "order")
+        if options["models"]:
+            queryset = queryset.filter(model__in=options["models"])
+
+        for model, name in queryset.values_list("model", "name"):
+            search_fields.setdefault(model, []).append(name)
+
+        fallback = "searched by a full table scan" if settings.DBSYNC_SEARCH_UNINDEXED else "left out of searches"
+        unindexed = 0
+        for model, fields in search_fields.items():
+            for field, modes in get_search_backend(model, fields).get_coverage().items():
+                if "fulltext" not in modes and "trigram" not in modes:
+                    unindexed += 1
+                    AppLogger.print(f"{model}.{field}: no full text or trigram index, {fallback}"
+                                    + (f" (indexed for {', '.join(modes)})" if modes else ""))
+                else:
+                    AppLogger.print(f"{model}.{field}: {', '.join(modes)}")
+
+        AppLogger.print(f"{unindexed} search fields without a supporting index")
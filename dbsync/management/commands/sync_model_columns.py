@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from utils.dbsync_util import load_schema, sync_model_columns
+from utils.log_util import AppLogger
+
+
+class Command(BaseCommand):
+    help = "Reconciles DBSyncModelColumn with the external schema and reports rows added, changed and removed"
+
+    def handle(self, *args, **options):
+        report = sync_model_columns(load_schema())
+        if report is None:
+            AppLogger.print("Model columns were not synced")
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.models import DBSyncTableSync
+from dbsync.sync import get_source_path, sync_tables
+from utils.log_util import AppLogger
+
+
+class Command(BaseCommand):
+    help = "Copies the rows changed since the last run from the source SQLite database into the external tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", help="Models to sync, all of them by default")
+        parser.add_argument("--source", help="SQLite database file, DBSYNC_SYNC_SOURCE by default")
+        parser.add_argument("--workers", type=int, help="Tables synced at once, DBSYNC_SYNC_WORKERS by default")
+        parser.add_argument("--batch-size", type=int, help="Rows per batch, DBSYNC_SYNC_BATCH_SIZE by default")
+        parser.add_argument("--reset", action="store_true", help="Forget the watermarks and sync every row again")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            states = DBSyncTableSync.objects.all()
+            if options["models"]:
+                states = states.filter(model__in=options["models"])
+            states.update(watermark=None)
+
+        source_path = options["source"] or get_source_path()
+        AppLogger.print(f"Syncing from {source_path}")
+        started = time.perf_counter()
+
+        try:
+            reports = sync_tables(
+                options["models"], source_path=source_path, batch_size=options["batch_size"],
+                workers=options["workers"], callback=self.print_report,
+            )
+        except KeyError as e:
+            raise CommandError(e.args[0])
+
+        rows = sum(report["rows"] for report in reports)
+        failed = [report["model"] for report in reports if report["error"]]
+        AppLogger.print("{} rows synced in {:.2f}s, {} tables failed{}".format(
+            rows, time.perf_counter() - started, len(failed), ": " + ", ".join(failed) if failed else ""
+        ))
+        if failed:
+            raise CommandError("Sync failed")
+
+    def print_report(self, report):
+        if report["note"] or (report["error"] and not report["batches"] and not report["seconds"]):
+            AppLogger.print(f"{report['model']}: {report['note'] or report['error']}")
+            return
+
+        AppLogger.print("{}: {} rows ({} skipped) in {} batches, {:.2f}s, {:.0f} rows/s, watermark {}{}".format(
+            report["model"], report["rows"], report["skipped"], report["batches"], report["seconds"],
+            report["rows"] / report["seconds"] if report["seconds"] else 0, report["watermark_column"],
+            f", failed: {report['error']}" if report["error"] else "",
+        ))
@@ -0,0 +1,143 @@
+import base64
+import json
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from utils.pg_stats_util import get_estimated_count
+from utils.query_cache_util import get_cached
+
+
+def get_cached_estimated_count(queryset, exact_count_threshold):
+    return get_cached(
+        "count", queryset, lambda: get_estimated_count(queryset, exact_count_threshold), exact_count_threshold
+    )
+
+
+class EstimatedPage(Page):
+    """
+    Page of an estimated count, which only knows there is a next page from the extra row fetched with it.
+    """
+
+    def __init__(self, object_list, number, paginator, has_more=False):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count is the planner estimate for large result sets, see get_estimated_count.
+    The estimate may be short of the actual rows, so while it is used a page is valid as long as it
+    has rows, whatever the number of pages says. `fetch` turns a page queryset into a list of rows.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, exact_count_threshold=0,
+                 fetch=list):
+        super().__init__(object_list, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page)
+        self.exact_count_threshold = exact_count_threshold
+        self.is_estimated = False
+        self.fetch = fetch
+        # pages by number, the changelist asks for its page again to link the next one
+        self._pages = {}
+
+    @cached_property
+    def count(self):
+        count, self.is_estimated = get_cached_estimated_count(self.object_list, self.exact_count_threshold)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # the number of pages was checked against the count, page() checks for rows instead
+            if not self.is_estimated or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.is_estimated:
+            return super().page(number)
+
+        if number not in self._pages:
+            bottom = (number - 1) * self.per_page
+            rows = self.fetch(self.object_list[bottom:bottom + self.per_page + 1])
+            if not rows and number > 1:
+                raise EmptyPage(self.error_messages["no_results"])
+
+            self._pages[number] = EstimatedPage(
+                rows[:self.per_page], number, self, has_more=len(rows) > self.per_page
+            )
+
+        return self._pages[number]
+
+
+class KeysetPaginator:
+    """
+    Pages by seeking past the last row of the previous page instead of skipping rows with OFFSET, so
+    every page costs the same whatever its depth. `ordering` is a list of (field, descending) pairs
+    that must end with the primary key. `fetch` turns a page queryset into a list of rows.
+    """
+
+    def __init__(self, queryset, per_page, ordering, fetch=list):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        # evaluates the page querysets, e.g. through the query cache
+        self.fetch = fetch
+
+    def get_order_by(self, forward=True):
+        return [
+            ("-" if descending == forward else "") + field.attname
+            for field, descending in self.ordering
+        ]
+
+    def get_seek_filter(self, values, forward=True):
+        # (a, b) > (x, y) spelled out as a > x OR (a = x AND b > y), per column direction
+        seek_filter = Q()
+        equal = {}
+
+        for (field, descending), value in zip(self.ordering, values):
+            lookup = "lt" if descending == forward else "gt"
+            seek_filter |= Q(**equal, **{f"{field.attname}__{lookup}": value})
+            equal[field.attname] = value
+
+        return seek_filter
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, field.attname) for field, _ in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise IncorrectLookupParameters("Invalid pagination cursor")
+
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise IncorrectLookupParameters("Invalid pagination cursor")
+
+        return values
+
+    def get_page(self, after=None, before=None):
+        """
+        Returns (rows, has_previous, has_next) for the page after or before the given cursors.
+        """
+        if before:
+            queryset = self.queryset.filter(self.get_seek_filter(self.decode_cursor(before), forward=False))
+            rows = self.fetch(queryset.order_by(*self.get_order_by(forward=False))[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            return rows[:self.per_page][::-1], has_previous, True
+
+        queryset = self.queryset
+        if after:
+            queryset = queryset.filter(self.get_seek_filter(self.decode_cursor(after)))
+
+        rows = self.fetch(queryset.order_by(*self.get_order_by())[:self.per_page + 1])
+        return rows[:self.per_page], bool(after), len(rows) > self.per_page
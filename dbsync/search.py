@@ -0,0 +1,287 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from django.utils.text import smart_split, unescape_string_literal
+
+from utils.dbsync_util import app_models, get_column_field
+
+TEXT_TYPES = {"character varying", "varchar", "character", "char", "text", "citext"}
+INTEGER_TYPES = {"smallint", "integer", "int", "bigint", "serial", "bigserial"}
+
+PATTERN_OPCLASSES = {"text_pattern_ops", "varchar_pattern_ops", "bpchar_pattern_ops"}
+TRIGRAM_OPCLASSES = {"gin_trgm_ops", "gist_trgm_ops"}
+
+# `#42` or `id:42` only looks up the primary key
+ID_SEARCH_RE = re.compile(r"^(?:#|id:)(\d{1,18})$")
+TSVECTOR_CONFIG_RE = re.compile(r"^to_tsvector\('([^']+)'::regconfig")
+
+
+def get_search_modes(table_def, column):
+    """
+    Returns {mode: SQL} for the search modes the indexes of `column` support. Full text maps to
+    the indexed tsvector expression, the other modes to None.
+    """
+    col_def = table_def["columns"].get(column, {})
+    modes = {}
+
+    for index in table_def.get("indexes", []):
+        if index["partial"]:
+            continue
+
+        leading = index["columns"][0]
+        opclass = (index.get("opclasses") or [None])[0]
+        expression = index.get("expression") or ""
+
+        if index["method"] in ("gin", "gist"):
+            if leading == column and col_def.get("type") == "tsvector":
+                modes["fulltext"] = connections["external"].ops.quote_name(column)
+            elif leading is None and len(index["columns"]) == 1 and expression.startswith("to_tsvector(") \
+                    and re.search(rf"\b{re.escape(column)}\b", expression):
+                modes["fulltext"] = expression
+            elif leading == column and opclass in TRIGRAM_OPCLASSES:
+                modes["trigram"] = None
+                modes["prefix"] = None
+        elif index["method"] == "btree" and leading == column:
+            modes["exact"] = None
+            if opclass in PATTERN_OPCLASSES:
+                modes["prefix"] = None
+
+    return modes
+
+
+def get_search_backend(model_name, search_fields):
+    return import_string(settings.DBSYNC_SEARCH_BACKEND)(model_name, search_fields)
+
+
+class ContainsSearchBackend:
+    """
+    Django's default admin search: every word has to be contained in one of the search fields.
+    The icontains lookups cannot use an index, so every search reads the whole table.
+    """
+
+    def __init__(self, model_name, search_fields):
+        self.model_name = model_name
+        self.search_fields = list(search_fields)
+        self.table_name, self.table_def = app_models[0].get_table(model_name)
+
+    @staticmethod
+    def get_words(search_term):
+        words = []
+        for word in smart_split(search_term):
+            if word[0] in "\"'" and word[0] == word[-1]:
+                word = unescape_string_literal(word)
+            if word:
+                words.append(word)
+
+        return words
+
+    @staticmethod
+    def get_contains_q(words, fields):
+        q = Q()
+        for word in words:
+            word_q = Q()
+            for field in fields:
+                word_q |= Q(**{f"{field}__icontains": word})
+            q &= word_q
+
+        return q
+
+    def search(self, queryset, search_term):
+        words = self.get_words(search_term)
+        if not words or not self.search_fields:
+            return queryset
+
+        return queryset.filter(self.get_contains_q(words, self.search_fields))
+
+    def autocomplete(self, queryset, search_term):
+        return self.search(queryset, search_term)
+
+    def get_coverage(self):
+        """
+        Returns {search field: the search modes an index supports}, see IndexedSearchBackend.
+        """
+        return {field: [] for field in self.search_fields}
+
+
+class IndexedSearchBackend(ContainsSearchBackend):
+    """
+    Search that picks, for every search field, the lookup one of its indexes can serve:
+
+    - words go through `websearch_to_tsquery` on columns with a tsvector GIN/GiST index, and through
+      ILIKE plus pg_trgm similarity on columns with a trigram index;
+    - `=value` is an exact match and `value*` a prefix match, served by btree indexes;
+    - `#42` and `id:42` look up the primary key, a bare number also matches it.
+
+    Fields without a supporting index fall back to icontains when DBSYNC_SEARCH_UNINDEXED is set,
+    and are left out of the search otherwise.
+    """
+
+    def __init__(self, model_name, search_fields):
+        super().__init__(model_name, search_fields)
+        self.modes = {field: self.get_column_modes(field) for field in self.search_fields}
+
+    def get_column_modes(self, column):
+        return get_search_modes(self.table_def, column)
+
+    def is_text(self, column):
+        return self.table_def["columns"].get(column, {}).get("type") in TEXT_TYPES
+
+    def get_fields(self, mode, text_only=True):
+        """
+        Returns the search fields searched in `mode`: the ones with a supporting index, and the other
+        text fields too when DBSYNC_SEARCH_UNINDEXED is set.
+        """
+        return [
+            field for field, modes in self.modes.items()
+            if (mode in modes or settings.DBSYNC_SEARCH_UNINDEXED) and (not text_only or self.is_text(field))
+        ]
+
+    def get_integer_pk(self):
+        """
+        Returns the primary key column when it is a single integer column, id searches need one.
+        """
+        for index in self.table_def.get("indexes", []):
+            if index["primary"] and len(index["columns"]) == 1:
+                column = index["columns"][0]
+                if self.table_def["columns"].get(column, {}).get("type") in INTEGER_TYPES:
+                    return column
+
+        return None
+
+    def get_pk_column(self):
+        return app_models[0][self.model_name]._meta.pk.column
+
+    def get_fulltext_q(self, field, search_term):
+        """
+        Matches the indexed tsvector expression. It is written against the bare table, so it is
+        evaluated in a subquery where the select_related joins cannot make its columns ambiguous.
+        """
+        quote_name = connections["external"].ops.quote_name
+        expression = self.modes[field]["fulltext"]
+        config = TSVECTOR_CONFIG_RE.match(expression)
+        query = "websearch_to_tsquery(%s::regconfig, %s)" if config else "websearch_to_tsquery(%s)"
+        params = [config.group(1), search_term] if config else [search_term]
+
+        return Q(pk__in=RawSQL(
+            "SELECT {pk} FROM {table} WHERE {expression} @@ {query}".format(
+                pk=quote_name(self.get_pk_column()), table=quote_name(self.table_name),
+                expression=expression, query=query,
+            ),
+            params,
+        ))
+
+    def get_trigram_q(self, field, word):
+        quote_name = connections["external"].ops.quote_name
+        column = f"{quote_name(self.table_name)}.{quote_name(field)}"
+        pattern = "%{}%".format(connections["external"].ops.prep_for_like_query(word))
+
+        # both operators are served by the gin_trgm_ops/gist_trgm_ops index
+        return Q(RawSQL(f"({column} ILIKE %s OR {column} %% %s)", [pattern, word], output_field=BooleanField()))
+
+    def get_exact_q(self, value):
+        """
+        Matches `value` on every exact search field it is a valid value of, e.g. `=42` on integer
+        columns too, the fields it cannot be converted for are left out.
+        """
+        q = Q()
+        for field in self.get_fields("exact", text_only=False):
+            model_field, _ = get_column_field(self.table_def["columns"][field])
+            try:
+                cleaned = model_field.to_python(value)
+            except ValidationError:
+                continue
+            # an empty value is None for most fields, it is no search for NULL
+            if cleaned is not None:
+                q |= Q(**{field: cleaned})
+
+        return q
+
+    def get_text_q(self, search_term):
+        q = Q()
+        for field, modes in self.modes.items():
+            if "fulltext" in modes:
+                q |= self.get_fulltext_q(field, search_term)
+
+        words = self.get_words(search_term)
+        trigram_fields = [field for field, modes in self.modes.items() if "trigram" in modes]
+        contains_fields = [
+            field for field, modes in self.modes.items()
+            if settings.DBSYNC_SEARCH_UNINDEXED and "fulltext" not in modes and "trigram" not in modes
+        ]
+
+        if words and (trigram_fields or contains_fields):
+            words_q = Q()
+            for word in words:
+                word_q = self.get_contains_q([word], contains_fields)
+                for field in trigram_fields:
+                    word_q |= self.get_trigram_q(field, word)
+                words_q &= word_q
+            q |= words_q
+
+        return q
+
+    def search(self, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset
+
+        id_search = ID_SEARCH_RE.match(search_term)
+        if id_search:
+            return queryset.filter(pk=int(id_search.group(1))) if self.get_integer_pk() else queryset.none()
+
+        if search_term.startswith("="):
+            value = search_term[1:]
+            if value[:1] in "\"'" and value[:1] == value[-1:] and len(value) > 1:
+                value = unescape_string_literal(value)
+            q = self.get_exact_q(value)
+        elif search_term.endswith("*"):
+            q = Q()
+            for field in self.get_fields("prefix"):
+                q |= Q(**{f"{field}__startswith": search_term[:-1]})
+        else:
+            q = self.get_text_q(search_term)
+            if search_term.isdigit() and len(search_term) <= 18 and self.get_integer_pk():
+                q |= Q(pk=int(search_term))
+
+        if not q:
+            return queryset.none()
+
+        return queryset.filter(q)
+
+    def autocomplete(self, queryset, search_term):
+        """
+        Prefix search for the autocomplete widgets: case-insensitive through a trigram index,
+        case-sensitive through a *_pattern_ops btree, plus the primary key for a number.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset
+
+        quote_name = connections["external"].ops.quote_name
+        pattern = "{}%".format(connections["external"].ops.prep_for_like_query(search_term))
+
+        q = Q()
+        for field, modes in self.modes.items():
+            if "trigram" in modes:
+                column = f"{quote_name(self.table_name)}.{quote_name(field)}"
+                q |= Q(RawSQL(f"{column} ILIKE %s", [pattern], output_field=BooleanField()))
+            elif "prefix" in modes:
+                q |= Q(**{f"{field}__startswith": search_term})
+            elif settings.DBSYNC_SEARCH_UNINDEXED and self.is_text(field):
+                q |= Q(**{f"{field}__istartswith": search_term})
+
+        if search_term.isdigit() and len(search_term) <= 18 and self.get_integer_pk():
+            q |= Q(pk=int(search_term))
+
+        if not q:
+            return queryset.none()
+
+        return queryset.filter(q)
+
+    def get_coverage(self):
+        return {field: sorted(modes) for field, modes in self.modes.items()}
@@ -0,0 +1,42 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from core.dbrouter import pin_primary
+from utils.dbsync_util import app_models
+from utils.query_cache_util import bump_table_version
+
+
+def invalidate_query_cache(sender, using, **kwargs):
+    pin_primary()
+    bump_table_version(sender._meta.db_table, using=using)
+
+
+def invalidate_m2m_query_cache(sender, instance, action, using, **kwargs):
+    if action.startswith("post_"):
+        pin_primary()
+        bump_table_version(sender._meta.db_table, using=using)
+        bump_table_version(instance._meta.db_table, using=using)
+
+
+def connect_query_cache_signals(names):
+    # connected per dynamic model, a receiver for every sender would disable the fast deletes of all models
+    models = app_models[0]
+    for name in names:
+        model = models[name]
+        post_save.connect(invalidate_query_cache, sender=model, dispatch_uid=f"query_cache_save_{name}")
+        post_delete.connect(invalidate_query_cache, sender=model, dispatch_uid=f"query_cache_delete_{name}")
+        m2m_changed.connect(invalidate_m2m_query_cache, sender=model, dispatch_uid=f"query_cache_m2m_{name}")
+
+
+def reconnect_query_cache_signals(names, replaced):
+    # a reload creates the new classes of its tables without running the build listeners
+    for name, model in replaced.items():
+        post_save.disconnect(sender=model, dispatch_uid=f"query_cache_save_{name}")
+        post_delete.disconnect(sender=model, dispatch_uid=f"query_cache_delete_{name}")
+        m2m_changed.disconnect(sender=model, dispatch_uid=f"query_cache_m2m_{name}")
+
+    connect_query_cache_signals(names)
+
+
+connect_query_cache_signals(app_models[0].built())
+app_models[0].add_build_listener(connect_query_cache_signals)
+app_models[0].add_reload_listener(reconnect_query_cache_signals)
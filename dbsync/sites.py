@@ -0,0 +1,301 @@
+import json
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.contrib import messages
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import NoReverseMatch, clear_url_caches, path, reverse
+from django.utils.text import capfirst
+from django.views.decorators.common import no_append_slash
+
+from utils.log_util import AppLogger
+
+
+def refresh_admin_urls():
+    """
+    Rebuilds the root urlpatterns so admin URLs of models registered after startup resolve.
+    """
+    urlconf = import_module(settings.ROOT_URLCONF)
+    if hasattr(urlconf, "get_urlpatterns"):
+        urlconf.urlpatterns = urlconf.get_urlpatterns()
+    clear_url_caches()
+
+
+class DBSyncAdminSite(admin.AdminSite):
+    """
+    Admin site that lists dynamic models which have not been built yet (lazy mode) and
+    builds them on their first visit.
+    """
+
+    def get_model_registry(self):
+        from utils.dbsync_util import app_models
+
+        return app_models[0]
+
+    def get_urls(self):
+        return [
+            path("dbsync/_load/<str:model_name>/", self.admin_view(self.load_model_view), name="dbsync_load_model"),
+            path("dbsync/_index_advisor/", self.admin_view(self.index_advisor_view), name="dbsync_index_advisor"),
+            path("dbsync/_pool_stats/", self.admin_view(self.pool_stats_view), name="dbsync_pool_stats"),
+            path("dbsync/_sql_profile/", self.admin_view(self.sql_profile_view), name="dbsync_sql_profile"),
+            path("dbsync/_jobs/", self.admin_view(self.jobs_view), name="dbsync_jobs"),
+            path("dbsync/_jobs/<int:job_id>/", self.admin_view(self.job_view), name="dbsync_job"),
+            path("dbsync/_jobs/<int:job_id>/file/", self.admin_view(self.job_file_view), name="dbsync_job_file"),
+        ] + super().get_urls()
+
+    def get_changelist_url(self, model):
+        return reverse(f"{self.name}:{model._meta.app_label}_{model._meta.model_name}_changelist")
+
+    def load_model_view(self, request, model_name):
+        registry = self.get_model_registry()
+        if model_name not in registry:
+            raise Http404
+
+        try:
+            return redirect(self.get_changelist_url(registry[model_name]))
+        except NoReverseMatch as e:
+            AppLogger.report(e)
+            raise Http404
+
+    def get_job_url(self, job):
+        return reverse(f"{self.name}:dbsync_job", kwargs={"job_id": job.pk})
+
+    def index_advisor_view(self, request):
+        """
+        Shows the advice of the latest index_advisor job for the same models, or, before the first
+        one, the advice for the schema the models were built from. Only the job introspects the
+        external schema, which is slow on large schemas; a POST queues one.
+        """
+        from account.models import DBSyncJob
+        from dbsync.index_advisor import get_index_advice
+        from dbsync.jobs import submit_job
+
+        if not request.user.is_superuser:
+            raise PermissionDenied
+
+        models = request.GET.getlist("model")
+        if request.method == "POST":
+            job = submit_job("index_advisor", {"models": models}, user=request.user)
+            return redirect(self.get_job_url(job))
+
+        jobs = [
+            job for job in DBSyncJob.objects.filter(kind="index_advisor", status__in=("queued", "running", "done"))[:50]
+            if job.params.get("models", []) == models
+        ]
+        job = next((job for job in jobs if job.status == "done"), None)
+        pending = next((job for job in jobs if job.status != "done"), None)
+
+        min_rows = settings.DBSYNC_INDEX_ADVISOR_MIN_ROWS
+        if job is not None:
+            advice = job.result["advice"]
+            min_rows = job.result.get("min_rows", min_rows)
+        else:
+            registry = self.get_model_registry()
+            advice = get_index_advice(
+                schema={"tables": dict(registry.get_table(name) for name in registry)}, models=models
+            )
+
+        context = {
+            **self.each_context(request),
+            "title": "Index advisor",
+            "advice": advice,
+            "job": job,
+            "pending": pending,
+            "models": models,
+            "min_rows": min_rows,
+        }
+        return TemplateResponse(request, "admin/dbsync/index_advisor.html", context)
+
+    def pool_stats_view(self, request):
+        """
+        Connection pool metrics of the worker serving the request.
+        """
+        from utils.pool_util import get_pool_stats
+
+        if not request.user.is_superuser:
+            raise PermissionDenied
+
+        return JsonResponse(get_pool_stats())
+
+    def sql_profile_view(self, request):
+        """
+        Rolling percentiles of the requests profiled with DBSYNC_PROFILE_SQL, a POST resets them.
+        """
+        from utils.sql_profile_util import get_profile_stats, reset_profile_stats
+
+        if not request.user.is_superuser:
+            raise PermissionDenied
+
+        if request.method == "POST":
+            reset_profile_stats()
+            return redirect(request.path)
+
+        context = {
+            **self.each_context(request),
+            "title": "SQL profile",
+            "enabled": settings.DBSYNC_PROFILE_SQL,
+            "window": settings.DBSYNC_PROFILE_WINDOW,
+            "stats": get_profile_stats(),
+        }
+        return TemplateResponse(request, "admin/dbsync/sql_profile.html", context)
+
+    def get_job(self, request, job_id):
+        from account.models import DBSyncJob
+
+        job = get_object_or_404(DBSyncJob, pk=job_id)
+        if not request.user.is_superuser and job.created_by_id != request.user.pk:
+            raise PermissionDenied
+
+        return job
+
+    def jobs_view(self, request):
+        """
+        Background jobs, all of them for superusers and their own for the other users. Superusers
+        can also queue a sync of the external tables here.
+        """
+        from account.models import DBSyncJob
+        from dbsync.jobs import submit_job
+
+        if request.method == "POST":
+            if not request.user.is_superuser:
+                raise PermissionDenied
+
+            models = request.POST.get("models", "").replace(",", " ").split()
+            job = submit_job("sync_tables", {"models": models}, user=request.user)
+            return redirect(self.get_job_url(job))
+
+        jobs = DBSyncJob.objects.select_related("created_by")
+        if not request.user.is_superuser:
+            jobs = jobs.filter(created_by=request.user)
+
+        context = {
+            **self.each_context(request),
+            "title": "Background jobs",
+            "jobs": jobs[:100],
+            "runners": DBSyncJob.objects.filter(status="running").values_list("worker", flat=True).distinct(),
+        }
+        return TemplateResponse(request, "admin/dbsync/jobs.html", context)
+
+    def job_view(self, request, job_id):
+        """
+        Status of a job, as JSON for the polling of its page with ?format=json. A POST cancels it.
+        """
+        from dbsync.jobs import cancel_job, get_result_path
+
+        job = self.get_job(request, job_id)
+
+        if request.method == "POST":
+            cancel_job(job)
+            messages.info(request, f"Cancellation of job #{job.pk} requested.")
+            return redirect(request.path)
+
+        if request.GET.get("format") == "json":
+            return JsonResponse({
+                "status": job.status,
+                "progress": job.progress,
+                "total": job.total,
+                "message": job.message,
+                "rows_per_second": job.rows_per_second,
+                "cancel_requested": job.cancel_requested,
+                "finished": job.is_finished,
+            })
+
+        context = {
+            **self.each_context(request),
+            "title": f"Job #{job.pk}: {job.kind}",
+            "job": job,
+            "has_file": get_result_path(job) is not None,
+            "result": json.dumps(job.result, indent=2) if job.result is not None else None,
+            "params": {key: value for key, value in job.params.items() if key not in ("query", "path")},
+        }
+        return TemplateResponse(request, "admin/dbsync/job.html", context)
+
+    def job_file_view(self, request, job_id):
+        from dbsync.jobs import get_result_path
+
+        path = get_result_path(self.get_job(request, job_id))
+        if path is None:
+            raise Http404
+
+        return FileResponse(open(path, "rb"), as_attachment=True)
+
+    def autocomplete_view(self, request):
+        from dbsync.views import ExternalAutocompleteJsonView
+
+        return ExternalAutocompleteJsonView.as_view(admin_site=self)(request)
+
+    @no_append_slash
+    def catch_all_view(self, request, url):
+        # admin URLs of a model that this worker has not built yet, e.g. a bookmark or a
+        # link handed out by another worker
+        registry = self.get_model_registry()
+        app_label, _, rest = url.partition("/")
+
+        if registry.lazy and app_label == "dbsync" and self.has_permission(request):
+            from utils.dbsync_util import to_camel_case
+
+            object_names = {to_camel_case(name).lower(): name for name in registry}
+            model_name = object_names.get(rest.split("/")[0])
+
+            if model_name and not registry.is_built(model_name):
+                registry[model_name]
+                return redirect(request.get_full_path())
+
+        return super().catch_all_view(request, url)
+
+    def _build_app_dict(self, request, label=None):
+        app_dict = super()._build_app_dict(request, label)
+
+        registry = self.get_model_registry()
+        if not registry.lazy or label not in (None, "dbsync") or not request.user.has_module_perms("dbsync"):
+            return app_dict
+
+        stubs = [self.get_model_stub(name) for name in registry if not registry.is_built(name)]
+        if not stubs:
+            return app_dict
+
+        if label:
+            dbsync_app = app_dict
+        else:
+            dbsync_app = app_dict.get("dbsync")
+
+        if dbsync_app is None:
+            try:
+                app_url = reverse(f"{self.name}:app_list", kwargs={"app_label": "dbsync"})
+            except NoReverseMatch:
+                app_url = reverse(f"{self.name}:index")
+
+            dbsync_app = {
+                "name": apps.get_app_config("dbsync").verbose_name,
+                "app_label": "dbsync",
+                "app_url": app_url,
+                "has_module_perms": True,
+                "models": [],
+            }
+
+            if label:
+                app_dict = dbsync_app
+            else:
+                app_dict["dbsync"] = dbsync_app
+
+        dbsync_app["models"].extend(stubs)
+        return app_dict
+
+    def get_model_stub(self, name):
+        from utils.dbsync_util import get_verbose_name_plural, to_camel_case
+
+        table_name, _ = self.get_model_registry().get_table(name)
+        return {
+            "model": None,
+            "name": capfirst(get_verbose_name_plural(table_name)),
+            "object_name": to_camel_case(name),
+            "perms": {"add": False, "change": False, "delete": False, "view": True},
+            "admin_url": reverse(f"{self.name}:dbsync_load_model", kwargs={"model_name": name}),
+            "add_url": None,
+            "view_only": True,
+        }
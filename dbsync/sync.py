@@ -0,0 +1,238 @@
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from account.models import DBSyncTableSync
+from dbsync.bulk_import import BulkImport, get_unique_columns
+from utils.dbsync_util import app_models, get_base_model_name
+from utils.log_util import AppLogger
+
+# relkinds rows can be written to, views are left out
+SYNCED_RELKINDS = ("r", "p")
+
+
+def get_source_path():
+    return settings.DBSYNC_SYNC_SOURCE or str(settings.DATABASES["default"]["NAME"])
+
+
+def connect_source(path):
+    # read only, the sync never writes to the source
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def get_sync_dependencies(names):
+    """
+    Returns {model: models among `names` its foreign keys point at}, self references left out.
+    """
+    registry = app_models[0]
+    dependencies = {}
+    for name in names:
+        _, table_def = registry.get_table(name)
+        targets = {
+            get_base_model_name(col_def["foreign_key"]["table"])
+            for col_def in table_def["columns"].values() if col_def.get("foreign_key")
+        }
+        dependencies[name] = (targets & set(names)) - {name}
+
+    return dependencies
+
+
+class TableSync:
+    """
+    Copies the rows of a source SQLite table changed since the last run into the external table of
+    the same name, `batch_size` rows at a time in (watermark column, primary key) order.
+
+    The watermark column is the first of DBSYNC_SYNC_WATERMARK_COLUMNS the table has, e.g. updated_at,
+    and the primary key otherwise, which only picks up new rows. Batches are upserted on the primary
+    key through BulkImport and the watermark of the last row is saved after every batch, so a run
+    that died resumes after the last saved batch; rows written again are simply updated.
+    """
+
+    def __init__(self, model_name, source_path=None, batch_size=None):
+        self.model_name = model_name
+        self.table_name, self.table_def = app_models[0].get_table(model_name)
+        self.source_path = source_path or get_source_path()
+        self.batch_size = batch_size or settings.DBSYNC_SYNC_BATCH_SIZE
+
+    def get_report(self, **kwargs):
+        return {
+            "model": self.model_name, "rows": 0, "skipped": 0, "batches": 0, "seconds": 0.0,
+            "watermark_column": None, "error": None, "note": None, **kwargs,
+        }
+
+    def get_source_columns(self, source):
+        quote_name = connections["external"].ops.quote_name
+        info = source.execute(f"PRAGMA table_info({quote_name(self.table_name)})").fetchall()
+        # (cid, name, type, notnull, default, pk position)
+        return [row[1] for row in info], [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+
+    def get_watermark_column(self, columns, pk):
+        for column in settings.DBSYNC_SYNC_WATERMARK_COLUMNS:
+            if column in columns and column != pk:
+                return column
+
+        return pk
+
+    def get_batch_sql(self, columns, watermark_column, pk, watermark):
+        quote_name = connections["external"].ops.quote_name
+        column_list = ", ".join(quote_name(column) for column in columns)
+        wm, pk = quote_name(watermark_column), quote_name(pk)
+
+        where, params = "", []
+        if watermark is not None and wm == pk:
+            where, params = f"WHERE {pk} > ?", [watermark[1]]
+        elif watermark is not None and watermark[0] is None:
+            # NULLs sort first
+            where, params = f"WHERE ({wm} IS NULL AND {pk} > ?) OR {wm} IS NOT NULL", [watermark[1]]
+        elif watermark is not None:
+            where, params = f"WHERE {wm} > ? OR ({wm} = ? AND {pk} > ?)", [watermark[0], watermark[0], watermark[1]]
+
+        order = pk if wm == pk else f"{wm}, {pk}"
+        return (
+            f"SELECT {column_list} FROM {quote_name(self.table_name)} {where} ORDER BY {order} LIMIT ?",
+            params + [self.batch_size],
+        )
+
+    def run(self):
+        started = time.perf_counter()
+
+        if self.table_def.get("kind", "r") not in SYNCED_RELKINDS:
+            return self.get_report(note="not a table")
+
+        try:
+            source = connect_source(self.source_path)
+        except sqlite3.Error as e:
+            return self.get_report(error=f"Unable to open {self.source_path}: {e}")
+
+        try:
+            source_columns, source_pk = self.get_source_columns(source)
+            if not source_columns:
+                return self.get_report(note="not in the source database")
+
+            columns = [column for column in self.table_def["columns"] if column in source_columns]
+            if len(source_pk) != 1 or source_pk[0] not in columns:
+                return self.get_report(error="needs a single column primary key in both databases")
+
+            pk = source_pk[0]
+            watermark_column = self.get_watermark_column(columns, pk)
+            report = self.sync(source, columns, pk, watermark_column)
+        except Exception as e:
+            AppLogger.report(e, error=f"Sync of {self.model_name} failed")
+            report = self.get_report(error=str(e))
+        finally:
+            source.close()
+
+        report["seconds"] = time.perf_counter() - started
+        return report
+
+    def sync(self, source, columns, pk, watermark_column):
+        state, _ = DBSyncTableSync.objects.get_or_create(model=self.model_name)
+        if state.watermark_column != watermark_column:
+            state.watermark_column, state.watermark = watermark_column, None
+        state.status, state.error, state.started_at = "running", "", timezone.now()
+        state.save()
+
+        # without a unique index on the primary key, rows of a batch written again are duplicated
+        mode = "upsert" if [pk] in get_unique_columns(self.table_def) else "insert"
+        bulk_import = BulkImport(self.model_name, columns, mode=mode, conflict_columns=[pk], batch_size=self.batch_size)
+        report = self.get_report(watermark_column=watermark_column)
+        wm_index, pk_index = columns.index(watermark_column), columns.index(pk)
+
+        while True:
+            sql, params = self.get_batch_sql(columns, watermark_column, pk, state.watermark)
+            rows = source.execute(sql, params).fetchall()
+            if not rows:
+                break
+
+            batch = [(report["rows"] + report["skipped"] + line, dict(zip(columns, row))) for line, row in enumerate(rows, 1)]
+            batch_report = bulk_import.import_batch(report["batches"] + 1, batch)
+            if batch_report["error"]:
+                report["error"] = batch_report["error"]
+                break
+
+            report["batches"] += 1
+            report["rows"] += batch_report["rows"]
+            report["skipped"] += batch_report["skipped"]
+            for error in batch_report["errors"]:
+                AppLogger.print(f"{self.model_name} row {error}")
+
+            state.watermark = [rows[-1][wm_index], rows[-1][pk_index]]
+            state.rows_synced += batch_report["rows"]
+            state.save(update_fields=["watermark", "rows_synced"])
+
+            if len(rows) < self.batch_size:
+                break
+
+        if report["rows"]:
+            bulk_import.sync_sequences()
+
+        state.status = "failed" if report["error"] else "done"
+        state.error = report["error"] or ""
+        state.finished_at = timezone.now()
+        state.save(update_fields=["status", "error", "finished_at"])
+
+        return report
+
+
+def run_table_sync(name, source_path, batch_size):
+    try:
+        return TableSync(name, source_path=source_path, batch_size=batch_size).run()
+    finally:
+        # the worker thread's own connections
+        connections.close_all()
+
+
+def sync_tables(names=None, source_path=None, batch_size=None, workers=None, callback=None):
+    """
+    Syncs `names` (every model by default) with a pool of `workers` threads. A table starts once the
+    tables its foreign keys point at are done and is skipped when one of them failed. Returns the
+    reports of TableSync, `callback` gets each one as soon as its table is done.
+    """
+    registry = app_models[0]
+    names = sorted(names or registry)
+    unknown = [name for name in names if name not in registry]
+    if unknown:
+        raise KeyError(f"Unknown models: {', '.join(unknown)}")
+
+    source_path = source_path or get_source_path()
+    dependencies = get_sync_dependencies(names)
+    reports = {}
+
+    def finish(name, report):
+        reports[name] = report
+        if callback:
+            callback(report)
+
+    with ThreadPoolExecutor(max_workers=workers or settings.DBSYNC_SYNC_WORKERS) as executor:
+        pending, running = set(names), {}
+
+        while pending or running:
+            failed = {name for name, report in reports.items() if report["error"]}
+            waiting = pending | set(running.values())
+
+            for name in sorted(pending):
+                if dependencies[name] & failed:
+                    pending.discard(name)
+                    finish(name, TableSync(name, source_path).get_report(
+                        error=f"skipped, {', '.join(sorted(dependencies[name] & failed))} failed"
+                    ))
+                elif not dependencies[name] & waiting:
+                    pending.discard(name)
+                    running[executor.submit(run_table_sync, name, source_path, batch_size)] = name
+
+            if pending and not running:
+                AppLogger.print(f"Foreign key cycle between {', '.join(sorted(pending))}, syncing them in any order")
+                for name in sorted(pending):
+                    running[executor.submit(run_table_sync, name, source_path, batch_size)] = name
+                pending.clear()
+
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(running.pop(future), future.result())
+
+    return [reports[name] for name in names]
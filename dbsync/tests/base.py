@@ -0,0 +1,61 @@
+from django.contrib import admin
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.test import TestCase, override_settings
+
+from dbsync.admin import register_external_model
+from dbsync.sites import refresh_admin_urls
+from utils.dbsync_util import app_models, get_base_model_name, introspect_postgres_schema, sync_model_columns
+
+
+@override_settings(DBSYNC_SCHEMA_RELOAD_INTERVAL=0, DBSYNC_QUERY_CACHE_TIMEOUT=0)
+class ExternalTablesTestCase(TestCase):
+    """
+    Creates the tables of `tables_sql` in the test external database and reloads the dynamic models
+    with them for the duration of every test. The models and admins of the real schema stay as they
+    are; the tables only exist in the test transaction.
+    """
+    databases = {"default", "external"}
+    tables_sql = ""
+
+    def setUp(self):
+        registry = app_models[0]
+        self.original_schema = {
+            "tables": dict(registry.get_table(name) for name in registry), "fingerprint": registry.fingerprint,
+        }
+        self.addCleanup(self.restore_schema)
+
+        self.execute(self.tables_sql)
+        self.reload_tables()
+
+    def execute(self, sql):
+        with connections["external"].cursor() as cursor:
+            cursor.execute(sql)
+
+    def reload_tables(self):
+        """
+        Reloads the dynamic models with the tables currently in the test external database,
+        returns the reload report.
+        """
+        self.test_tables = introspect_postgres_schema(connections["external"])["tables"]
+        return app_models[0].reload({
+            "tables": {**self.original_schema["tables"], **self.test_tables},
+            "fingerprint": self.original_schema["fingerprint"],
+        })
+
+    def register_admins(self):
+        sync_model_columns({"tables": self.test_tables})
+        register_external_model(names=[get_base_model_name(table) for table in self.test_tables])
+        refresh_admin_urls()
+
+    def restore_schema(self):
+        registry = app_models[0]
+        test_models = [registry.built()[name] for name in map(get_base_model_name, self.test_tables)
+                       if registry.is_built(name)]
+        admin.site._registry = {
+            model: model_admin for model, model_admin in admin.site._registry.items() if model not in test_models
+        }
+        registry.reload(self.original_schema)
+        refresh_admin_urls()
+        # the content types of the test models are rolled back with the test
+        ContentType.objects.clear_cache()
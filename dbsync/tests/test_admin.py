@@ -0,0 +1,56 @@
+from django.contrib import admin
+from django.contrib.admin import widgets
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, override_settings
+
+from account.models import DBSyncModelColumn
+from dbsync.tests.base import ExternalTablesTestCase
+from utils.dbsync_util import app_models
+
+
+@override_settings(DBSYNC_FK_SELECT_MAX_ROWS=10)
+class ForeignKeyWidgetTest(ExternalTablesTestCase):
+    tables_sql = """
+        CREATE TABLE test_author (id serial PRIMARY KEY, name varchar(100) NOT NULL);
+        CREATE TABLE test_book (
+            id serial PRIMARY KEY, title varchar(100) NOT NULL,
+            author_id integer NOT NULL REFERENCES test_author (id)
+        );
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.register_admins()
+        # flagged foreign keys to a searchable table always get an autocomplete
+        DBSyncModelColumn.objects.filter(model="test_book", name="author_id").update(in_autocomplete_list=False)
+        self.register_admins()
+        self.request = RequestFactory().get("/")
+        self.request.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+
+    def author_is_a_select(self):
+        model_admin = admin.site._registry[app_models[0]["test_book"]]
+        widget = model_admin.get_form(self.request).base_fields["author"].widget.widget
+        return not isinstance(widget, (widgets.AutocompleteSelect, widgets.ForeignKeyRawIdWidget))
+
+    def add_authors(self, count):
+        self.execute(f"""
+            INSERT INTO test_author (id, name) SELECT i, 'Author ' || i FROM generate_series(1, {count}) i;
+            ANALYZE test_author;
+        """)
+
+    def test_a_table_never_analyzed_gets_no_select(self):
+        self.assertFalse(self.author_is_a_select())
+
+    def test_a_small_table_gets_a_select(self):
+        self.add_authors(5)
+        self.assertTrue(self.author_is_a_select())
+
+    def test_a_table_that_grew_after_the_registration_gets_no_select(self):
+        self.add_authors(5)
+        self.assertTrue(self.author_is_a_select())
+
+        self.execute("""
+            INSERT INTO test_author (id, name) SELECT i, 'Author ' || i FROM generate_series(6, 50) i;
+            ANALYZE test_author;
+        """)
+        self.assertFalse(self.author_is_a_select())
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from dbsync.tests.base import ExternalTablesTestCase
+from utils.dbsync_util import app_models
+
+
+class ChangelistQueryCountTest(ExternalTablesTestCase):
+    tables_sql = """
+        CREATE TABLE test_author (id serial PRIMARY KEY, name varchar(100) NOT NULL);
+        CREATE TABLE test_book (
+            id serial PRIMARY KEY, title varchar(100) NOT NULL,
+            author_id integer NOT NULL REFERENCES test_author (id)
+        );
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.register_admins()
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def add_books(self, count):
+        author, book = app_models[0]["test_author"], app_models[0]["test_book"]
+        start = book.objects.count()
+        # the primary keys are plain integer fields, serial defaults are not read back
+        ids = range(start + 1, start + count + 1)
+        author.objects.bulk_create([author(id=pk, name=f"Author {pk}") for pk in ids])
+        book.objects.bulk_create([book(id=pk, title=f"Book {pk}", author_id=pk) for pk in ids])
+
+    def count_changelist_queries(self):
+        with CaptureQueriesContext(connections["external"]) as queries:
+            response = self.client.get(reverse("admin:dbsync_testbook_changelist"))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_related_rows_come_with_the_page(self):
+        self.add_books(20)
+        queries = self.count_changelist_queries()
+
+        self.add_books(180)
+        self.assertEqual(self.count_changelist_queries(), queries)
+
+
+@override_settings(DBSYNC_EXACT_COUNT_THRESHOLD=0)
+class EstimatedPaginationTest(ExternalTablesTestCase):
+    tables_sql = """
+        CREATE TABLE test_author (id serial PRIMARY KEY, name varchar(100) NOT NULL);
+        INSERT INTO test_author (id, name) SELECT i, 'Author ' || i FROM generate_series(1, 250) i;
+        ANALYZE test_author;
+        INSERT INTO test_author (id, name) SELECT i, 'Author ' || i FROM generate_series(251, 550) i;
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.register_admins()
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def get_page(self, number):
+        return self.client.get(reverse("admin:dbsync_testauthor_changelist"), {"p": number})
+
+    def test_pages_past_an_underestimated_count_are_served(self):
+        response = self.get_page(5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["cl"].result_list), 100)
+        self.assertContains(response, '?p=6">Next')
+
+        response = self.get_page(6)
+        self.assertEqual(len(response.context["cl"].result_list), 50)
+        self.assertNotContains(response, '">Next')
+
+    def test_a_page_without_rows_is_refused(self):
+        self.assertEqual(self.get_page(7).status_code, 302)
@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from dbsync.jobs import JobContext, import_job, submit_job
+
+
+class ImportJobPathTest(TestCase):
+
+    def setUp(self):
+        self.job_dir = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, self.job_dir)
+
+    def test_a_path_outside_the_job_dir_is_refused(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as file:
+            file.write(b"id\n1\n")
+        self.addCleanup(os.remove, file.name)
+
+        params = {"model": "test_tag", "path": file.name, "format": "csv"}
+        context = JobContext(submit_job("import", params))
+        with override_settings(DBSYNC_JOB_DIR=self.job_dir), self.assertRaisesMessage(ValueError, "DBSYNC_JOB_DIR"):
+            import_job(context, **params)
+
+        self.assertTrue(os.path.exists(file.name))
+
+
+class JobAdminTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "pw"))
+
+    def test_jobs_cannot_be_added(self):
+        self.assertEqual(self.client.get(reverse("admin:account_dbsyncjob_add")).status_code, 403)
+
+    def test_kind_params_and_status_are_readonly(self):
+        job = submit_job("export", {"model": "test_tag", "columns": [], "format": "csv", "query": {}})
+        job.status = "done"
+        job.save()
+
+        self.client.post(reverse("admin:account_dbsyncjob_change", args=[job.pk]), {
+            "kind": "import", "params": '{"path": "/etc/passwd"}', "status": "queued",
+        })
+        job.refresh_from_db()
+        self.assertEqual((job.kind, job.status), ("export", "done"))
+        self.assertEqual(job.params["model"], "test_tag")
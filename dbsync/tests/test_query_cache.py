@@ -0,0 +1,45 @@
+from django.test import TestCase
+
+from account.models import DBSyncModelColumn
+from dbsync.tests.base import ExternalTablesTestCase
+from utils.cache_util import get_version
+from utils.dbsync_util import app_models
+from utils.query_cache_util import get_table_versions
+
+
+class ReloadQueryCacheTest(ExternalTablesTestCase):
+    tables_sql = """
+        CREATE TABLE test_tag (id serial PRIMARY KEY, label varchar(20) NOT NULL);
+    """
+
+    def save_tag(self, pk):
+        tag = app_models[0]["test_tag"]
+        before = get_table_versions(["test_tag"])["test_tag"]
+        with self.captureOnCommitCallbacks(using="external", execute=True):
+            tag.objects.create(id=pk, label=f"Tag {pk}")
+        return before, get_table_versions(["test_tag"])["test_tag"]
+
+    def test_save_after_reload_bumps_the_table_version(self):
+        before, after = self.save_tag(1)
+        self.assertNotEqual(before, after)
+
+    def test_save_after_rebuild_bumps_the_table_version(self):
+        model = app_models[0]["test_tag"]
+        self.execute("ALTER TABLE test_tag ADD COLUMN color text;")
+        report = self.reload_tables()
+        self.assertEqual(report["changed"], ["test_tag"])
+        self.assertIsNot(app_models[0]["test_tag"], model)
+
+        before, after = self.save_tag(2)
+        self.assertNotEqual(before, after)
+
+
+class DisplayConfigTest(TestCase):
+
+    def test_the_version_is_bumped_on_commit(self):
+        before = get_version("display_config")
+        with self.captureOnCommitCallbacks(execute=True):
+            DBSyncModelColumn.objects.create(model="test_tag", name="label", in_list_display_list=True)
+            self.assertEqual(get_version("display_config"), before)
+
+        self.assertNotEqual(get_version("display_config"), before)
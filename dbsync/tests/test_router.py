@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from core.middleware import ReadYourWritesMiddleware
+from dbsync.tests.base import ExternalTablesTestCase
+from utils.dbsync_util import app_models
+
+
+class PrimaryPinTest(ExternalTablesTestCase):
+    tables_sql = """
+        CREATE TABLE test_author (id serial PRIMARY KEY, name varchar(100) NOT NULL);
+        INSERT INTO test_author (id, name) VALUES (1, 'Author 1');
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.register_admins()
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "pw"))
+        self.url = reverse("admin:dbsync_testauthor_change", args=[1])
+
+    def test_opening_a_change_form_does_not_pin(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(ReadYourWritesMiddleware.SESSION_KEY, self.client.session)
+
+    def test_a_rejected_change_form_does_not_pin(self):
+        response = self.client.post(self.url, {"id": 1, "name": ""})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(ReadYourWritesMiddleware.SESSION_KEY, self.client.session)
+
+    def test_saving_pins(self):
+        with self.captureOnCommitCallbacks(using="external", execute=True):
+            response = self.client.post(self.url, {"id": 1, "name": "Renamed"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(app_models[0]["test_author"].objects.get(pk=1).name, "Renamed")
+        self.assertIn(ReadYourWritesMiddleware.SESSION_KEY, self.client.session)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from dbsync.api import TableListView, TableRowsView
+
+urlpatterns = [
+    path("", TableListView.as_view(), name="dbsync_api_tables"),
+    path("<str:model_name>/", TableRowsView.as_view(), name="dbsync_api_rows"),
+]
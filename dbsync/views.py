@@ -1,3 +1,39 @@
-from django.shortcuts import render
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
 
-# Create your views here.
+
+class ExternalAutocompleteJsonView(AutocompleteJsonView):
+    """
+    Autocomplete of the dynamic models, see get_autocomplete_results of their model admins. Pages
+    fetch one row more than they show instead of counting the matches.
+    """
+
+    def get(self, request, *args, **kwargs):
+        self.term, self.model_admin, self.source_field, self.to_field_name = self.process_request(request)
+        if not hasattr(self.model_admin, "get_autocomplete_results"):
+            return super().get(request, *args, **kwargs)
+
+        if not self.has_perm(request):
+            raise PermissionDenied
+
+        try:
+            page = max(int(request.GET.get("page", 1)), 1)
+        except ValueError:
+            page = 1
+
+        offset = (page - 1) * self.paginate_by
+        rows = list(self.get_queryset()[offset:offset + self.paginate_by + 1])
+
+        return JsonResponse({
+            "results": [self.serialize_result(obj, self.to_field_name) for obj in rows[:self.paginate_by]],
+            "pagination": {"more": len(rows) > self.paginate_by},
+        })
+
+    def get_queryset(self):
+        if not hasattr(self.model_admin, "get_autocomplete_results"):
+            return super().get_queryset()
+
+        queryset = self.model_admin.get_queryset(self.request)
+        queryset = queryset.complex_filter(self.source_field.get_limit_choices_to())
+        return self.model_admin.get_autocomplete_results(self.request, queryset, self.term, self.to_field_name)
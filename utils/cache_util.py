@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from utils.log_util import AppLogger
+
+
+def get_version_key(name):
+    return f"version:{name}"
+
+
+def get_version(name):
+    """
+    Returns the shared version of `name`. Versions start from the current time in ms so a key that
+    was evicted never comes back with a value a worker has already seen.
+    """
+    key = get_version_key(name)
+    try:
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            version = cache.get(key)
+        return version
+    except Exception as e:
+        AppLogger.report(e, error=f"Unable to read cache version {key}")
+        return None
+
+
+def bump_version(name):
+    key = get_version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        return cache.get(key)
+    except Exception as e:
+        AppLogger.report(e, error=f"Unable to bump cache version {key}")
+        return None
+
+
+class VersionedLocalCache:
+    """
+    Per-process copy of whatever `loader` returns, reloaded when the shared version of `name` changes.
+    The version is only checked every `check_interval` seconds so reads normally stay in process.
+    """
+
+    def __init__(self, name, loader, check_interval):
+        self.name = name
+        self.loader = loader
+        self.check_interval = check_interval
+        self._data = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        data = self._data
+        if data is not None and now - self._checked_at < self.check_interval:
+            return data
+
+        with self._lock:
+            # read the version first so a bump racing with the load is caught on the next check
+            version = get_version(self.name)
+
+            if self._data is None or version != self._version:
+                self._data = self.loader()
+                self._version = version
+
+            self._checked_at = now
+            return self._data
+
+    def invalidate(self, using="default"):
+        """
+        Drops the copy of every process. Inside a transaction the bump waits for the commit so another
+        process cannot load the rows being replaced under the new version.
+        """
+        def bump():
+            bump_version(self.name)
+            self._data = None
+
+        transaction.on_commit(bump, using=using)
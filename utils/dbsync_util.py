@@ -1,9 +1,21 @@
+import threading
+import time
+from collections.abc import Mapping
+
 import psycopg2
+from django.apps import apps
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from inflection import pluralize, singularize
 
-from account.models import DBSyncModelColumn
+from account.models import DBSyncModelColumn, DBSyncModelConfig
+from core.dbrouter import pin_primary
+from utils.cache_util import VersionedLocalCache
+from utils.lock_util import file_lock
+from utils.log_util import AppLogger
+from utils.pool_util import borrow_connection
+from utils.query_cache_util import bump_table_version
+from utils.schema_snapshot_util import get_catalog_fingerprint, get_snapshot_store, load_snapshot, save_snapshot
 
 _model_registry_built = False
 
@@ -17,8 +29,8 @@ TYPE_MAP = {
     "serial": models.AutoField,
     "bigserial": models.BigAutoField,
 
-    "numeric": lambda precision, scale: models.DecimalField(max_digits=precision or 20, decimal_places=scale or 6),
-    "decimal": lambda precision, scale: models.DecimalField(max_digits=precision or 20, decimal_places=scale or 6),
+    "numeric": lambda precision, scale: models.DecimalField(max_digits=precision or 20, decimal_places=6 if scale is None else scale),
+    "decimal": lambda precision, scale: models.DecimalField(max_digits=precision or 20, decimal_places=6 if scale is None else scale),
     "real": models.FloatField,
     "double precision": models.FloatField,
 
@@ -56,10 +68,47 @@ __field_model_mapping = {}
 __excluded_fields = []
 
 
-class ExternalDBManager(models.Manager):
+class ExternalQuerySet(models.QuerySet):
+    """
+    QuerySet of the dynamic models that invalidates the cached queries of the tables it writes to,
+    and keeps the reads that follow on the primary.
+    """
+
+    def bump_table_versions(self, labels=None):
+        pin_primary()
+        if labels is None:
+            bump_table_version(self.model._meta.db_table, using=self.db)
+            return
+
+        for label in labels:
+            bump_table_version(apps.get_model(label)._meta.db_table, using=self.db)
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        self.bump_table_versions()
+        return rows
+
+    def delete(self):
+        deleted, rows = super().delete()
+        # cascades are reported per model label
+        self.bump_table_versions(rows)
+        return deleted, rows
 
-    def get_queryset(self):
-        return super().get_queryset().using("external")
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self.bump_table_versions()
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        self.bump_table_versions()
+        return rows
+
+
+class ExternalDBManager(models.Manager.from_queryset(ExternalQuerySet)):
+    """
+    ExternalDBRouter sends the writes to the external primary and spreads the reads over its replicas.
+    """
 
     def db(self):
         return self.using('external')
@@ -86,17 +135,71 @@ def get_base_model_name(table):
     return table
 
 
+def get_verbose_name_plural(table_name):
+    return pluralize(table_name.replace("_", " ").title())
+
+
+def load_display_config():
+    """
+    Returns the __str__ fields of every model from DBSyncModelColumn.repr_order and MODEL_STRING_VALUE_MAPS.
+    """
+    fields = {}
+    for model, field_name in DBSyncModelColumn.objects.filter(repr_order__isnull=False).order_by(
+            "model", "repr_order").values_list("model", "name"):
+        fields.setdefault(model, []).append(field_name)
+
+    for model, value_list in getattr(settings, "MODEL_STRING_VALUE_MAPS", {}).items():
+        fields.setdefault(model, value_list)
+
+    return fields
+
+
+def load_model_configs():
+    return {config.model: config for config in DBSyncModelConfig.objects.all()}
+
+
+display_config = VersionedLocalCache(
+    "display_config", load_display_config, settings.DBSYNC_DISPLAY_CONFIG_CHECK_INTERVAL
+)
+model_configs = VersionedLocalCache(
+    "model_configs", load_model_configs, settings.DBSYNC_DISPLAY_CONFIG_CHECK_INTERVAL
+)
+
+
+def invalidate_display_config():
+    display_config.invalidate()
+
+
+def get_repr_fields(name):
+    return display_config.get().get(name, [])
+
+
+def get_model_config(name):
+    return model_configs.get().get(name)
+
+
+def get_seek_columns(name):
+    """
+    Returns the columns keyset pagination can seek on: not nullable and leading a full btree index.
+    """
+    _, table_def = __models.get_table(name)
+    columns = set()
+
+    for index in table_def.get("indexes", []):
+        column = index["columns"][0]
+        if index["method"] != "btree" or index["partial"] or column is None:
+            continue
+
+        if not table_def["columns"].get(column, {}).get("nullable", True):
+            columns.add(column)
+
+    return columns
+
+
 def make_str_method(name):
     def _str(self):
 
-        value_list = list(
-            DBSyncModelColumn.objects.filter(model=name, repr_order__isnull=False).order_by("repr_order").values_list(
-                "name", flat=True))
-        if not value_list:
-            if hasattr(settings, "MODEL_STRING_VALUE_MAPS"):
-                name_maps = getattr(settings, "MODEL_STRING_VALUE_MAPS")
-                if name in name_maps:
-                    value_list = name_maps[name]
+        value_list = get_repr_fields(name)
 
         values = []
         for field in value_list:
@@ -116,253 +219,722 @@ def make_str_method(name):
     return _str
 
 
-def build_dynamic_models():
-    global _model_registry_built, __models, __many_to_many_fields, __foreign_fields, __model_fields, __field_model_mapping
+def get_column_field(col_def):
+    """
+    Returns the Django field for an introspected column and whether it should be searchable by default.
+    """
+    col_type = col_def["type"]
+    model_field = TYPE_MAP.get(col_type)
+
+    is_searchable = False
+
+    if callable(model_field):
+        if "char" in col_type or "varchar" in col_type:
+            field = model_field(col_def.get("max_length"))
+            is_searchable = True
+        elif col_type in ["numeric", "decimal"]:
+            field = model_field(col_def.get("precision"), col_def.get("scale"))
+        else:
+            field = model_field()
+    elif model_field:
+        field = model_field()
+    else:
+        is_searchable = True
+        field = models.TextField()
+
+    return field, is_searchable
+
+
+def sync_model_columns(schema, batch_size=500):
+    """
+    Reconciles DBSyncModelColumn with the introspected schema: one read of the existing rows, then the
+    computed diff applied with bulk writes in a single transaction. Concurrent workers queue on a lock,
+    and those coming after the first find an empty diff.
+    """
+    with file_lock("sync_model_columns", timeout=getattr(settings, "DBSYNC_LOCK_TIMEOUT", 300)) as acquired:
+        if not acquired:
+            AppLogger.print("Timed out waiting for another process to sync model columns, skipped")
+            return None
+
+        started = time.perf_counter()
+        existing = {
+            (rec.model, rec.name): rec
+            for rec in DBSyncModelColumn.objects.only("id", "model", "name", "order", "is_foreign_key", "description")
+        }
 
-    if _model_registry_built:
-        return __models, __foreign_fields, __many_to_many_fields, __model_fields, __field_model_mapping
+        to_create, to_update, seen = [], [], set()
+
+        for table_name, table_def in schema["tables"].items():
+            model_name = get_base_model_name(table_name)
+            order = 0
+
+            for col_name, col_def in table_def["columns"].items():
+                foreign_key = col_def.get("foreign_key")
+                col_type = col_def["type"]
+                _, is_searchable = get_column_field(col_def)
+
+                seen.add((model_name, col_name))
+                rec = existing.get((model_name, col_name))
+
+                if rec is None:
+                    to_create.append(DBSyncModelColumn(
+                        model=model_name,
+                        name=col_name,
+                        in_searchable_list=is_searchable,
+                        in_list_filter_list=False,
+                        in_list_display_list=True,
+                        in_autocomplete_list=foreign_key is not None,
+                        is_foreign_key=foreign_key is not None,
+                        order=order,
+                    ))
+                elif (rec.order != order and order > 0) or (foreign_key is not None) != rec.is_foreign_key:
+                    rec.is_foreign_key = foreign_key is not None
+                    rec.description = col_type
+                    rec.order = order
+                    to_update.append(rec)
 
-    schema = introspect_postgres_schema()
-    m2m_tables = {}
+                order += 1
 
-    column_ids = []
+        stale_ids = [rec.id for key, rec in existing.items() if key not in seen]
 
-    for table_name, table_def in schema["tables"].items():
+        try:
+            with transaction.atomic():
+                DBSyncModelColumn.objects.bulk_create(to_create, batch_size=batch_size)
+                DBSyncModelColumn.objects.bulk_update(
+                    to_update, ["order", "is_foreign_key", "description"], batch_size=batch_size
+                )
+                for i in range(0, len(stale_ids), batch_size):
+                    DBSyncModelColumn.objects.filter(pk__in=stale_ids[i:i + batch_size]).delete()
+        except Exception as e:
+            AppLogger.report(e, error="Unable to sync model columns")
+            return None
+
+        if stale_ids:
+            # removed columns may have been part of a __str__
+            invalidate_display_config()
+
+        report = {"added": len(to_create), "changed": len(to_update), "removed": len(stale_ids)}
+        AppLogger.print("Model columns synced in {:.1f}ms: {added} added, {changed} changed, {removed} removed".format(
+            (time.perf_counter() - started) * 1000, **report
+        ))
+        return report
+
+
+def create_model(table_name, table_def):
+    """
+    Creates the model class for a table with its plain columns, foreign keys are added
+    afterwards by add_foreign_keys once the target classes exist.
+    """
+    model_name = get_base_model_name(table_name)
+
+    attrs = {
+        "__module__": f"{app_label}.models",
+        "objects": ExternalDBManager(),
+        "Meta": type('Meta', (), {
+            'db_table': table_name,
+            'app_label': app_label,
+            'managed': False,
+            'default_manager_name': 'objects',
+            "verbose_name_plural": get_verbose_name_plural(table_name),
+            "verbose_name": singularize(table_name).replace("_", " ").title(),
+        })
+    }
+
+    if model_name not in __model_fields:
+        __model_fields[model_name] = []
 
-        model_name = get_base_model_name(table_name)
-        if is_m2m_join_table(table_def):
-            m2m_tables[model_name] = table_def
+    for col_name, col_def in table_def["columns"].items():
+        if col_def.get("foreign_key"):
+            continue  # Skip foreign keys in the first pass
 
-        attrs = {
-            "__module__": f"{app_label}.models",
-            "objects": ExternalDBManager(),
-            "Meta": type('Meta', (), {
-                'db_table': table_name,
-                'app_label': app_label,
-                'managed': False,
-                'default_manager_name': 'objects',
-                "verbose_name_plural": pluralize(table_name.replace("_", " ").title()),
-                "verbose_name": singularize(table_name).replace("_", " ").title(),
-            })
+        field, _ = get_column_field(col_def)
+        field.null = col_def.get("nullable", True)
+        field.blank = col_def.get("nullable", True)
+        if col_name == "id":
+            field.primary_key = True
+
+        attrs[col_name] = field
+        __model_fields[model_name].append(col_name)
+
+    attrs['__str__'] = make_str_method(model_name)
+    return type(to_camel_case(model_name), (models.Model,), attrs)
+
+
+def add_foreign_keys(model_name, model, table_def, built_models):
+    for col_name, col_def in table_def["columns"].items():
+        fk = col_def.get("foreign_key")
+        if not fk:
+            continue
+
+        target_table = get_base_model_name(fk["table"])
+        target_model = built_models.get(target_table)
+        field_name = col_name[:-3] if col_name.endswith("_id") else col_name
+
+        if not target_model:
+            continue
+
+        if hasattr(model, field_name):
+            continue
+
+        field = models.ForeignKey(
+            target_model,
+            on_delete=models.CASCADE,
+            db_column=col_name,
+            null=col_def.get("nullable", True),
+            related_name="+"
+        )
+
+        model.add_to_class(field_name, field)
+
+        if model_name not in __foreign_fields:
+            __foreign_fields[model_name] = []
+        if field_name not in __foreign_fields[model_name]:
+            __foreign_fields[model_name].append(field_name)
+
+        __model_fields[model_name].append(field_name)
+        __field_model_mapping[f"{model_name}:{field_name}"] = target_table
+
+
+def get_m2m_relation(table_def):
+    """
+    Returns (fk columns, source table, target table) for a join table.
+    """
+    fks = [col for col, defn in table_def["columns"].items() if defn.get("foreign_key")]
+    if len(fks) != 2:
+        return None
+
+    fk_defs = [table_def["columns"][fk]["foreign_key"] for fk in fks]
+    return fks, get_base_model_name(fk_defs[0]["table"]), get_base_model_name(fk_defs[1]["table"])
+
+
+def add_many_to_many(m2m_table, table_def, built_models):
+    m2m = get_m2m_relation(table_def)
+    if not m2m:
+        return False
+
+    fks, table_a, table_b = m2m
+
+    model_a = built_models.get(table_a)
+    model_b = built_models.get(table_b)
+    through_model = built_models.get(m2m_table)
+
+    if not all([model_a, model_b, through_model]):
+        return False
+
+    field_name = table_b
+    if hasattr(model_a, field_name):
+        field_name = f"{field_name}_m2m"
+
+    source_field = fks[0][:-3] if fks[0].endswith('_id') else fks[0]
+    target_field = fks[1][:-3] if fks[1].endswith('_id') else fks[1]
+
+    m2m_field = models.ManyToManyField(
+        model_b,
+        through=through_model,
+        related_name="+",
+        through_fields=(source_field, target_field)
+    )
+
+    if table_a not in __many_to_many_fields:
+        __many_to_many_fields[table_a] = []
+    if field_name not in __many_to_many_fields[table_a]:
+        __many_to_many_fields[table_a].append(field_name)
+
+    model_a.add_to_class(field_name, m2m_field)
+    __field_model_mapping[f"{table_a}:{field_name}"] = table_b
+    return True
+
+
+def forget_model(name, model):
+    """
+    Drops a model class from the app registry and the field maps before it is rebuilt or removed.
+    """
+    apps.all_models[app_label].pop(model._meta.model_name, None)
+
+    __model_fields.pop(name, None)
+    __foreign_fields.pop(name, None)
+    __many_to_many_fields.pop(name, None)
+    for key in [key for key in __field_model_mapping if key.split(":")[0] == name]:
+        del __field_model_mapping[key]
+
+
+def get_table_signature(table_def):
+    # the statistics change with every ANALYZE, the model does not
+    return {key: value for key, value in table_def.items() if key not in ("row_estimate", "size")}
+
+
+class DynamicModelRegistry(Mapping):
+    """
+    Model classes by model name. In lazy mode a class, along with the classes its foreign keys
+    and many-to-many fields point at, is only created the first time it is looked up.
+    """
+
+    def __init__(self, schema, lazy=False):
+        self.lazy = lazy
+        self.fingerprint = schema.get("fingerprint")
+        self._set_tables(schema)
+        self._models = {}
+        self._wired_m2m = set()
+        self._listeners = []
+        self._reload_listeners = []
+        self._lock = threading.RLock()
+
+    def _set_tables(self, schema):
+        self._tables = {
+            get_base_model_name(table_name): (table_name, table_def)
+            for table_name, table_def in schema["tables"].items()
+        }
+        self._m2m_tables = {
+            name: table_def for name, (_, table_def) in self._tables.items() if is_m2m_join_table(table_def)
         }
+        self._dependencies = self._get_dependencies()
 
-        if model_name not in __model_fields:
-            __model_fields[model_name] = []
-
-        order = 0
-
-        for col_name, col_def in table_def["columns"].items():
-            foreign_key = col_def.get("foreign_key")
-
-            col_type = col_def["type"]
-            max_length = col_def.get("max_length")
-            precision = col_def.get("precision")
-            scale = col_def.get("scale")
-            model_field = TYPE_MAP.get(col_type)
-
-            is_searchable = False
-
-            if callable(model_field):
-                if "char" in col_type or "varchar" in col_type:
-                    field = model_field(max_length)
-                    is_searchable = True
-                elif col_type in ["numeric", "decimal"]:
-                    field = model_field(precision, scale)
-                else:
-                    field = model_field()
-            elif model_field:
-                field = model_field()
-            else:
-                is_searchable = True
-                field = models.TextField()
-            try:
-                rec, is_created = DBSyncModelColumn.objects.get_or_create(
-                    model=model_name,
-                    name=col_name,
-                    defaults={
-                        "in_searchable_list": is_searchable,
-                        "in_list_filter_list": False,
-                        "in_list_display_list": True,
-                        "in_autocomplete_list": foreign_key is not None,
-                        "is_foreign_key": foreign_key is not None,
-                        "order": order
-                    }
-                )
+    def __getitem__(self, name):
+        model = self._models.get(name)
+        if model is None:
+            if name not in self._tables:
+                raise KeyError(name)
 
-                if (rec.order != order and order > 0 and not is_created) or (
-                        foreign_key and not rec.is_foreign_key) or (not foreign_key and rec.is_foreign_key):
-                    rec.is_foreign_key = foreign_key is not None
-                    rec.description = col_type
-                    rec.order = order
-                    rec.save(update_fields=["order", "is_foreign_key", "description"])
+            self.build([name])
+            model = self._models[name]
 
-                order += 1
+        return model
 
-                column_ids.append(rec.id)
-            except Exception as e:
-                pass
+    def __iter__(self):
+        return iter(self._tables)
 
-            if foreign_key:
-                continue  # Skip foreign keys in the first pass
+    def __len__(self):
+        return len(self._tables)
 
-            field.null = col_def.get("nullable", True)
-            field.blank = col_def.get("nullable", True)
-            if col_name == "id":
-                field.primary_key = True
+    def __contains__(self, name):
+        return name in self._tables
 
-            attrs[col_name] = field
-            __model_fields[model_name].append(col_name)
+    def get_table(self, name):
+        return self._tables[name]
 
-        attrs['__str__'] = make_str_method(model_name)
-        __models[model_name] = type(to_camel_case(model_name), (models.Model,), attrs)
-    try:
-        DBSyncModelColumn.objects.exclude(pk__in=column_ids).delete()
-    except Exception:
-        pass
-
-    # Second pass: Add relationships
-    for table_name, table_def in schema["tables"].items():
-        model_name = get_base_model_name(table_name)
-        model = __models.get(model_name)
-
-        for col_name, col_def in table_def["columns"].items():
-            fk = col_def.get("foreign_key")
-            if not fk:
-                continue
+    def is_built(self, name):
+        return name in self._models
 
-            target_table = get_base_model_name(fk["table"])
-            target_model = __models.get(target_table)
-            field_name = col_name[:-3] if col_name.endswith("_id") else col_name
+    def built(self):
+        return dict(self._models)
 
-            if not target_model:
-                continue
+    def add_build_listener(self, listener):
+        """
+        `listener` is called with the names of the models created by every build.
+        """
+        self._listeners.append(listener)
+
+    def add_reload_listener(self, listener):
+        """
+        `listener` is called with the names of the models rebuilt or added by a reload and the
+        replaced model classes, see reload.
+        """
+        self._reload_listeners.append(listener)
+
+    def _get_dependencies(self):
+        dependencies = {name: set() for name in self._tables}
+
+        for name, (_, table_def) in self._tables.items():
+            for col_def in table_def["columns"].values():
+                fk = col_def.get("foreign_key")
+                if fk and get_base_model_name(fk["table"]) in self._tables:
+                    dependencies[name].add(get_base_model_name(fk["table"]))
+
+        for m2m_table, table_def in self._m2m_tables.items():
+            m2m = get_m2m_relation(table_def)
+            if m2m and m2m[1] in dependencies:
+                dependencies[m2m[1]].update({m2m_table, m2m[2]} & set(self._tables))
+
+        return dependencies
+
+    def get_dependency_closure(self, names):
+        closure = set()
+        pending = list(names)
 
-            if hasattr(model, field_name):
+        while pending:
+            name = pending.pop()
+            if name in closure or name not in self._tables:
                 continue
 
-            field = models.ForeignKey(
-                target_model,
-                on_delete=models.CASCADE,
-                db_column=col_name,
-                null=col_def.get("nullable", True),
-                related_name="+"
-            )
+            closure.add(name)
+            pending.extend(self._dependencies[name] - closure)
 
-            model.add_to_class(field_name, field)
+        return closure
 
-            if model_name not in __foreign_fields:
-                __foreign_fields[model_name] = []
-            if field_name not in __foreign_fields[model_name]:
-                __foreign_fields[model_name].append(field_name)
+    def build(self, names):
+        with self._lock:
+            models = dict(self._models)
+            pending = self._create_models(models, names)
+            self._models = models
 
-            __model_fields[model_name].append(field_name)
-            __field_model_mapping[f"{model_name}:{field_name}"] = target_table
+        if pending:
+            self._notify(self._listeners, pending)
 
-    # Handle many-to-many relationships
-    for m2m_table, table_def in m2m_tables.items():
-        fks = [col for col, defn in table_def["columns"].items() if defn.get("foreign_key")]
+        return pending
 
-        if len(fks) != 2:
-            continue
+    def _create_models(self, models, names):
+        """
+        Creates the missing classes of the dependency closure of `names` into `models`.
+        """
+        pending = sorted(name for name in self.get_dependency_closure(names) if name not in models)
 
-        fk_defs = [table_def["columns"][fk]["foreign_key"] for fk in fks]
-        table_a, table_b = get_base_model_name(fk_defs[0]["table"]), get_base_model_name(fk_defs[1]["table"])
+        for name in pending:
+            models[name] = create_model(*self._tables[name])
 
-        model_a = __models.get(table_a)
-        model_b = __models.get(table_b)
-        through_model = __models.get(m2m_table)
+        for name in pending:
+            add_foreign_keys(name, models[name], self._tables[name][1], models)
 
-        if not all([model_a, model_b, through_model]):
-            continue
+        for m2m_table, table_def in self._m2m_tables.items():
+            if m2m_table not in self._wired_m2m and add_many_to_many(m2m_table, table_def, models):
+                self._wired_m2m.add(m2m_table)
 
-        field_name = table_b
-        if hasattr(model_a, field_name):
-            field_name = f"{field_name}_m2m"
+        return pending
 
-        source_field = fks[0][:-3] if fks[0].endswith('_id') else fks[0]
-        target_field = fks[1][:-3] if fks[1].endswith('_id') else fks[1]
+    def _notify(self, listeners, *args):
+        for listener in listeners:
+            try:
+                listener(*args)
+            except Exception as e:
+                AppLogger.report(e)
+
+    def notify_reload(self, names, replaced):
+        self._notify(self._reload_listeners, names, replaced)
+
+    def reload(self, schema):
+        """
+        Switches to a newly introspected `schema`. Only the built classes of changed or removed tables
+        are dropped, along with the built classes whose relations point at them, and rebuilt (added
+        tables too in eager mode). Readers keep the previous classes until the new ones are swapped in.
+        """
+        with self._lock:
+            old_tables, old_dependencies = self._tables, self._dependencies
+            self._set_tables(schema)
+
+            removed = set(old_tables) - set(self._tables)
+            added = set(self._tables) - set(old_tables)
+            changed = {
+                name for name in set(old_tables) & set(self._tables)
+                if get_table_signature(old_tables[name][1]) != get_table_signature(self._tables[name][1])
+            }
 
-        m2m_field = models.ManyToManyField(
-            model_b,
-            through=through_model,
-            related_name="+",
-            through_fields=(source_field, target_field)
-        )
+            stale = (changed | removed) & set(self._models)
+            while True:
+                dependents = {name for name in self._models if old_dependencies.get(name, set()) & stale} - stale
+                if not dependents:
+                    break
+                stale |= dependents
+
+            replaced = {name: self._models[name] for name in stale}
+            models = {name: model for name, model in self._models.items() if name not in stale}
+            for name, model in replaced.items():
+                forget_model(name, model)
+
+            # the many-to-many field lives on the source model of the join table
+            for m2m_table in list(self._wired_m2m):
+                if m2m_table in stale or get_m2m_relation(old_tables[m2m_table][1])[1] in stale:
+                    self._wired_m2m.discard(m2m_table)
+
+            rebuild = stale - removed
+            if not self.lazy:
+                rebuild |= added
+            built = self._create_models(models, rebuild)
+            self._models = models
+            self.fingerprint = schema.get("fingerprint")
+
+        if stale:
+            apps.clear_cache()
+        for name in changed | removed:
+            bump_table_version(old_tables[name][0])
+
+        report = {
+            "added": sorted(added), "changed": sorted(changed), "removed": sorted(removed), "rebuilt": built,
+        }
+        if built or replaced:
+            self.notify_reload(built, replaced)
 
-        if table_a not in __many_to_many_fields:
-            __many_to_many_fields[table_a] = []
-        if field_name not in __many_to_many_fields[table_a]:
-            __many_to_many_fields[table_a].append(field_name)
+        return report
 
-        model_a.add_to_class(field_name, m2m_field)
-        __field_model_mapping[f"{table_a}:{field_name}"] = table_b
+
+def build_dynamic_models():
+    global _model_registry_built, __models
+
+    if _model_registry_built:
+        return __models, __foreign_fields, __many_to_many_fields, __model_fields, __field_model_mapping
+
+    schema = load_schema()
+    sync_model_columns(schema)
+
+    started = time.perf_counter()
+    __models = DynamicModelRegistry(schema, lazy=getattr(settings, "DBSYNC_LAZY_MODELS", False))
+
+    if not __models.lazy:
+        __models.build(list(__models))
+
+    AppLogger.print("{} of {} dynamic models built in {:.1f}ms ({} mode)".format(
+        len(__models.built()), len(__models), (time.perf_counter() - started) * 1000,
+        "lazy" if __models.lazy else "eager"
+    ))
 
     _model_registry_built = True
 
     return __models, __foreign_fields, __many_to_many_fields, __model_fields, __field_model_mapping
 
 
-def introspect_postgres_schema():
+CHAR_TYPE_OIDS = (1042, 1043)  # bpchar, varchar
+NUMERIC_TYPE_OID = 1700
+
+INTROSPECTED_RELKINDS = ("r", "p", "v", "f")
+
+# pg_constraint.confdeltype
+FOREIGN_KEY_ACTIONS = {"a": "NO ACTION", "r": "RESTRICT", "c": "CASCADE", "n": "SET NULL", "d": "SET DEFAULT"}
+
+INTROSPECT_TABLES_SQL = """
+    SELECT c.relname, c.relkind, c.reltuples::bigint, pg_catalog.pg_total_relation_size(c.oid)
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s AND c.relkind = ANY(%s)
+    ORDER BY c.relname
+"""
+
+INTROSPECT_COLUMNS_SQL = """
+    SELECT
+        c.relname,
+        a.attname,
+        CASE
+            WHEN t.typtype = 'd' THEN
+                CASE
+                    WHEN bt.typelem <> 0 AND bt.typlen = -1 THEN 'ARRAY'
+                    WHEN bt.typnamespace = 'pg_catalog'::regnamespace THEN pg_catalog.format_type(t.typbasetype, NULL)
+                    ELSE 'USER-DEFINED'
+                END
+            WHEN t.typelem <> 0 AND t.typlen = -1 THEN 'ARRAY'
+            WHEN t.typnamespace = 'pg_catalog'::regnamespace THEN pg_catalog.format_type(a.atttypid, NULL)
+            ELSE 'USER-DEFINED'
+        END AS data_type,
+        NOT a.attnotnull AS is_nullable,
+        CASE WHEN a.attgenerated = '' THEN pg_catalog.pg_get_expr(d.adbin, d.adrelid) END AS column_default,
+        CASE WHEN t.typtype = 'd' THEN t.typbasetype ELSE a.atttypid END AS type_oid,
+        CASE WHEN t.typtype = 'd' THEN t.typtypmod ELSE a.atttypmod END AS type_mod
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    JOIN pg_catalog.pg_type t ON t.oid = a.atttypid
+    LEFT JOIN pg_catalog.pg_type bt ON t.typtype = 'd' AND bt.oid = t.typbasetype
+    LEFT JOIN pg_catalog.pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+    WHERE n.nspname = %s AND c.relkind = ANY(%s)
+    ORDER BY c.relname, a.attnum
+"""
+
+INTROSPECT_FOREIGN_KEYS_SQL = """
+    SELECT c.relname, a.attname, fc.relname, fa.attname, con.confdeltype
+    FROM pg_catalog.pg_constraint con
+    JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_class fc ON fc.oid = con.confrelid
+    CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(attnum, fattnum)
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+    JOIN pg_catalog.pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.fattnum
+    WHERE con.contype = 'f' AND n.nspname = %s
+    ORDER BY c.relname, con.conname
+"""
+
+
+INTROSPECT_INDEXES_SQL = """
+    SELECT
+        c.relname,
+        i.relname,
+        am.amname,
+        ix.indisunique,
+        ix.indisprimary,
+        ix.indpred IS NOT NULL,
+        ARRAY(
+            SELECT a.attname
+            FROM unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+            LEFT JOIN pg_catalog.pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum
+            WHERE k.ord <= ix.indnkeyatts
+            ORDER BY k.ord
+        ),
+        ARRAY(
+            SELECT o.opcname
+            FROM unnest(ix.indclass::oid[]) WITH ORDINALITY AS k(opclass, ord)
+            JOIN pg_catalog.pg_opclass o ON o.oid = k.opclass
+            ORDER BY k.ord
+        ),
+        pg_catalog.pg_get_expr(ix.indexprs, ix.indrelid)
+    FROM pg_catalog.pg_index ix
+    JOIN pg_catalog.pg_class c ON c.oid = ix.indrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_catalog.pg_am am ON am.oid = i.relam
+    WHERE n.nspname = %s AND ix.indisvalid
+    ORDER BY c.relname, i.relname
+"""
+
+
+def connect_external():
+    """
+    Opens a dedicated connection outside the pool, see utils.pool_util.borrow_connection.
+    """
     database = settings.DATABASES.get("external")
-    conn = psycopg2.connect(
+    return psycopg2.connect(
         dbname=database.get("NAME"),
         user=database.get("USER"),
         password=database.get("PASSWORD"),
         host=database.get("HOST"),
         port=database.get("PORT"),
     )
-    cur = conn.cursor()
 
-    cur.execute("SELECT " + "table_name FROM information_schema.tables WHERE table_schema = 'public';")
-    tables = [row[0] for row in cur.fetchall()]
+
+def decode_type_modifier(type_oid, type_mod):
+    """
+    Returns (max_length, precision, scale) from a pg_attribute typmod, the same way
+    information_schema derives character_maximum_length and numeric_precision/scale.
+    """
+    if type_mod is None or type_mod < 0:
+        return None, None, None
+
+    if type_oid in CHAR_TYPE_OIDS:
+        return type_mod - 4, None, None
+
+    if type_oid == NUMERIC_TYPE_OID:
+        return None, ((type_mod - 4) >> 16) & 0xFFFF, (type_mod - 4) & 0xFFFF
+
+    return None, None, None
+
+
+def introspect_postgres_schema(conn=None, schema_name="public"):
+    """
+    Reads tables with their size and row estimate, columns, foreign keys and indexes for `schema_name`
+    straight from pg_catalog using a fixed number of queries, whatever the number of tables.
+    """
+    if conn is None:
+        with borrow_connection() as conn:
+            return introspect_postgres_schema(conn, schema_name=schema_name)
+
+    cur = conn.cursor()
 
     schema = {"tables": {}}
 
-    for table in tables:
-        cur.execute(
-            "SELECT " + f"column_name, data_type, is_nullable, column_default FROM "
-                        f"information_schema.columns WHERE table_name = '{table}';"
-        )
-        columns = {}
-        for col in cur.fetchall():
-            col_name, col_type, is_nullable, default = col
-            columns[col_name] = {
+    try:
+        cur.execute(INTROSPECT_TABLES_SQL, [schema_name, list(INTROSPECTED_RELKINDS)])
+        for table, kind, row_estimate, size in cur.fetchall():
+            # row_estimate and size are as of the introspection, the catalog fingerprint ignores them
+            schema["tables"][table] = {
+                "kind": kind,
+                "columns": {},
+                "relations": {},
+                "indexes": [],
+                "row_estimate": row_estimate if row_estimate >= 0 else None,
+                "size": size,
+            }
+
+        cur.execute(INTROSPECT_COLUMNS_SQL, [schema_name, list(INTROSPECTED_RELKINDS)])
+        for table, col_name, col_type, is_nullable, default, type_oid, type_mod in cur.fetchall():
+            max_length, precision, scale = decode_type_modifier(type_oid, type_mod)
+            schema["tables"][table]["columns"][col_name] = {
                 "type": col_type,
-                "nullable": is_nullable == 'YES',
-                "default": default
+                "nullable": is_nullable,
+                "default": default,
+                "max_length": max_length,
+                "precision": precision,
+                "scale": scale,
             }
 
-        # Foreign key constraints
-        cur.execute(
-            "SELECT " + f"kcu.column_name, ccu.table_name AS foreign_table, ccu.column_name AS foreign_column"
-                        f" FROM information_schema.table_constraints AS tc JOIN information_schema.key_column_usage"
-                        f" AS kcu ON tc.constraint_name = kcu.constraint_name "
-                        f"JOIN information_schema.constraint_column_usage AS ccu ON "
-                        f"ccu.constraint_name = tc.constraint_name WHERE tc.constraint_type = 'FOREIGN KEY' "
-                        f"AND tc.table_name='{table}';"
-        )
+        cur.execute(INTROSPECT_FOREIGN_KEYS_SQL, [schema_name])
+        for table, col_name, foreign_table, foreign_column, on_delete in cur.fetchall():
+            table_def = schema["tables"].get(table)
+            if table_def is None or col_name not in table_def["columns"]:
+                continue
 
-        relations = {}
-        for col_name, foreign_table, foreign_column in cur.fetchall():
-            columns[col_name]["foreign_key"] = {
+            table_def["columns"][col_name]["foreign_key"] = {
                 "table": foreign_table,
-                "column": foreign_column
+                "column": foreign_column,
+                "on_delete": FOREIGN_KEY_ACTIONS.get(on_delete, "NO ACTION"),
             }
-            relations[foreign_table] = {
+            table_def["relations"][foreign_table] = {
                 "type": "many-to-one",
                 "target": foreign_table,
                 "foreign_key": col_name
             }
 
-        schema["tables"][table] = {
-            "columns": columns,
-            "relations": relations
-        }
+        cur.execute(INTROSPECT_INDEXES_SQL, [schema_name])
+        for table, index_name, method, is_unique, is_primary, is_partial, columns, opclasses, expression in \
+                cur.fetchall():
+            table_def = schema["tables"].get(table)
+            if table_def is None:
+                continue
 
-    cur.close()
-    conn.close()
+            # expression columns come back as None, `expression` holds their definitions
+            table_def.setdefault("indexes", []).append({
+                "name": index_name,
+                "method": method,
+                "columns": columns,
+                "opclasses": opclasses,
+                "expression": expression,
+                "unique": is_unique,
+                "primary": is_primary,
+                "partial": is_partial,
+            })
+    finally:
+        cur.close()
 
     return schema
 
 
+def load_schema(force=False, schema_name="public"):
+    """
+    Returns the introspected schema, served from the snapshot store as long as the catalog
+    fingerprint it was taken with still matches. `force` re-introspects and rewrites the snapshot.
+    """
+    started = time.perf_counter()
+
+    with borrow_connection() as conn:
+        fingerprint = get_catalog_fingerprint(conn, schema_name=schema_name)
+        fingerprint_ms = (time.perf_counter() - started) * 1000
+        store = get_snapshot_store(schema_name=schema_name)
+
+        if not force:
+            snapshot = load_snapshot(store, fingerprint)
+            if snapshot:
+                return get_snapshot_schema(snapshot, fingerprint, started, fingerprint_ms)
+
+        if store is None or force:
+            return introspect_schema(conn, store, fingerprint, schema_name)
+
+        # a single worker introspects, the others wait for the snapshot it publishes
+        with file_lock(f"introspect_schema_{schema_name}", timeout=getattr(settings, "DBSYNC_LOCK_TIMEOUT", 300)) as acquired:
+            if not acquired:
+                AppLogger.print("Timed out waiting for another process to introspect the schema")
+
+            snapshot = load_snapshot(store, fingerprint)
+            if snapshot:
+                return get_snapshot_schema(snapshot, fingerprint, started, fingerprint_ms)
+
+            return introspect_schema(conn, store, fingerprint, schema_name)
+
+
+def get_snapshot_schema(snapshot, fingerprint, started, fingerprint_ms):
+    AppLogger.print(
+        "Schema loaded from snapshot in {:.1f}ms (fingerprint {:.1f}ms, full introspection took "
+        "{:.1f}ms)".format(
+            (time.perf_counter() - started) * 1000, fingerprint_ms, snapshot.get("introspection_ms", 0)
+        )
+    )
+    return {**snapshot["schema"], "fingerprint": fingerprint}
+
+
+def introspect_schema(conn, store, fingerprint, schema_name):
+    introspection_started = time.perf_counter()
+    schema = introspect_postgres_schema(conn, schema_name=schema_name)
+    introspection_ms = (time.perf_counter() - introspection_started) * 1000
+
+    save_snapshot(store, fingerprint, schema, introspection_ms)
+    AppLogger.print(
+        "Schema introspected in {:.1f}ms ({} tables), snapshot saved to {}".format(
+            introspection_ms, len(schema["tables"]), store
+        )
+    )
+    return {**schema, "fingerprint": fingerprint}
+
+
 app_models = build_dynamic_models()
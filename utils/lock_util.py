@@ -0,0 +1,37 @@
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+@contextmanager
+def file_lock(name, blocking=True, timeout=None, poll_interval=0.1):
+    """
+    Holds an exclusive flock on `<DBSYNC_LOCK_DIR>/<name>.lock` so only one process on the host
+    runs the guarded block at a time. Yields False when the lock could not be taken, i.e. when
+    `blocking` is False or `timeout` seconds passed while another process held it.
+    """
+    os.makedirs(settings.DBSYNC_LOCK_DIR, exist_ok=True)
+    path = os.path.join(settings.DBSYNC_LOCK_DIR, f"{name}.lock")
+
+    with open(path, "a") as lock_file:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        acquired = False
+
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                    break
+                time.sleep(poll_interval)
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
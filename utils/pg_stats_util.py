@@ -0,0 +1,132 @@
+import json
+
+from django.db import connections
+
+from utils.log_util import AppLogger
+
+
+def get_table_row_estimate(table_name, using="external"):
+    """
+    Returns pg_class.reltuples for the table, None when the table has never been vacuumed or analyzed.
+    """
+    connection = connections[using]
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT reltuples::bigint FROM pg_catalog.pg_class WHERE oid = to_regclass(%s);",
+            [connection.ops.quote_name(table_name)]
+        )
+        row = cur.fetchone()
+
+    if not row or row[0] is None or row[0] < 0:
+        return None
+
+    return row[0]
+
+
+def get_queryset_row_estimate(queryset):
+    """
+    Returns the planner's row estimate for the queryset, read from EXPLAIN without running it.
+    """
+    queryset = queryset.order_by().values("pk")
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    return get_sql_row_estimate(sql, params, using=queryset.db)
+
+
+def get_sql_plan(sql, params, using="external"):
+    """
+    Returns the top node of the plan of `sql` from EXPLAIN, without running it.
+    """
+    with connections[using].cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cur.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return plan[0]["Plan"]
+
+
+def get_sql_row_estimate(sql, params, using="external"):
+    return int(get_sql_plan(sql, params, using=using)["Plan Rows"])
+
+
+def get_sql_cost(sql, params, using="external"):
+    """
+    Returns the planner's total cost of `sql`, in units of sequential page reads.
+    """
+    return float(get_sql_plan(sql, params, using=using)["Total Cost"])
+
+
+def get_estimated_count(queryset, exact_count_threshold):
+    """
+    Returns (count, is_estimated). The count comes from table statistics, or from the planner when the
+    queryset is filtered, and only falls back to COUNT(*) when that estimate is below the threshold.
+    """
+    estimate = None
+    try:
+        if not queryset.query.has_filters():
+            estimate = get_table_row_estimate(queryset.model._meta.db_table, using=queryset.db)
+
+        if estimate is None:
+            estimate = get_queryset_row_estimate(queryset)
+    except Exception as e:
+        AppLogger.report(e, error="Unable to estimate the row count of {}".format(queryset.model.__name__))
+
+    if estimate is None or estimate < exact_count_threshold:
+        return queryset.count(), False
+
+    return estimate, True
+
+
+def get_column_stats(table_name, column, using="external"):
+    """
+    Returns the planner statistics of a column, with n_distinct turned into an absolute estimate and
+    most_common_vals as text, None until the table has been analyzed.
+    """
+    connection = connections[using]
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.null_frac, s.n_distinct, s.most_common_vals::text::text[], s.most_common_freqs, c.reltuples
+            FROM pg_catalog.pg_stats s
+            JOIN pg_catalog.pg_namespace n ON n.nspname = s.schemaname
+            JOIN pg_catalog.pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+            WHERE c.oid = to_regclass(%s) AND s.attname = %s
+            ORDER BY s.inherited DESC
+            LIMIT 1
+            """,
+            [connection.ops.quote_name(table_name), column]
+        )
+        row = cur.fetchone()
+
+    if not row:
+        return None
+
+    null_frac, n_distinct, most_common_vals, most_common_freqs, reltuples = row
+    if n_distinct < 0:
+        # a fraction of the rows, the estimate grows with the table
+        n_distinct = -n_distinct * max(reltuples, 0)
+
+    return {
+        "null_frac": null_frac,
+        "n_distinct": int(round(n_distinct)),
+        "most_common_vals": most_common_vals or [],
+        "most_common_freqs": most_common_freqs or [],
+    }
+
+
+def get_sampled_distinct_values(table_name, column, sample_rows, limit, using="external"):
+    """
+    Returns up to `limit` distinct values of a column among its first `sample_rows` rows, so the
+    cost is bounded whatever the size of the table.
+    """
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT DISTINCT {column} FROM (SELECT {column} FROM {table} LIMIT %s) sample ORDER BY 1 LIMIT %s".format(
+                column=quote_name(column), table=quote_name(table_name)
+            ),
+            [sample_rows, limit]
+        )
+        return [value for value, in cur.fetchall()]
@@ -0,0 +1,292 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from django.conf import settings
+from django.db import connections
+
+from utils.log_util import AppLogger
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """
+    No connection got free in time. Django reports it as an OperationalError.
+    """
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of psycopg2 connections opened with `connect`.
+
+    Checkouts take the most recently returned connection, open a new one below `max_size`, or wait
+    up to `timeout` seconds for one to come back. Connections idle for more than `check_interval`
+    seconds are checked with SELECT 1 before being handed out, and those idle for more than
+    `max_idle` seconds are closed as long as the pool keeps `min_size` connections.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=30, max_idle=300, check_interval=30):
+        self.connect = connect
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+
+        self._idle = deque()  # (connection, monotonic time it was returned)
+        self._size = 0
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            "checkouts": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "timeouts": 0,
+            "opened": 0, "closed": 0, "failed_checks": 0, "peak_in_use": 0,
+        }
+
+    def open(self):
+        """
+        Opens connections up to `min_size`.
+        """
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+
+            try:
+                connection = self.connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                raise
+
+            with self._condition:
+                self._stats["opened"] += 1
+                self._idle.appendleft((connection, time.monotonic()))
+                self._condition.notify()
+
+    def getconn(self):
+        started = time.monotonic()
+
+        while True:
+            connection, returned_at = self._checkout(started)
+
+            if connection is None:
+                try:
+                    connection = self.connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                with self._condition:
+                    self._stats["opened"] += 1
+            elif not self._check(connection, returned_at):
+                with self._condition:
+                    self._stats["failed_checks"] += 1
+                self._discard(connection)
+                continue
+
+            waited = time.monotonic() - started
+            with self._condition:
+                self._stats["wait_seconds"] += waited
+                self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+            return connection
+
+    def _checkout(self, started):
+        """
+        Returns an idle (connection, returned at), or (None, None) with a slot reserved for a new one.
+        """
+        deadline = started + self.timeout
+        with self._condition:
+            self._stats["checkouts"] += 1
+            waited = False
+
+            while True:
+                self._prune()
+                if self._idle or self._size < self.max_size:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No connection got free in {self.timeout}s, all {self.max_size} are in use")
+
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                self._condition.wait(remaining)
+
+            self._in_use += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._in_use)
+
+            if self._idle:
+                return self._idle.pop()
+
+            self._size += 1
+            return None, None
+
+    def _check(self, connection, returned_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_interval:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+
+        return True
+
+    def putconn(self, connection):
+        """
+        Takes a connection back, rolled back if a transaction was left open.
+        """
+        try:
+            status = connection.info.transaction_status if not connection.closed else None
+            if status in (None, extensions.TRANSACTION_STATUS_UNKNOWN):
+                raise psycopg2.InterfaceError("connection lost")
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            self._discard(connection)
+            return
+
+        with self._condition:
+            self._in_use -= 1
+            self._idle.append((connection, time.monotonic()))
+            self._prune()
+            self._condition.notify()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+        with self._condition:
+            self._stats["closed"] += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._in_use -= 1
+            self._condition.notify()
+
+    def _prune(self):
+        # the oldest returned connections are on the left
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            connection, _ = self._idle.popleft()
+            self._size -= 1
+            self._stats["closed"] += 1
+            try:
+                connection.close()
+            except psycopg2.Error:
+                pass
+
+    def close(self):
+        with self._condition:
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._size -= 1
+                self._stats["closed"] += 1
+                connection.close()
+
+    def get_stats(self):
+        """
+        Returns the pool size and usage, with the saturation (in use / max size) and the time
+        checkouts spent waiting for a free connection.
+        """
+        with self._condition:
+            return {
+                "pid": os.getpid(),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "saturation": self._in_use / self.max_size,
+                **self._stats,
+                "avg_wait_seconds": self._stats["wait_seconds"] / self._stats["checkouts"] if self._stats["checkouts"] else 0.0,
+            }
+
+
+# pools by (alias, database name, pid): a forked worker opens its own pool, and the one it inherited
+# stays referenced so its connections are never closed from the child. The test runner switches the
+# name of a database after the schema was introspected through its pool.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias="external"):
+    """
+    Returns the connection pool of `alias` for this process, None when DBSYNC_POOL_MAX_SIZE is 0 or
+    `alias` is not a configured database, e.g. the one Django opens to create the test databases.
+    """
+    if not settings.DBSYNC_POOL_MAX_SIZE or alias not in settings.DATABASES:
+        return None
+
+    key = (alias, connections[alias].settings_dict["NAME"], os.getpid())
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            conn_params = connections[alias].get_connection_params()
+            pool = ConnectionPool(
+                lambda: psycopg2.connect(**conn_params),
+                min_size=settings.DBSYNC_POOL_MIN_SIZE,
+                max_size=settings.DBSYNC_POOL_MAX_SIZE,
+                timeout=settings.DBSYNC_POOL_TIMEOUT,
+                max_idle=settings.DBSYNC_POOL_MAX_IDLE,
+                check_interval=settings.DBSYNC_POOL_CHECK_INTERVAL,
+            )
+            try:
+                pool.open()
+            except psycopg2.Error as e:
+                AppLogger.report(e, error=f"Unable to open the {alias} connection pool")
+            _pools[key] = pool
+
+    return pool
+
+
+def close_pools():
+    """
+    Closes the idle connections of this process's pools, e.g. in the gunicorn master before it forks.
+    """
+    for (alias, name, pid), pool in list(_pools.items()):
+        if pid == os.getpid():
+            pool.close()
+
+
+def get_pool_stats():
+    return {alias: pool.get_stats() for (alias, name, pid), pool in _pools.items() if pid == os.getpid()}
+
+
+@contextmanager
+def borrow_connection(alias="external"):
+    """
+    Yields a raw psycopg2 connection of `alias` from its pool, or a dedicated one without pooling.
+    """
+    pool = get_pool(alias)
+    if pool is None:
+        connection = psycopg2.connect(**connections[alias].get_connection_params())
+        try:
+            yield connection
+        finally:
+            connection.close()
+        return
+
+    connection = pool.getconn()
+    try:
+        yield connection
+    finally:
+        pool.putconn(connection)
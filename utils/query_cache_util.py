@@ -0,0 +1,129 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+
+from utils.cache_util import bump_version, get_version, get_version_key
+from utils.log_util import AppLogger
+
+QUERY_CACHE_PREFIX = "query"
+QUERY_CACHE_KINDS = ("page", "count", "filter")
+
+
+def get_table_version_name(table_name):
+    return f"table:{table_name}"
+
+
+def get_table_versions(table_names):
+    """
+    Returns {table: version} with a single round trip when every version exists already.
+    """
+    names = {table_name: get_table_version_name(table_name) for table_name in table_names}
+    try:
+        found = cache.get_many([get_version_key(name) for name in names.values()])
+    except Exception as e:
+        AppLogger.report(e, error="Unable to read table versions")
+        return None
+
+    return {
+        table_name: found.get(get_version_key(name)) or get_version(name)
+        for table_name, name in names.items()
+    }
+
+
+def bump_table_version(table_name, using="external"):
+    """
+    Invalidates every cached query reading `table_name`. Inside a transaction the bump waits for
+    the commit so a concurrent request cannot cache the rows being replaced again.
+    """
+    transaction.on_commit(lambda: bump_version(get_table_version_name(table_name)), using=using)
+
+
+def get_query_tables(queryset):
+    """
+    Returns the SQL of `queryset` and the tables it reads, select_related joins included.
+    """
+    compiler = queryset.query.clone().get_compiler(using=queryset.db)
+    sql, params = compiler.as_sql()
+    table_names = {alias.table_name for alias in compiler.query.alias_map.values()}
+    return sql, params, table_names
+
+
+def record_lookup(kind, hit):
+    key = f"{QUERY_CACHE_PREFIX}:stats:{kind}:{'hits' if hit else 'misses'}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+    except Exception as e:
+        AppLogger.report(e, error=f"Unable to record query cache {kind} lookup")
+
+
+def get_stats():
+    """
+    Returns {kind: {"hits", "misses", "ratio"}} shared by every worker.
+    """
+    keys = {
+        (kind, outcome): f"{QUERY_CACHE_PREFIX}:stats:{kind}:{outcome}"
+        for kind in QUERY_CACHE_KINDS for outcome in ("hits", "misses")
+    }
+    found = cache.get_many(list(keys.values()))
+
+    stats = {}
+    for kind in QUERY_CACHE_KINDS:
+        hits = found.get(keys[(kind, "hits")], 0)
+        misses = found.get(keys[(kind, "misses")], 0)
+        stats[kind] = {"hits": hits, "misses": misses, "ratio": hits / (hits + misses) if hits + misses else None}
+
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([
+        f"{QUERY_CACHE_PREFIX}:stats:{kind}:{outcome}" for kind in QUERY_CACHE_KINDS for outcome in ("hits", "misses")
+    ])
+
+
+def get_cached(kind, queryset, compute, *key_parts):
+    """
+    Returns compute() cached under the SQL of `queryset`, `key_parts` and the versions of the tables
+    the query reads, for at most DBSYNC_QUERY_CACHE_TIMEOUT seconds. Writes through
+    ExternalDBManager or the admin bump the table versions, so cached results go stale at once.
+    """
+    if not settings.DBSYNC_QUERY_CACHE_TIMEOUT:
+        return compute()
+
+    try:
+        sql, params, table_names = get_query_tables(queryset)
+    except EmptyResultSet:
+        return compute()
+
+    versions = get_table_versions(sorted(table_names))
+    if versions is None:
+        return compute()
+
+    # replicas may lag behind the table versions, their results never answer reads of the primary
+    digest = hashlib.md5(repr((queryset.db, sql, params, key_parts)).encode()).hexdigest()
+    version = ".".join(str(versions[table_name]) for table_name in sorted(versions))
+    key = f"{QUERY_CACHE_PREFIX}:{kind}:{queryset.model._meta.db_table}:{version}:{digest}"
+
+    try:
+        value = cache.get(key)
+    except Exception as e:
+        # e.g. a row of a model this worker has not built yet
+        AppLogger.report(e, error=f"Unable to read query cache {key}")
+        value = None
+
+    record_lookup(kind, value is not None)
+    if value is not None:
+        return value
+
+    value = compute()
+    try:
+        cache.set(key, value, timeout=settings.DBSYNC_QUERY_CACHE_TIMEOUT)
+    except Exception as e:
+        AppLogger.report(e, error=f"Unable to write query cache {key}")
+
+    return value
@@ -0,0 +1,32 @@
+import math
+import time
+
+from django.core.cache import cache
+
+from utils.log_util import AppLogger
+
+RATE_LIMIT_PREFIX = "rate"
+
+
+def charge_budget(name, cost, budget, window):
+    """
+    Adds `cost` to what `name` spent in the current `window` seconds, shared by every worker through
+    the cache. Returns the seconds left in the window once the spending goes over `budget`, None
+    otherwise. Windows are fixed, so up to twice the budget can be spent around a window boundary.
+    """
+    now = time.time()
+    window_index = int(now // window)
+    key = f"{RATE_LIMIT_PREFIX}:{name}:{window_index}"
+
+    try:
+        cache.add(key, 0, timeout=math.ceil(window) + 1)
+        spent = cache.incr(key, max(1, math.ceil(cost)))
+    except Exception as e:
+        # an unreachable cache does not take the API down with it
+        AppLogger.report(e, error=f"Unable to charge the rate limit budget {key}")
+        return None
+
+    if spent > budget:
+        return max(1, math.ceil((window_index + 1) * window - now))
+
+    return None
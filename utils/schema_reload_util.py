@@ -0,0 +1,83 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from utils.cache_util import bump_version, get_version
+from utils.log_util import AppLogger
+from utils.pool_util import borrow_connection
+from utils.schema_snapshot_util import get_catalog_fingerprint
+
+# shared version bumped by every change of the admin configuration (DBSyncModelColumn)
+ADMIN_CONFIG_VERSION = "admin_config"
+
+
+def invalidate_admin_config():
+    # a worker registering its admins before the commit would keep the old columns
+    transaction.on_commit(lambda: bump_version(ADMIN_CONFIG_VERSION))
+
+
+class SchemaWatcher:
+    """
+    Polls the catalog fingerprint of the external schema and the shared admin configuration
+    version, at most every `check_interval` seconds. A new fingerprint reloads the schema into the
+    model registry, which rebuilds the changed models only; a new configuration version registers
+    the admin of every built model again. The admin side is wired through the reload listeners of
+    the registry, see dbsync.admin.
+
+    Checks run on the request path of each worker; a check already running in another thread is
+    not waited for, that request is served with the current models.
+    """
+
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self._config_version = get_version(ADMIN_CONFIG_VERSION)
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def check(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval or not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            self._checked_at = now
+            return self.reload()
+        except Exception as e:
+            AppLogger.report(e, error="Unable to check the schema for changes")
+            return None
+        finally:
+            self._lock.release()
+
+    def reload(self):
+        from utils.dbsync_util import app_models, load_schema, sync_model_columns
+
+        registry = app_models[0]
+        report = None
+
+        with borrow_connection() as conn:
+            fingerprint = get_catalog_fingerprint(conn)
+
+        if fingerprint != registry.fingerprint:
+            started = time.perf_counter()
+            schema = load_schema()
+            sync_model_columns(schema)
+            report = registry.reload(schema)
+            AppLogger.print(
+                "Schema reloaded in {:.1f}ms: {} added, {} changed, {} removed, {} models rebuilt".format(
+                    (time.perf_counter() - started) * 1000, len(report["added"]), len(report["changed"]),
+                    len(report["removed"]), len(report["rebuilt"])
+                )
+            )
+
+        version = get_version(ADMIN_CONFIG_VERSION)
+        if version != self._config_version:
+            registry.notify_reload(sorted(registry.built()), {})
+            AppLogger.print("Admin configuration reloaded")
+        self._config_version = version
+
+        return report
+
+
+schema_watcher = SchemaWatcher(settings.DBSYNC_SCHEMA_RELOAD_INTERVAL)
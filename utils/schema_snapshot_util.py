@@ -0,0 +1,154 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+
+from utils.log_util import AppLogger
+
+# bump whenever the shape of the introspected schema changes so old snapshots are ignored
+SNAPSHOT_FORMAT_VERSION = 5
+
+CATALOG_FINGERPRINT_SQL = """
+    WITH rels AS (
+        SELECT c.oid, c.xmin
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind = ANY(%s)
+    )
+    SELECT md5(concat_ws('|',
+        (SELECT string_agg(r.oid::text || ':' || r.xmin::text, ',' ORDER BY r.oid) FROM rels r),
+        (SELECT string_agg(a.attrelid::text || ':' || a.attnum::text || ':' || a.xmin::text, ','
+                           ORDER BY a.attrelid, a.attnum)
+         FROM pg_catalog.pg_attribute a JOIN rels r ON r.oid = a.attrelid WHERE a.attnum > 0),
+        (SELECT string_agg(d.oid::text || ':' || d.xmin::text, ',' ORDER BY d.oid)
+         FROM pg_catalog.pg_attrdef d JOIN rels r ON r.oid = d.adrelid),
+        (SELECT string_agg(con.oid::text || ':' || con.xmin::text, ',' ORDER BY con.oid)
+         FROM pg_catalog.pg_constraint con JOIN rels r ON r.oid = con.conrelid),
+        (SELECT string_agg(ix.indexrelid::text || ':' || ix.xmin::text, ',' ORDER BY ix.indexrelid)
+         FROM pg_catalog.pg_index ix JOIN rels r ON r.oid = ix.indrelid)
+    ))
+"""
+
+
+def get_catalog_fingerprint(conn, schema_name="public", relkinds=("r", "p", "v", "f")):
+    """
+    Hashes the xmin of every catalog row describing the schema. Any DDL rewrites those rows
+    and changes the hash, while plain VACUUM/ANALYZE update pg_class in place and leave it alone.
+    """
+    with conn.cursor() as cur:
+        cur.execute(CATALOG_FINGERPRINT_SQL, [schema_name, list(relkinds)])
+        fingerprint = cur.fetchone()[0]
+
+    return "{}:{}:{}".format(SNAPSHOT_FORMAT_VERSION, schema_name, fingerprint)
+
+
+class FileSnapshotStore:
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    def __str__(self):
+        return "file {}".format(self.path)
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, snapshot):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        # write to a temp file and rename so a worker never reads a half written snapshot
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".schema_snapshot")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self):
+        try:
+            os.remove(self.path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class RedisSnapshotStore:
+
+    def __init__(self, url, key):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+
+    def __str__(self):
+        return "redis key {}".format(self.key)
+
+    def load(self):
+        data = self.client.get(self.key)
+        return json.loads(data) if data else None
+
+    def save(self, snapshot):
+        self.client.set(self.key, json.dumps(snapshot))
+
+    def delete(self):
+        return bool(self.client.delete(self.key))
+
+
+def get_snapshot_store(schema_name="public"):
+    backend = getattr(settings, "DBSYNC_SCHEMA_SNAPSHOT_BACKEND", "file")
+
+    if backend == "redis":
+        redis_url = getattr(settings, "REDIS_URL", None)
+        if not redis_url:
+            AppLogger.print("DBSYNC_SCHEMA_SNAPSHOT_BACKEND is redis but REDIS_URL is not set, snapshot disabled")
+            return None
+
+        key = "{}:schema_snapshot:{}".format(getattr(settings, "REDIS_PREFIX", "dbsync"), schema_name)
+        return RedisSnapshotStore(redis_url, key)
+
+    if backend == "file":
+        return FileSnapshotStore(settings.DBSYNC_SCHEMA_SNAPSHOT_PATH)
+
+    return None
+
+
+def load_snapshot(store, fingerprint):
+    """
+    Returns the stored snapshot if it was taken for `fingerprint`, None otherwise.
+    """
+    if store is None:
+        return None
+
+    try:
+        snapshot = store.load()
+    except Exception as e:
+        AppLogger.report(e, error="Unable to read schema snapshot from {}".format(store))
+        return None
+
+    if not snapshot or snapshot.get("fingerprint") != fingerprint:
+        return None
+
+    return snapshot
+
+
+def save_snapshot(store, fingerprint, schema, introspection_ms):
+    if store is None:
+        return
+
+    try:
+        store.save({
+            "fingerprint": fingerprint,
+            "introspection_ms": introspection_ms,
+            "schema": schema,
+        })
+    except Exception as e:
+        AppLogger.report(e, error="Unable to write schema snapshot to {}".format(store))
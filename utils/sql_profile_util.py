@@ -0,0 +1,178 @@
+import json
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from utils.log_util import AppLogger
+
+PROFILE_CACHE_PREFIX = "sql_profile"
+
+# slowest statements and repeated fingerprints kept per group
+TOP_STATEMENTS = 10
+
+FINGERPRINT_RES = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s|\?"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?, ...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def get_fingerprint(sql):
+    """
+    Returns `sql` with its literals, placeholders and IN lists collapsed, the same for every run of
+    a query that only differs by its parameters.
+    """
+    for pattern, replacement in FINGERPRINT_RES:
+        sql = pattern.sub(replacement, sql)
+
+    return sql.strip()
+
+
+def get_percentile(values, percentile):
+    """
+    Nearest rank percentile of `values`, None when empty.
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[max(0, math.ceil(percentile / 100 * len(values)) - 1)]
+
+
+class QueryProfiler:
+    """
+    Database execute wrapper that times every statement of a request, see connection.execute_wrapper.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []  # (sql, milliseconds)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - started) * 1000))
+
+
+def get_request_profile(profilers, group, path, method, status, total_ms):
+    """
+    Summarizes the statements `profilers` recorded for a request: counts and time per database,
+    the slowest statements and the fingerprints run DBSYNC_PROFILE_REPEAT_THRESHOLD times or more.
+    """
+    databases = {}
+    fingerprints = {}
+    statements = []
+
+    for profiler in profilers:
+        if not profiler.queries:
+            continue
+
+        databases[profiler.alias] = {
+            "queries": len(profiler.queries),
+            "ms": round(sum(ms for _, ms in profiler.queries), 2),
+        }
+        for sql, ms in profiler.queries:
+            statements.append({"alias": profiler.alias, "ms": round(ms, 2), "sql": sql})
+            key = (profiler.alias, get_fingerprint(sql))
+            fingerprints[key] = fingerprints.get(key, 0) + 1
+
+    statements.sort(key=lambda statement: statement["ms"], reverse=True)
+
+    return {
+        "group": group,
+        "path": path,
+        "method": method,
+        "status": status,
+        "ms": round(total_ms, 2),
+        "queries": sum(database["queries"] for database in databases.values()),
+        "db_ms": round(sum(database["ms"] for database in databases.values()), 2),
+        "databases": databases,
+        "slowest": statements[:settings.DBSYNC_PROFILE_SLOWEST],
+        "repeated": [
+            {"alias": alias, "fingerprint": fingerprint, "count": count}
+            for (alias, fingerprint), count in sorted(fingerprints.items(), key=lambda item: -item[1])
+            if count >= settings.DBSYNC_PROFILE_REPEAT_THRESHOLD
+        ],
+    }
+
+
+def get_group_key(group):
+    return f"{PROFILE_CACHE_PREFIX}:group:{group}"
+
+
+def record_profile(profile):
+    """
+    Logs `profile` as a JSON line and adds it to the rolling window of its group, shared by every worker
+    through the cache. Concurrent requests of a group may drop one another's sample.
+    """
+    AppLogger.print("sql_profile " + json.dumps(profile, default=str))
+
+    try:
+        groups = cache.get(f"{PROFILE_CACHE_PREFIX}:groups") or []
+        if profile["group"] not in groups:
+            cache.set(f"{PROFILE_CACHE_PREFIX}:groups", sorted(groups + [profile["group"]]), timeout=None)
+
+        key = get_group_key(profile["group"])
+        stats = cache.get(key) or {"samples": [], "slowest": [], "repeated": {}}
+
+        stats["samples"] = (stats["samples"] + [[profile["ms"], profile["db_ms"], profile["queries"]]])[
+            -settings.DBSYNC_PROFILE_WINDOW:]
+
+        slowest = stats["slowest"] + [{**statement, "path": profile["path"]} for statement in profile["slowest"]]
+        stats["slowest"] = sorted(slowest, key=lambda statement: statement["ms"], reverse=True)[:TOP_STATEMENTS]
+
+        for item in profile["repeated"]:
+            repeated = stats["repeated"].setdefault(
+                item["fingerprint"], {"alias": item["alias"], "requests": 0, "max_count": 0, "path": profile["path"]}
+            )
+            repeated["requests"] += 1
+            repeated["max_count"] = max(repeated["max_count"], item["count"])
+        stats["repeated"] = dict(
+            sorted(stats["repeated"].items(), key=lambda item: -item[1]["requests"])[:TOP_STATEMENTS]
+        )
+
+        cache.set(key, stats, timeout=None)
+    except Exception as e:
+        AppLogger.report(e, error="Unable to record the SQL profile")
+
+
+def get_profile_stats():
+    """
+    Returns the p50/p95/p99 request time, DB time and query count of every group over its rolling
+    window, with its slowest statements and repeated fingerprints.
+    """
+    groups = cache.get(f"{PROFILE_CACHE_PREFIX}:groups") or []
+    found = cache.get_many([get_group_key(group) for group in groups])
+
+    results = []
+    for group in groups:
+        stats = found.get(get_group_key(group))
+        if not stats:
+            continue
+
+        columns = list(zip(*stats["samples"])) or [[], [], []]
+        results.append({
+            "group": group,
+            "requests": len(stats["samples"]),
+            **{
+                f"{name}_p{percentile}": get_percentile(values, percentile)
+                for name, values in zip(("ms", "db_ms", "queries"), columns)
+                for percentile in (50, 95, 99)
+            },
+            "slowest": stats["slowest"],
+            "repeated": [{"fingerprint": fingerprint, **item} for fingerprint, item in stats["repeated"].items()],
+        })
+
+    return sorted(results, key=lambda result: -(result["db_ms_p95"] or 0))
+
+
+def reset_profile_stats():
+    groups = cache.get(f"{PROFILE_CACHE_PREFIX}:groups") or []
+    cache.delete_many([get_group_key(group) for group in groups] + [f"{PROFILE_CACHE_PREFIX}:groups"])